@@ -0,0 +1,120 @@
+# Run from backend/: python -m app.benchmarks.event_loop_lag [--synthetic]
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+TICK_INTERVAL = 0.005  # 5 ms
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def make_workload(synthetic: bool, image_path: str = None) -> Callable[[], object]:
+    """
+    Build the blocking call each simulated request makes.
+
+    With a loaded model this is process_image + detect_objects on a sample
+    frame; with --synthetic it is a NumPy matmul of similar duration, so the
+    benchmark also runs where no model file is available.
+    """
+    if synthetic:
+        a = np.random.default_rng(0).random((700, 700), dtype=np.float32)
+        return lambda: a @ a @ a
+
+    from app.services.detection_service import detect_objects, process_image
+
+    if image_path:
+        with open(image_path, "rb") as f:
+            image_data = f.read()
+    else:
+        import cv2
+        frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        image_data = cv2.imencode(".jpg", frame)[1].tobytes()
+
+    return lambda: detect_objects(process_image(image_data))
+
+
+async def measure_lag(stop: asyncio.Event, samples: List[float]) -> None:
+    """Record how late each periodic tick fires - that is the event-loop lag"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_mode(mode: str, workload: Callable[[], object], requests: int, concurrency: int) -> Dict:
+    from app.services.inference_executor import run_in_inference_executor
+
+    samples: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, samples))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        async with semaphore:
+            if mode == "inline":
+                # Old behaviour: blocking call straight from the coroutine
+                workload()
+            else:
+                await run_in_inference_executor(workload)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": requests / elapsed,
+        "lag_ms": {
+            "p50": percentile(samples, 50) * 1000,
+            "p99": percentile(samples, 99) * 1000,
+            "max": max(samples) * 1000 if samples else 0.0
+        },
+        "ticks": len(samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event-loop lag with inline vs executor inference')
+    parser.add_argument('--synthetic', action='store_true', help='Use a NumPy workload instead of the model')
+    parser.add_argument('--image', type=str, default=None, help='Sample image to run through the model')
+    parser.add_argument('--requests', type=int, default=40, help='Simulated requests per mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent in-flight requests')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    workload = make_workload(args.synthetic, args.image)
+    workload()  # warm up
+
+    results = [
+        asyncio.run(run_mode(mode, workload, args.requests, args.concurrency))
+        for mode in ("inline", "executor")
+    ]
+
+    print(f"{'mode':<10}{'rps':>10}{'lag p50 ms':>14}{'lag p99 ms':>14}{'lag max ms':>14}")
+    for result in results:
+        lag = result["lag_ms"]
+        print(f"{result['mode']:<10}{result['throughput_rps']:>10.1f}"
+              f"{lag['p50']:>14.2f}{lag['p99']:>14.2f}{lag['max']:>14.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
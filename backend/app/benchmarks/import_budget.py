@@ -0,0 +1,85 @@
+# Run from backend/: python -m app.benchmarks.import_budget [--max-seconds 3 --max-rss-mb 400]
+# Exits non-zero when the serving modules blow the cold-start budget, so it can gate CI.
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+DEFAULT_MODULES = [
+    "app.services.npu_service",
+    "app.services.detection_service",
+]
+# Heavy frameworks the inference-only profile must never pull in
+FORBIDDEN_MODULES = ["tensorflow", "torch", "ultralytics"]
+
+# Runs in a fresh interpreter so earlier imports can't hide the real cost
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": rss_kb / 1024,
+    "loaded_forbidden": [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(modules: List[str], forbidden: List[str]) -> Dict:
+    """Import `modules` in a subprocess and report time, peak RSS and forbidden imports"""
+    probe = _PROBE.format(modules=modules, forbidden=forbidden)
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr}")
+    # Module-level logging may also write to stdout; the report is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check serving import time and memory against a budget')
+    parser.add_argument('--module', action='append', default=None, help='Module to import (repeatable)')
+    parser.add_argument('--max-seconds', type=float, default=3.0, help='Import-time budget in seconds')
+    parser.add_argument('--max-rss-mb', type=float, default=400.0, help='Peak RSS budget in MB')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh-interpreter runs; the best one is reported')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    modules = args.module or DEFAULT_MODULES
+    runs = [measure(modules, FORBIDDEN_MODULES) for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda run: run["seconds"])
+
+    failures = []
+    if best["seconds"] > args.max_seconds:
+        failures.append(f"import took {best['seconds']:.2f}s (budget {args.max_seconds:.2f}s)")
+    if best["max_rss_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {best['max_rss_mb']:.0f} MB (budget {args.max_rss_mb:.0f} MB)")
+    if best["loaded_forbidden"]:
+        failures.append(f"loaded heavy modules: {', '.join(best['loaded_forbidden'])}")
+
+    print(f"Imported {', '.join(modules)}")
+    print(f"  time:     {best['seconds']:.2f}s (budget {args.max_seconds:.2f}s)")
+    print(f"  peak RSS: {best['max_rss_mb']:.0f} MB (budget {args.max_rss_mb:.0f} MB)")
+    print(f"  heavy:    {', '.join(best['loaded_forbidden']) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"modules": modules, "runs": runs, "failures": failures}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if failures:
+        print("\nBudget exceeded: " + "; ".join(failures))
+        return 1
+    print("\nWithin budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
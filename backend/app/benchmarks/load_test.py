@@ -0,0 +1,324 @@
+# Run from backend/: python -m app.benchmarks.load_test --base-url http://host:8000/api/v1 --ws-url ws://host:8000
+# Drives a mix of HTTP and WebSocket traffic against a running server and reports
+# throughput, latency percentiles and error rates per endpoint. Start the server
+# with LOCAL_FIREBASE=true and ENVIRONMENT=development so auth, Firestore and recycling
+# info are served from memory (tokens are then issued by app.services.local_firebase.make_token).
+import argparse
+import asyncio
+import base64
+import json
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+
+HTTP_ENDPOINTS = ("detect", "detect-base64", "continuous-detection", "leaderboard")
+DEFAULT_MIX = "continuous-detection=6,detect=1,leaderboard=3"
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """'endpoint=weight,...' -> normalized weights"""
+    weights = {}
+    for item in mix.split(","):
+        endpoint, _, weight = item.partition("=")
+        endpoint = endpoint.strip()
+        if endpoint not in HTTP_ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{endpoint}' in --mix (choose from {', '.join(HTTP_ENDPOINTS)})")
+        weights[endpoint] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise SystemExit("--mix weights must add up to more than 0")
+    return {endpoint: weight / total for endpoint, weight in weights.items()}
+
+
+def load_image(path: Optional[str]) -> bytes:
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    import cv2
+    rng = np.random.default_rng(0)
+    frame = cv2.resize(rng.integers(0, 255, (30, 40, 3), dtype=np.uint8), (640, 480))
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+class EndpointStats:
+    """Latencies and outcomes for one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+        self.requests = 0
+        self.extra: Counter = Counter()
+
+    def record(self, latency: float, error: Optional[str] = None) -> None:
+        self.requests += 1
+        if error is None:
+            self.latencies.append(latency)
+        else:
+            self.errors[error] += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        failed = sum(self.errors.values())
+        return {
+            "requests": self.requests,
+            "succeeded": len(self.latencies),
+            "throughput_per_s": len(self.latencies) / elapsed if elapsed > 0 else 0.0,
+            "error_rate": failed / self.requests if self.requests else 0.0,
+            "errors": dict(self.errors),
+            "latency_ms": {
+                "p50": percentile(self.latencies, 50) * 1000,
+                "p95": percentile(self.latencies, 95) * 1000,
+                "p99": percentile(self.latencies, 99) * 1000,
+                "max": max(self.latencies) * 1000 if self.latencies else 0.0
+            },
+            **dict(self.extra)
+        }
+
+
+async def http_request(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    endpoint: str,
+    user_id: str,
+    token: str,
+    image: bytes,
+    image_b64: str,
+    stats: EndpointStats
+) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    try:
+        if endpoint == "detect":
+            form = aiohttp.FormData()
+            form.add_field("file", image, filename="frame.jpg", content_type="image/jpeg")
+            form.add_field("user_id", user_id)
+            request = session.post(f"{base_url}/detect", data=form, headers=headers)
+        elif endpoint in ("detect-base64", "continuous-detection"):
+            request = session.post(
+                f"{base_url}/{endpoint}", json={"user_id": user_id, "image": image_b64}, headers=headers
+            )
+        else:
+            request = session.get(f"{base_url}/leaderboard", headers=headers)
+
+        async with request as response:
+            body = await response.read()
+            latency = time.perf_counter() - started
+            if response.status >= 400:
+                stats.record(latency, f"http_{response.status}")
+            elif endpoint != "leaderboard" and not json.loads(body).get("success", False):
+                # Detection endpoints report failures in the body with a 200
+                stats.record(latency, "success_false")
+            else:
+                stats.record(latency)
+    except asyncio.TimeoutError:
+        stats.record(time.perf_counter() - started, "timeout")
+    except aiohttp.ClientError as e:
+        stats.record(time.perf_counter() - started, type(e).__name__)
+
+
+async def drive_http(
+    session: aiohttp.ClientSession,
+    args,
+    mix: Dict[str, float],
+    users: List[Dict[str, str]],
+    image: bytes,
+    stats: Dict[str, EndpointStats],
+    deadline: float
+) -> None:
+    """
+    Open-loop arrivals at --rps: requests start on schedule whether or not
+    earlier ones have finished, so a slow server shows up as latency rather
+    than as a lower offered load.
+    """
+    rng = np.random.default_rng(1)
+    endpoints = list(mix)
+    weights = [mix[endpoint] for endpoint in endpoints]
+    image_b64 = base64.b64encode(image).decode()
+    interval = 1.0 / args.rps
+    in_flight = set()
+    next_start = time.perf_counter()
+
+    while next_start < deadline:
+        delay = next_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = endpoints[rng.choice(len(endpoints), p=weights)]
+        user = users[rng.integers(len(users))]
+        task = asyncio.create_task(http_request(
+            session, args.base_url, endpoint, user["uid"], user["token"], image, image_b64, stats[endpoint]
+        ))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        next_start += interval
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+async def drive_stream(
+    session: aiohttp.ClientSession,
+    args,
+    user: Dict[str, str],
+    image: bytes,
+    stats: EndpointStats,
+    deadline: float
+) -> None:
+    """
+    One WebSocket stream sending binary frames at --fps. Replies are matched to
+    frames by sequence number; frames the server skipped in favour of newer ones
+    are counted as dropped, not as errors.
+    """
+    from app.services.frame_protocol import encode_frame
+
+    sent_at: Dict[int, float] = {}
+    try:
+        async with session.ws_connect(f"{args.ws_url}/ws/detection/{user['uid']}") as ws:
+            await ws.send_str(json.dumps({
+                "token": user["token"],
+                "protocol": "binary",
+                "protocol_version": 1,
+                "tracking": args.tracking
+            }))
+            connected = await ws.receive_json(timeout=args.timeout)
+            if connected.get("status") != "connected":
+                stats.record(0.0, f"stream_{connected.get('status', 'error')}")
+                return
+            stats.extra["streams_connected"] += 1
+
+            async def send_frames():
+                interval = 1.0 / args.fps
+                sequence = 0
+                next_send = time.perf_counter()
+                while next_send < deadline:
+                    delay = next_send - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    sent_at[sequence] = time.perf_counter()
+                    await ws.send_bytes(encode_frame(image, sequence))
+                    stats.extra["frames_sent"] += 1
+                    sequence += 1
+                    next_send += interval
+
+            sender = asyncio.create_task(send_frames())
+            try:
+                while not sender.done() or sent_at:
+                    try:
+                        message = await ws.receive(timeout=args.timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    reply = json.loads(message.data)
+                    sequence = reply.get("sequence")
+                    if sequence is None or sequence not in sent_at:
+                        continue
+                    latency = time.perf_counter() - sent_at.pop(sequence)
+                    # Earlier frames still pending were replaced by this one on the server
+                    for skipped in [s for s in sent_at if s < sequence]:
+                        del sent_at[skipped]
+                        stats.extra["frames_dropped"] += 1
+                    status = reply.get("status")
+                    stats.record(latency, f"frame_{status}" if status in ("error", "busy") else None)
+            finally:
+                sender.cancel()
+    except asyncio.TimeoutError:
+        stats.record(0.0, "timeout")
+    except aiohttp.ClientError as e:
+        stats.record(0.0, type(e).__name__)
+
+
+async def run_load_test(args) -> Dict:
+    from app.services.local_firebase import make_token
+
+    image = load_image(args.image)
+    users = [{"uid": f"load-user-{i}", "token": make_token(f"load-user-{i}")} for i in range(args.users)]
+    mix = parse_mix(args.mix)
+    stats = {endpoint: EndpointStats() for endpoint in mix}
+    stream_stats = EndpointStats()
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = []
+        if args.rps > 0:
+            tasks.append(drive_http(session, args, mix, users, image, stats, deadline))
+        for i in range(args.streams):
+            tasks.append(drive_stream(session, args, users[i % len(users)], image, stream_stats, deadline))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    results = {endpoint: endpoint_stats.summary(elapsed) for endpoint, endpoint_stats in stats.items()}
+    if args.streams:
+        results["websocket"] = stream_stats.summary(elapsed)
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "ws_url": args.ws_url,
+            "duration_s": args.duration,
+            "rps": args.rps,
+            "mix": mix,
+            "streams": args.streams,
+            "fps": args.fps,
+            "users": args.users,
+            "image_bytes": len(image)
+        },
+        "elapsed_s": elapsed,
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP + WebSocket load test against a running server')
+    parser.add_argument('--base-url', type=str, default='http://localhost:8000/api/v1', help='HTTP API base URL')
+    parser.add_argument('--ws-url', type=str, default='ws://localhost:8000', help='WebSocket base URL')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to generate load for')
+    parser.add_argument('--rps', type=float, default=20.0, help='Target HTTP requests per second (0 for none)')
+    parser.add_argument('--mix', type=str, default=DEFAULT_MIX,
+                        help=f'HTTP endpoint weights as endpoint=weight,... ({", ".join(HTTP_ENDPOINTS)})')
+    parser.add_argument('--streams', type=int, default=0, help='Concurrent WebSocket streams')
+    parser.add_argument('--fps', type=float, default=10.0, help='Frames per second per WebSocket stream')
+    parser.add_argument('--tracking', action='store_true', help='Ask for detect-then-track on WebSocket streams')
+    parser.add_argument('--users', type=int, default=20, help='Distinct simulated users')
+    parser.add_argument('--image', type=str, default=None, help='Image to send (defaults to a synthetic 640x480 JPEG)')
+    parser.add_argument('--connections', type=int, default=0, help='HTTP connection pool size (0 for unlimited)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.rps <= 0 and args.streams <= 0:
+        raise SystemExit("Nothing to do: set --rps and/or --streams")
+    if args.users < 1:
+        raise SystemExit("--users must be at least 1")
+
+    report = asyncio.run(run_load_test(args))
+
+    print(f"{'endpoint':<24}{'requests':>10}{'ok/s':>9}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, result in report["results"].items():
+        latency = result["latency_ms"]
+        print(f"{endpoint:<24}{result['requests']:>10}{result['throughput_per_s']:>9.1f}"
+              f"{result['error_rate'] * 100:>8.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}")
+        if result["errors"]:
+            print(f"{'':<24}errors: {result['errors']}")
+
+    websocket = report["results"].get("websocket")
+    if websocket:
+        print(f"\nWebSocket: {websocket.get('streams_connected', 0)}/{args.streams} streams connected, "
+              f"{websocket.get('frames_sent', 0)} frames sent, {websocket.get('frames_dropped', 0)} dropped by the server")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
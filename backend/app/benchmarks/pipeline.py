@@ -0,0 +1,255 @@
+# Run from backend/: python -m app.benchmarks.pipeline [--output results.json] [--compare baseline.json] [--ort-profile]
+# Times each stage of the serving path separately. With --compare, exits non-zero
+# when a stage's median regresses past --threshold percent, so it can gate CI.
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_SAMPLES = "../trained models/model/*.jpeg"
+DEFAULT_RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+DEFAULT_BATCH_SIZES = [1, 4, 8]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def time_stage(fn: Callable[[], object], runs: int, warmup: int = 2) -> Dict:
+    """Latency summary of a repeated call, in milliseconds"""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "runs": runs,
+        "mean_ms": float(np.mean(timings)) * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000
+    }
+
+
+def load_images(samples: Optional[str], resolutions: List[str], synthetic: bool) -> List[Tuple[str, bytes]]:
+    """(name, JPEG bytes) for synthetic frames at each resolution plus any sample images"""
+    images = []
+    if synthetic:
+        rng = np.random.default_rng(0)
+        for resolution in resolutions:
+            width, height = (int(v) for v in resolution.lower().split("x"))
+            # Smooth noise compresses like a camera frame, unlike white noise
+            frame = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+            images.append((f"synthetic-{width}x{height}", cv2.imencode(".jpg", frame)[1].tobytes()))
+
+    for path in sorted(glob.glob(samples)) if samples else []:
+        with open(path, "rb") as f:
+            images.append((os.path.basename(path), f.read()))
+    return images
+
+
+def benchmark_image(name: str, image_data: bytes, batch_sizes: List[int], runs: int, variant: Optional[str]) -> Dict:
+    from app.models import DetectionResponse
+    from app.services import detection_service
+    from app.services.preprocessing import decode_image
+
+    model = detection_service.get_variant(variant)
+    plan = model.plan
+    results = {}
+
+    results[f"decode/{name}"] = time_stage(lambda: decode_image(image_data, target_size=plan.input_size), runs)
+
+    def process():
+        processed = detection_service.process_image(image_data, variant=model.name)
+        processed.release()
+    results[f"process_image/{name}"] = time_stage(process, runs)
+
+    processed = detection_service.process_image(image_data, variant=model.name)
+    frame = np.array(detection_service._prepare_input(processed, plan))
+    letterbox = processed.letterbox
+    processed.release()
+
+    # Batch-1 reference output for the serialize stage, whichever batch sizes run below.
+    # Copied so later runs can't overwrite it (IOBinding reuses output buffers)
+    reference = [output.copy() for output in model.run(frame)]
+
+    for batch_size in batch_sizes:
+        if batch_size > 1 and not detection_service.supports_batching(model.name):
+            continue
+        batch = np.ascontiguousarray(np.repeat(frame, batch_size, axis=0))
+        outputs = model.run(batch)
+        # Copy so later runs can't overwrite the reference output (IOBinding reuses buffers)
+        outputs = [output.copy() for output in outputs]
+        results[f"model_run/{name}/batch{batch_size}"] = time_stage(lambda: model.run(batch), runs)
+        results[f"post_process/{name}/batch{batch_size}"] = time_stage(
+            lambda: [
+                detection_service.post_process([output[i:i + 1] for output in outputs], letterbox=letterbox, plan=plan)
+                for i in range(batch_size)
+            ],
+            runs
+        )
+
+    detections = detection_service.post_process(reference, letterbox=letterbox, plan=plan)
+    best = max(detections, key=lambda d: d.confidence) if detections else None
+    results[f"serialize/{name}"] = time_stage(
+        lambda: DetectionResponse(success=True, detection=best).json(),
+        runs
+    )
+    return results
+
+
+def run_suite(args) -> Dict:
+    from app.services import detection_service
+
+    if detection_service.MODEL is None:
+        raise SystemExit("Model not loaded - set MODEL_PATH to an ONNX model")
+
+    images = load_images(args.samples, args.resolutions, not args.no_synthetic)
+    if not images:
+        raise SystemExit("No images to benchmark")
+
+    results = {}
+    for name, image_data in images:
+        print(f"Benchmarking {name} ({len(image_data) / 1024:.0f} KB)")
+        results.update(benchmark_image(name, image_data, args.batch_sizes, args.runs, args.variant))
+
+    model = detection_service.get_variant(args.variant)
+    report = {
+        "meta": {
+            "model": model.model_path,
+            "variant": model.name,
+            "input_size": list(model.plan.input_size),
+            "providers": model.session.get_providers(),
+            "io_binding": model.io_binding,
+            "runs": args.runs,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+    if args.ort_profile:
+        from app.services.ort_profiler import profile_model
+        print(f"Profiling operators over {args.ort_runs} runs")
+        profile = profile_model(
+            model.model_path, runs=args.ort_runs, image_data=images[0][1], input_size=model.plan.input_size
+        )
+        report["ort_profile"] = {"summary": profile["summary"], **profile["breakdown"]}
+    return report
+
+
+def compare_operators(current: Dict, baseline: Dict) -> List[Dict]:
+    """Per-operator ms/run against a baseline profile, e.g. before and after a re-export or quantization"""
+    rows = []
+    current_ops = current["by_operator"]
+    baseline_ops = baseline["by_operator"]
+    for op in list(current_ops) + [op for op in baseline_ops if op not in current_ops]:
+        now = current_ops.get(op, {}).get("ms_per_run", 0.0)
+        before = baseline_ops.get(op, {}).get("ms_per_run", 0.0)
+        rows.append({
+            "op": op,
+            "baseline_ms": before,
+            "current_ms": now,
+            "change_ms": now - before,
+            "providers": current_ops.get(op, baseline_ops.get(op, {})).get("providers", [])
+        })
+    return rows
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """Stage-by-stage p50 change against a baseline; flags anything slower than the threshold"""
+    rows = []
+    for key, stats in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None or base["p50_ms"] <= 0:
+            continue
+        change = (stats["p50_ms"] / base["p50_ms"] - 1) * 100
+        rows.append({
+            "stage": key,
+            "baseline_ms": base["p50_ms"],
+            "current_ms": stats["p50_ms"],
+            "change_pct": change,
+            "regressed": change > threshold
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage timing of the detection serving path')
+    parser.add_argument('--samples', type=str, default=DEFAULT_SAMPLES, help='Glob of sample images')
+    parser.add_argument('--resolutions', type=str, nargs='+', default=DEFAULT_RESOLUTIONS,
+                        help='Synthetic frame sizes as WIDTHxHEIGHT')
+    parser.add_argument('--no-synthetic', action='store_true', help='Only benchmark the sample images')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES,
+                        help='Batch sizes for model_run and post_process')
+    parser.add_argument('--variant', type=str, default=None, help='Model variant (defaults to the snapshot variant)')
+    parser.add_argument('--runs', type=int, default=30, help='Timed calls per stage')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    parser.add_argument('--compare', type=str, default=None, help='Baseline JSON from an earlier --output run')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent p50 slowdown that counts as a regression in --compare mode')
+    parser.add_argument('--ort-profile', action='store_true',
+                        help='Add an ONNX Runtime per-operator / per-provider breakdown')
+    parser.add_argument('--ort-runs', type=int, default=50, help='Inferences traced for --ort-profile')
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    print(f"\n{'stage':<52}{'p50 ms':>10}{'p95 ms':>10}")
+    for key, stats in report["results"].items():
+        print(f"{key:<52}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}")
+
+    profile = report.get("ort_profile")
+    if profile:
+        print(f"\n{'provider':<32}{'ms/run':>10}{'share':>9}")
+        for provider, stats in profile["by_provider"].items():
+            print(f"{provider:<32}{stats['ms_per_run']:>10.3f}{stats['share_pct']:>8.1f}%")
+        if profile["cpu_fallback"] is not None:
+            fallback = profile["cpu_fallback"]
+            print(f"CPU fallback: {fallback['nodes']}/{fallback['total_nodes']} nodes ({fallback['share_pct']:.1f}%)")
+        print(f"Operator breakdown: {profile['summary']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+
+        print(f"\n{'stage':<52}{'baseline':>10}{'current':>10}{'change':>9}")
+        for row in rows:
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(f"{row['stage']:<52}{row['baseline_ms']:>10.3f}{row['current_ms']:>10.3f}"
+                  f"{row['change_pct']:>8.1f}%{flag}")
+
+        if profile and baseline.get("ort_profile"):
+            # Informational: shows which operators a new export or quantization made faster or slower
+            print(f"\n{'operator':<28}{'baseline':>10}{'current':>10}{'change':>10}  providers")
+            for row in compare_operators(profile, baseline["ort_profile"]):
+                print(f"{row['op']:<28}{row['baseline_ms']:>10.3f}{row['current_ms']:>10.3f}"
+                      f"{row['change_ms']:>+10.3f}  {', '.join(row['providers'])}")
+
+        regressed = [row for row in rows if row["regressed"]]
+        if regressed:
+            print(f"\n{len(regressed)} stage(s) regressed by more than {args.threshold:.0f}%")
+            return 1
+        print(f"\nNo stage regressed by more than {args.threshold:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
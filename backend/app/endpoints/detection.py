@@ -8,13 +8,17 @@ from datetime import datetime
 from typing import Optional
 
 from app.models import DetectionRequest, DetectionResponse, RecyclableCategory
-from app.services.detection_service import process_image, detect_objects
-from app.services.firebase_service import verify_firebase_token, update_user_points, add_scan_record
-from app.services.external_api import get_recycling_info
+from app.services.detection_service import process_image, select_variant
+from app.services.inference_executor import InferenceQueueFullError, run_in_inference_executor
+from app.services.inference_scheduler import schedule_detection
+from app.services.frame_cache import detect_frame
+from app.services.preprocessing import ImageTooLargeError, check_image_size
+from app.services.firebase_service import get_recycling_info, verify_firebase_token, update_user_points, add_scan_record
 from app.config import settings
 from app.utils.logger import get_logger
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 logger = get_logger(__name__)
 
 @router.post("/detect", response_model=DetectionResponse)
@@ -52,8 +56,16 @@ async def detect_image(
     
     # Read and process the uploaded image
     try:
+        # Reject oversized uploads before reading them into memory
+        if file.size is not None:
+            check_image_size(file.size)
         image_content = await file.read()
-        processed_image = process_image(image_content)
+        variant = select_variant("detect")
+        processed_image = await run_in_inference_executor(process_image, image_content, variant=variant)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Image processing error: {str(e)}")
         return DetectionResponse(
@@ -70,7 +82,7 @@ async def detect_image(
     
     # Run object detection
     try:
-        detections = detect_objects(processed_image)
+        detections = await schedule_detection(processed_image, variant=variant)
         
         # If no detections or below threshold
         if not detections or max(d.confidence for d in detections) < confidence_threshold:
@@ -120,6 +132,8 @@ async def detect_image(
             points_earned=points_earned
         )
         
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Detection error: {str(e)}")
         return DetectionResponse(
@@ -156,8 +170,15 @@ async def detect_image_base64(
     
     # Decode the base64 image
     try:
+        # Base64 inflates the payload by 4/3 - check the decoded size up front
+        check_image_size(len(request.image) * 3 // 4)
         image_data = base64.b64decode(request.image)
-        processed_image = process_image(image_data)
+        variant = select_variant("detect-base64")
+        processed_image = await run_in_inference_executor(process_image, image_data, variant=variant)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Image processing error: {str(e)}")
         return DetectionResponse(
@@ -173,7 +194,7 @@ async def detect_image_base64(
     
     # Run object detection
     try:
-        detections = detect_objects(processed_image)
+        detections = await schedule_detection(processed_image, variant=variant)
         
         # If no detections or below threshold
         if not detections or max(d.confidence for d in detections) < confidence_threshold:
@@ -220,6 +241,8 @@ async def detect_image_base64(
             points_earned=points_earned
         )
         
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Detection error: {str(e)}")
         return DetectionResponse(
@@ -256,8 +279,10 @@ async def continuous_detection(
     
     # Process image
     try:
+        check_image_size(len(request.image) * 3 // 4)
         image_data = base64.b64decode(request.image)
-        processed_image = process_image(image_data, resize_for_streaming=True)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Image processing error: {str(e)}")
         return DetectionResponse(
@@ -267,8 +292,12 @@ async def continuous_detection(
     
     # Lightweight detection for streaming
     try:
-        # Use a faster detection model or settings for streaming
-        detections = detect_objects(processed_image, optimized_for_streaming=True)
+        # Streaming frames run on the fast model variant; consecutive near-identical
+        # frames from the same user reuse the previous result
+        variant = select_variant("continuous-detection", optimized_for_streaming=True)
+        detections = await detect_frame(
+            f"user:{request.user_id}:{variant}", image_data, variant=variant, endpoint="continuous-detection"
+        )
         
         # If no detections or below threshold, return quickly
         if not detections or max(d.confidence for d in detections) < settings.DETECTION_CONFIDENCE_THRESHOLD:
@@ -291,6 +320,10 @@ async def continuous_detection(
             points_earned=None    # Don't calculate points yet
         )
         
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Streaming detection error: {str(e)}")
         return DetectionResponse(
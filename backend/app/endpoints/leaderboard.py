@@ -6,8 +6,9 @@ from datetime import datetime
 from app.models import Leaderboard, LeaderboardEntry
 from app.services.firebase_service import verify_firebase_token, get_leaderboard
 from app.utils.logger import get_logger
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 logger = get_logger(__name__)
 
 @router.get("/leaderboard", response_model=Leaderboard)
@@ -0,0 +1,155 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+
+from app.services.connection_manager import connection_manager
+from app.services.detection_service import INFERENCE_MODE, get_cascade_stats, get_model_plan, get_variant_stats
+from app.services.frame_cache import frame_cache
+from app.services.inference_executor import InferenceQueueFullError, executor, run_in_inference_executor
+from app.services.inference_scheduler import get_scheduler_stats
+from app.services.firebase_service import verify_firebase_token
+from app.services.ort_profiler import ORT_PROFILE_RUNS, profile_variant
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+from app.utils.profiling import ProfiledRoute, request_profiler
+
+router = APIRouter(route_class=ProfiledRoute)
+logger = get_logger(__name__)
+
+# Comma-separated Firebase UIDs allowed to use admin endpoints, besides users with an admin claim
+ADMIN_USER_IDS = {uid.strip() for uid in get_setting("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+class ProfilingConfig(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0, description="Fraction of requests to profile")
+    header_trigger: bool = Field(True, description="Also profile requests carrying the profiling header")
+    max_profiles: Optional[int] = Field(None, ge=1, description="Switch off again after this many profiles")
+
+async def _require_admin(authorization: Optional[str]) -> Dict[str, Any]:
+    """Verify the bearer token and check that it belongs to an admin"""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    
+    token = authorization.replace("Bearer ", "")
+    try:
+        user = await verify_firebase_token(token)
+    except Exception as e:
+        logger.error(f"Authentication error: {str(e)}")
+        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+    
+    is_admin = user.get("admin", False) or (user.get("custom_claims") or {}).get("admin", False)
+    if not is_admin and user["uid"] not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return user
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Expose this worker's metrics in the Prometheus text format.
+    
+    Includes per-stage pipeline latency (decode, preprocess, inference,
+    postprocess), token verification, Firestore and recycling-info call
+    latency, open WebSocket streams and inference queue depth.
+    """
+    return PlainTextResponse(registry.exposition(), media_type="text/plain; version=0.0.4")
+
+@router.get("/debug/inference-stats")
+async def inference_stats(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Report micro-batching scheduler metrics for this worker.
+    
+    Includes batch-size and queue-wait distributions so the maximum batch size
+    and maximum wait time can be tuned against p99 latency.
+    """
+    await _require_admin(authorization)
+    stats = {
+        "executor": executor.stats(),
+        "schedulers": get_scheduler_stats(),
+        "models": get_variant_stats(),
+        "frame_cache": frame_cache.stats(),
+        "cascade": get_cascade_stats()
+    }
+    if INFERENCE_MODE == "remote":
+        from app.services.inference_server import get_client
+        stats["inference_server"] = get_client().stats()
+    return stats
+
+@router.get("/debug/model-plan")
+async def model_plan(
+    variant: Optional[str] = None,
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    Show the I/O plan resolved for a loaded ONNX model variant.
+    
+    Reports input name, layout, dtype, static/dynamic dimensions, output names
+    and the output layout the post-processor will assume.
+    """
+    await _require_admin(authorization)
+    plan = get_model_plan(variant)
+    if plan is None:
+        raise HTTPException(status_code=503 if variant is None else 404, detail="Model not loaded")
+    return plan.to_dict()
+
+@router.get("/debug/connections")
+async def connection_stats(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Report WebSocket stream capacity and per-connection frame rate and latency for this worker.
+    """
+    await _require_admin(authorization)
+    return connection_manager.stats()
+
+@router.get("/debug/profiling")
+async def profiling_status(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Show whether on-demand request profiling is on and how many profiles it has written.
+    """
+    await _require_admin(authorization)
+    return request_profiler.status()
+
+@router.post("/debug/profiling")
+async def configure_profiling(
+    config: ProfilingConfig,
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    Switch on-demand request profiling on or off without a restart.
+    
+    Selected requests (a random `sample_rate` fraction, and/or requests carrying
+    the profiling header) run under cProfile. Each one writes a .prof file, a
+    .folded collapsed-stack file for flame graphs and a .json file with the
+    route and timing under logs/profiles/. The setting applies to this worker only.
+    """
+    user = await _require_admin(authorization)
+    logger.info(f"Request profiling reconfigured by {user['uid']}: {config.dict()}")
+    return request_profiler.configure(
+        enabled=config.enabled,
+        sample_rate=config.sample_rate,
+        header_trigger=config.header_trigger,
+        max_profiles=config.max_profiles
+    )
+
+@router.post("/debug/ort-profile")
+async def ort_profile(
+    variant: Optional[str] = None,
+    runs: int = Query(ORT_PROFILE_RUNS, ge=1, le=1000, description="Inferences to trace"),
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    Profile a model variant with ONNX Runtime session profiling.
+    
+    Runs the variant's model `runs` times in a separate profiling session and
+    returns the time per operator type, per execution provider and per node,
+    plus the nodes that fell back to the CPU provider. The raw trace, the JSON
+    report and a text summary are saved under logs/ort_profiles/.
+    """
+    await _require_admin(authorization)
+    try:
+        return await run_in_inference_executor(profile_variant, variant, runs)
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"ORT profiling failed: {e}")
+        raise HTTPException(status_code=500, detail=f"ORT profiling failed: {str(e)}")
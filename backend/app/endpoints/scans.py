@@ -6,8 +6,9 @@ from datetime import datetime, timedelta
 from app.models import UserScanHistory, ScanRecord
 from app.services.firebase_service import verify_firebase_token, get_user_scans, get_scan_details
 from app.utils.logger import get_logger
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 logger = get_logger(__name__)
 
 @router.get("/users/{user_id}/scans", response_model=UserScanHistory)
@@ -2,10 +2,19 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPExce
 import base64
 import json
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 import asyncio
+import time
 
-from app.services.detection_service import process_image, detect_objects
+from app.services.connection_manager import StreamCapacityError, connection_manager
+from app.services.detection_service import select_variant
+from app.services.frame_cache import detect_frame, frame_cache
+from app.services.frame_mailbox import LatestFrameMailbox
+from app.services.frame_protocol import PROTOCOL_BINARY, decode_frame, negotiate_protocol
+from app.services.inference_executor import InferenceQueueFullError, run_in_inference_executor
+from app.services.motion_gate import MotionGate, frame_thumbnail
+from app.services.preprocessing import check_image_size
+from app.services.tracker import STREAM_TRACKING_ENABLED, StreamTracker, tracking_frame
 from app.services.firebase_service import verify_firebase_token
 from app.config import settings
 from app.utils.logger import get_logger
@@ -13,8 +22,27 @@ from app.utils.logger import get_logger
 router = APIRouter()
 logger = get_logger(__name__)
 
-# Track active connections
-active_connections: Dict[str, WebSocket] = {}
+def _frame_reply(payload: Dict, sequence: Optional[int], dropped_frames: int) -> Dict:
+    """
+    Add per-frame bookkeeping to a reply: how many frames were skipped because
+    newer ones arrived, and a binary frame's sequence number so the client can
+    match replies to frames.
+    """
+    payload["dropped_frames"] = dropped_frames
+    if sequence is not None:
+        payload["sequence"] = sequence
+    return payload
+
+async def _receive_frames(websocket: WebSocket, mailbox: LatestFrameMailbox, binary_frames: bool) -> None:
+    """Read frames as fast as the client sends them; only the newest one is kept"""
+    try:
+        while True:
+            if binary_frames:
+                mailbox.put(await websocket.receive_bytes())
+            else:
+                mailbox.put(await websocket.receive_text())
+    except Exception as e:
+        mailbox.close(e)
 
 @router.websocket("/ws/detection/{user_id}")
 async def websocket_detection(websocket: WebSocket, user_id: str):
@@ -26,6 +54,8 @@ async def websocket_detection(websocket: WebSocket, user_id: str):
     """
     # Accept the connection
     await websocket.accept()
+    receiver = None
+    session = None
     
     try:
         # Get token for authentication
@@ -51,61 +81,137 @@ async def websocket_detection(websocket: WebSocket, user_id: str):
             await websocket.close()
             return
         
-        # Add to active connections
-        active_connections[user_id] = websocket
-        logger.info(f"WebSocket connection established for user {user_id}")
+        # Register the stream; users may hold several, but the worker's capacity is capped
+        try:
+            session = connection_manager.connect(user_id, websocket)
+        except StreamCapacityError as e:
+            logger.warning(f"WebSocket stream rejected for user {user_id}: {e}")
+            await websocket.send_json({"status": "rejected", "error": str(e)})
+            await websocket.close(code=1013)  # Try Again Later
+            return
+        logger.info(
+            f"WebSocket connection established for user {user_id} "
+            f"(session {session.session_id}{', downgraded' if session.downgraded else ''})"
+        )
+        
+        # Clients that ask for it send raw image bytes instead of base64 JSON
+        protocol = negotiate_protocol(auth_data)
+        binary_frames = protocol["protocol"] == PROTOCOL_BINARY
         
         # Send confirmation
-        await websocket.send_json({"status": "connected", "message": "WebSocket connection established"})
+        await websocket.send_json({
+            "status": "connected",
+            "message": "WebSocket connection established",
+            "session_id": session.session_id,
+            "downgraded": session.downgraded,
+            **protocol
+        })
+        
+        # Streaming frames run on the fast model variant unless configured otherwise
+        variant = select_variant("websocket", optimized_for_streaming=True)
+        # Near-duplicate frames on this connection reuse earlier results
+        stream_key = f"ws:{session.session_id}"
+        # While the view is static, re-send the last result instead of running the model
+        motion_gate = MotionGate()
+        last_detections = None
+        last_track_ids = None
+        # Detect-then-track: run the detector every few frames and follow boxes in between.
+        # Downgraded streams always track to save detector passes.
+        tracking = session.downgraded or auth_data.get("tracking", STREAM_TRACKING_ENABLED)
+        tracker = StreamTracker() if tracking else None
+        
+        # Frames are received on their own task; inference always takes the newest one
+        mailbox = LatestFrameMailbox()
+        receiver = asyncio.create_task(_receive_frames(websocket, mailbox, binary_frames))
         
         # Process incoming frames
         while True:
             # Wait for next frame
-            data = await websocket.receive_text()
-            frame_data = json.loads(data)
+            message = await mailbox.get()
+            started = time.perf_counter()
+            sequence = None
             
             # Extract image data
             try:
-                image_data = base64.b64decode(frame_data["image"])
-                client_confidence = frame_data.get("confidence")
+                if binary_frames:
+                    binary_frame = decode_frame(message)
+                    sequence = binary_frame.sequence
+                    check_image_size(len(binary_frame.image))
+                    image_data = binary_frame.image
+                    client_confidence = binary_frame.client_confidence
+                else:
+                    frame_data = json.loads(message)
+                    check_image_size(len(frame_data["image"]) * 3 // 4)
+                    image_data = base64.b64decode(frame_data["image"])
+                    client_confidence = frame_data.get("confidence")
                 
-                # Process image with optimized settings for streaming
-                processed_image = process_image(image_data, resize_for_streaming=True)
-                detections = detect_objects(processed_image, optimized_for_streaming=True)
+                # Streams share inference capacity in weighted-fair order
+                async with connection_manager.inference_slot(session):
+                    thumbnail = None
+                    if motion_gate.enabled:
+                        thumbnail = await run_in_inference_executor(frame_thumbnail, image_data)
+                
+                    if last_detections is not None and not motion_gate.should_infer(thumbnail):
+                        detections, track_ids = last_detections, last_track_ids
+                    else:
+                        if tracker is not None:
+                            frame = await run_in_inference_executor(tracking_frame, image_data)
+                            if tracker.needs_detection():
+                                detections = await detect_frame(stream_key, image_data, variant=variant, endpoint="websocket")
+                                tracks = await run_in_inference_executor(tracker.update, frame, detections)
+                            else:
+                                tracks = await run_in_inference_executor(tracker.propagate, frame)
+                            detections = [track.to_detection() for track in tracks]
+                            track_ids = [track.track_id for track in tracks]
+                        else:
+                            # Detect on the streaming model variant (or reuse a near-duplicate's result)
+                            detections = await detect_frame(stream_key, image_data, variant=variant, endpoint="websocket")
+                            track_ids = None
+                        motion_gate.update(thumbnail)
+                        last_detections, last_track_ids = detections, track_ids
                 
                 # Check confidence threshold
                 if not detections or max(d.confidence for d in detections) < settings.DETECTION_CONFIDENCE_THRESHOLD:
                     # No high confidence detection, send minimal response
-                    await websocket.send_json({
+                    await websocket.send_json(_frame_reply({
                         "status": "processing",
                         "detection": None
-                    })
+                    }, sequence, mailbox.dropped_frames))
                     continue
                 
                 # Get best detection
-                best_detection = max(detections, key=lambda d: d.confidence)
+                best_index = max(range(len(detections)), key=lambda i: detections[i].confidence)
+                best_detection = detections[best_index]
                 
                 # Send detection result
-                await websocket.send_json({
+                result = {
+                    "category": best_detection.category.value,
+                    "confidence": best_detection.confidence,
+                    "bounding_box": best_detection.bounding_box.dict() if best_detection.bounding_box else None
+                }
+                if track_ids is not None:
+                    result["track_id"] = track_ids[best_index]
+                await websocket.send_json(_frame_reply({
                     "status": "detection",
-                    "detection": {
-                        "category": best_detection.category.value,
-                        "confidence": best_detection.confidence,
-                        "bounding_box": best_detection.bounding_box.dict() if best_detection.bounding_box else None
-                    }
-                })
+                    "detection": result
+                }, sequence, mailbox.dropped_frames))
                 
+            except InferenceQueueFullError:
+                # Server is saturated - skip this frame, the client will send another
+                await websocket.send_json(_frame_reply({
+                    "status": "busy",
+                    "detection": None
+                }, sequence, mailbox.dropped_frames))
             except Exception as e:
                 logger.error(f"Error processing frame: {e}")
-                await websocket.send_json({
+                await websocket.send_json(_frame_reply({
                     "status": "error",
                     "message": f"Error processing frame: {str(e)}"
-                })
+                }, sequence, mailbox.dropped_frames))
+            finally:
+                session.record_frame(time.perf_counter() - started, mailbox.dropped_frames)
     
     except WebSocketDisconnect:
-        # Remove from active connections
-        if user_id in active_connections:
-            del active_connections[user_id]
         logger.info(f"WebSocket connection closed for user {user_id}")
     
     except Exception as e:
@@ -115,7 +221,11 @@ async def websocket_detection(websocket: WebSocket, user_id: str):
             await websocket.close()
         except:
             pass
-        
+    
+    finally:
         # Cleanup
-        if user_id in active_connections:
-            del active_connections[user_id]
\ No newline at end of file
+        if receiver is not None:
+            receiver.cancel()
+        if session is not None:
+            connection_manager.disconnect(session)
+            frame_cache.drop(f"ws:{session.session_id}")
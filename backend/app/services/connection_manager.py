@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import itertools
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple
+
+import numpy as np
+from fastapi import WebSocket
+
+from app.services.inference_executor import executor
+from app.services.inference_scheduler import MAX_BATCH_SIZE
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+
+logger = get_logger(__name__)
+
+# Concurrent streams per worker, in total and per user (e.g. several browser tabs)
+WS_MAX_STREAMS = get_setting("WS_MAX_STREAMS", 64)
+WS_MAX_STREAMS_PER_USER = get_setting("WS_MAX_STREAMS_PER_USER", 4)
+# Past this fraction of WS_MAX_STREAMS, new streams are admitted downgraded
+WS_DOWNGRADE_AT = get_setting("WS_DOWNGRADE_AT", 0.75)
+# Fair-share weight of a downgraded stream relative to a normal one
+WS_DOWNGRADED_WEIGHT = get_setting("WS_DOWNGRADED_WEIGHT", 0.5)
+# Frames from all streams that may be in inference at once (enough to fill every batch)
+WS_INFERENCE_SLOTS = get_setting("WS_INFERENCE_SLOTS", executor.max_workers * MAX_BATCH_SIZE)
+
+# Frames kept per session for frame-rate and latency stats
+_SESSION_WINDOW = 120
+
+
+class StreamCapacityError(Exception):
+    """No capacity for another stream on this worker (or for this user)"""
+    pass
+
+
+@dataclass
+class StreamSession:
+    """One WebSocket stream and its inference bookkeeping"""
+    user_id: str
+    websocket: WebSocket
+    downgraded: bool = False
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    connected_at: float = field(default_factory=time.time)
+    frames: int = 0
+    dropped_frames: int = 0
+    # Weighted-fair queueing tag: advances by 1/weight per granted slot
+    virtual_time: float = 0.0
+    _recent: Deque[Tuple[float, float]] = field(default_factory=lambda: deque(maxlen=_SESSION_WINDOW))
+
+    @property
+    def weight(self) -> float:
+        return WS_DOWNGRADED_WEIGHT if self.downgraded else 1.0
+
+    def record_frame(self, latency: float, dropped_frames: int) -> None:
+        """
+        Record one processed frame.
+
+        Args:
+            latency: Seconds from taking the frame to sending its reply
+            dropped_frames: Total frames dropped so far by the connection's mailbox
+        """
+        self.frames += 1
+        self.dropped_frames = dropped_frames
+        self._recent.append((time.perf_counter(), latency))
+
+    def stats(self) -> Dict[str, Any]:
+        recent = list(self._recent)
+        fps = 0.0
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            fps = (len(recent) - 1) / (recent[-1][0] - recent[0][0])
+        latencies = np.array([latency for _, latency in recent]) * 1000.0
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "downgraded": self.downgraded,
+            "connected_seconds": time.time() - self.connected_at,
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "fps": fps,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if latencies.size else None,
+                "p95": float(np.percentile(latencies, 95)) if latencies.size else None
+            }
+        }
+
+
+class ConnectionManager:
+    """
+    Admission control and fair inference scheduling for WebSocket streams.
+
+    Users may hold several streams at once, up to `max_streams_per_user`. The
+    worker holds at most `max_streams`, and once `downgrade_at` of that is in
+    use, new streams are admitted downgraded (cheaper tracking mode, half the
+    fair share).
+
+    Inference runs under `inference_slot`. When more streams want a slot than
+    there are slots, the slot goes to the waiting stream with the lowest
+    weighted virtual time. Every stream then gets a share of the model
+    proportional to its weight, however fast it sends.
+    """
+
+    def __init__(
+        self,
+        max_streams: int = WS_MAX_STREAMS,
+        max_streams_per_user: int = WS_MAX_STREAMS_PER_USER,
+        downgrade_at: float = WS_DOWNGRADE_AT,
+        inference_slots: int = WS_INFERENCE_SLOTS
+    ):
+        self.max_streams = max(1, int(max_streams))
+        self.max_streams_per_user = max(1, int(max_streams_per_user))
+        self.downgrade_threshold = int(self.max_streams * float(downgrade_at))
+        self.inference_slots = max(1, int(inference_slots))
+
+        self.sessions: Dict[str, StreamSession] = {}
+        self._free_slots = self.inference_slots
+        self._waiters: List[Tuple[float, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._virtual_clock = 0.0
+
+        self.streams_metric = registry.gauge("ws_active_streams", "Open WebSocket detection streams")
+        self.rejected_metric = registry.counter(
+            "ws_rejected_streams_total", "Streams refused because the worker or user was at capacity"
+        )
+        self.downgraded_metric = registry.counter(
+            "ws_downgraded_streams_total", "Streams admitted in downgraded mode"
+        )
+        self.slot_wait_metric = registry.histogram(
+            "ws_inference_slot_wait_seconds", "Time a stream waits for a fair inference slot"
+        )
+
+    def connect(self, user_id: str, websocket: WebSocket) -> StreamSession:
+        """
+        Admit a new stream.
+
+        Args:
+            user_id: Authenticated user
+            websocket: The connection
+
+        Returns:
+            The new session, possibly downgraded
+
+        Raises:
+            StreamCapacityError: If the worker or the user has no room for another stream
+        """
+        if len(self.sessions) >= self.max_streams:
+            self.rejected_metric.inc()
+            raise StreamCapacityError(f"Server at capacity ({self.max_streams} streams)")
+        if len(self.user_sessions(user_id)) >= self.max_streams_per_user:
+            self.rejected_metric.inc()
+            raise StreamCapacityError(f"Too many streams for this user (limit {self.max_streams_per_user})")
+
+        session = StreamSession(
+            user_id=user_id,
+            websocket=websocket,
+            downgraded=len(self.sessions) >= self.downgrade_threshold
+        )
+        # Start at the current clock so a new stream can't claim credit for time it wasn't connected
+        session.virtual_time = self._virtual_clock
+        if session.downgraded:
+            self.downgraded_metric.inc()
+
+        self.sessions[session.session_id] = session
+        self.streams_metric.set(len(self.sessions))
+        return session
+
+    def disconnect(self, session: StreamSession) -> None:
+        self.sessions.pop(session.session_id, None)
+        self.streams_metric.set(len(self.sessions))
+
+    def user_sessions(self, user_id: str) -> List[StreamSession]:
+        return [session for session in self.sessions.values() if session.user_id == user_id]
+
+    @asynccontextmanager
+    async def inference_slot(self, session: StreamSession) -> AsyncIterator[None]:
+        """Hold one of the shared inference slots, granted in weighted-fair order"""
+        started = time.perf_counter()
+        if self._free_slots > 0 and not self._waiters:
+            self._free_slots -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiter = (session.virtual_time, next(self._order), future)
+            heapq.heappush(self._waiters, waiter)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                elif not future.cancelled():
+                    # Hand over a slot that was granted just as the stream went away
+                    self._release()
+                raise
+
+        self._virtual_clock = max(self._virtual_clock, session.virtual_time)
+        session.virtual_time = max(session.virtual_time, self._virtual_clock) + 1.0 / session.weight
+        self.slot_wait_metric.observe(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # Skip waiters whose task was cancelled but hasn't run its cleanup yet
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free_slots += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Capacity usage plus per-stream frame rate and latency"""
+        return {
+            "streams": len(self.sessions),
+            "max_streams": self.max_streams,
+            "max_streams_per_user": self.max_streams_per_user,
+            "downgrade_threshold": self.downgrade_threshold,
+            "inference_slots": self.inference_slots,
+            "free_slots": self._free_slots,
+            "waiting": len(self._waiters),
+            "rejected": self.rejected_metric.value,
+            "sessions": [session.stats() for session in self.sessions.values()]
+        }
+
+
+# Shared per-worker manager
+connection_manager = ConnectionManager()
@@ -1,55 +1,234 @@
-# Modify: backend/app/services/detection_service.py
-
+import os
+import json
+import time
+import dataclasses
+import threading
 import numpy as np
 import cv2
-from typing import List, Optional, Tuple
-import tensorflow as tf
-import logging
-from io import BytesIO
-from PIL import Image
-import torch
-import torch.nn as nn
-import onnxruntime
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from app.models import Detection, RecyclableCategory, BoundingBox
 from app.config import settings
-from app.services.npu_service import is_npu_available, get_npu_delegate
+from app.services.model_plan import ModelPlan, build_model_plan
+from app.services.npu_service import CPU_PROVIDER, get_execution_providers
+from app.services.session_factory import create_session
+from app.services.preprocessing import (
+    ImageTooLargeError,
+    LetterboxInfo,
+    PreprocessedImage,
+    get_buffer_pool,
+    preprocess
+)
+from app.utils.enviroment import get_setting
 from app.utils.logger import get_logger
+from app.utils.metrics import registry
 
 logger = get_logger(__name__)
 
-# Define Distribution Focal Loss (needed for post-processing)
-class DFL(nn.Module):
-    def __init__(self, c1=16):
-        super().__init__()
-        self.conv = nn.Conv2d(c1, 1, 1, bias=False).requires_grad_(False)
-        x = torch.arange(c1, dtype=torch.float)
-        self.conv.weight.data[:] = nn.Parameter(x.view(1, c1, 1, 1))
-        self.c1 = c1
-
-    def forward(self, x):
-        b, c, a = x.shape  # batch, channels, anchors
-        return self.conv(x.view(b, 4, self.c1, a).transpose(2, 1).softmax(1)).view(b, 4, a)
-
-# Convert distance format to bounding box
-def dist2bbox(distance, anchor_points, xywh=True, dim=-1):
-    lt, rb = torch.split(distance, 2, dim)
-    x1y1 = anchor_points - lt
-    x2y2 = anchor_points + rb
-    if xywh:
-        c_xy = (x1y1 + x2y2) / 2
-        wh = x2y2 - x1y1
-        return torch.cat((c_xy, wh), dim)
-    return torch.cat((x1y1, x2y2), dim)
+# Torch-based decode helpers load on first access only (see torch_ops.py)
+_TORCH_OPS = ("DFL", "dist2bbox")
+
+
+def __getattr__(name):
+    if name in _TORCH_OPS:
+        from app.services import torch_ops
+        return getattr(torch_ops, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Post-processing parameters
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = get_setting("NMS_IOU_THRESHOLD", 0.45)
+MAX_DETECTIONS = get_setting("MAX_DETECTIONS", 100)
+MAX_NMS_CANDIDATES = 3000
+# Per-class NMS shift; larger than any box coordinate (same bound as Ultralytics' max_wh)
+NMS_CLASS_OFFSET = 7680.0
+
+# Bind inputs/outputs with ONNX Runtime IOBinding so each inference thread reuses
+# preallocated output buffers instead of allocating new arrays on every run
+ORT_IO_BINDING = get_setting("ORT_IO_BINDING", True)
+
+# "local" runs the model in this process; "remote" leaves it to the
+# out-of-process inference server (see inference_server.py)
+INFERENCE_MODE = get_setting("INFERENCE_MODE", "local")
+
+# Model variants: the snapshot path runs the accurate model, the streaming path a
+# smaller / lower-resolution one. MODEL_VARIANTS (JSON) overrides or adds entries
+# as {"name": {"path": "model.onnx", "input_size": [width, height]}}.
+DEFAULT_VARIANT = "accurate"
+_DEFAULT_VARIANT_SPECS = {
+    "fast": {"path": "backend/data/models/yolov8n_recycling_320.onnx", "input_size": [320, 320]},
+}
+STREAMING_VARIANT = get_setting("STREAMING_MODEL_VARIANT", "fast")
+SNAPSHOT_VARIANT = get_setting("SNAPSHOT_MODEL_VARIANT", DEFAULT_VARIANT)
+# Per-endpoint overrides, e.g. "websocket=fast,continuous-detection=fast,detect=accurate"
+ENDPOINT_VARIANTS = get_setting("ENDPOINT_MODEL_VARIANTS", "")
+
+# Cascade: a small gate model screens frames before the main (accurate) model. Frames
+# whose best gate score is below the endpoint's threshold are answered as empty; the
+# rest are escalated to CASCADE_MAIN_VARIANT in place of the endpoint's own variant.
+# e.g. "continuous-detection=0.15,websocket=0.2"; endpoints not listed go straight to
+# their model.
+CASCADE_GATE_VARIANT = get_setting("CASCADE_GATE_VARIANT", "fast")
+CASCADE_MAIN_VARIANT = get_setting("CASCADE_MAIN_VARIANT", DEFAULT_VARIANT)
+CASCADE_THRESHOLDS = get_setting("CASCADE_THRESHOLDS", "")
+
+inference_stage_metric = registry.stage("inference")
+postprocess_stage_metric = registry.stage("postprocess")
+
+class ModelVariant:
+    """A loaded model: its session, I/O plan and per-variant latency metrics"""
+    
+    def __init__(self, name: str, model_path: str, session, plan: ModelPlan, io_binding: bool = ORT_IO_BINDING):
+        self.name = name
+        self.model_path = model_path
+        self.session = session
+        self.plan = plan
+        self.io_binding = io_binding
+        # Per inference thread: {input shape: (IOBinding, preallocated output)}
+        self._bindings = threading.local()
+        
+        labels = {"variant": name}
+        self.run_time_metric = registry.histogram(
+            "inference_model_run_seconds", "Model run time per call, by variant", labels=labels
+        )
+        self.frames_metric = registry.counter(
+            "inference_model_frames_total", "Frames run through the model, by variant", labels=labels
+        )
+    
+    def run(self, batch: np.ndarray) -> List[np.ndarray]:
+        """
+        Run the detection head on a prepared batch and record its latency.
+        
+        With IOBinding the returned array is this thread's preallocated output
+        buffer for the batch shape: it is overwritten by the thread's next run of
+        the same shape, so callers must be done with it (or copy it) by then.
+        """
+        started = time.perf_counter()
+        if self.io_binding:
+            outputs = self._run_bound(batch)
+        else:
+            outputs = self.session.run(self.plan.output_names[:1], {self.plan.input_name: batch})
+        elapsed = time.perf_counter() - started
+        self.run_time_metric.observe(elapsed)
+        inference_stage_metric.observe(elapsed)
+        self.frames_metric.inc(batch.shape[0])
+        return outputs
+    
+    def _run_bound(self, batch: np.ndarray) -> List[np.ndarray]:
+        bindings = getattr(self._bindings, "by_shape", None)
+        if bindings is None:
+            bindings = self._bindings.by_shape = {}
+        
+        batch = np.ascontiguousarray(batch)
+        bound = bindings.get(batch.shape)
+        if bound is None:
+            return self._bind(batch, bindings)
+        
+        binding, output = bound
+        binding.bind_cpu_input(self.plan.input_name, batch)
+        self.session.run_with_iobinding(binding)
+        return [output]
+    
+    def _bind(self, batch: np.ndarray, bindings: Dict[Tuple[int, ...], Any]) -> List[np.ndarray]:
+        """
+        First run for an input shape: let ONNX Runtime allocate the output to learn
+        its shape and dtype, then bind a preallocated buffer for later runs.
+        Outputs are bound to host memory, which works for every execution provider.
+        """
+        output_name = self.plan.output_names[0]
+        try:
+            binding = self.session.io_binding()
+            binding.bind_cpu_input(self.plan.input_name, batch)
+            binding.bind_output(output_name)
+            self.session.run_with_iobinding(binding)
+            result = binding.copy_outputs_to_cpu()[0]
+            
+            output = np.empty(result.shape, dtype=result.dtype)
+            binding.bind_output(output_name, "cpu", 0, output.dtype, output.shape, output.ctypes.data)
+        except Exception as e:
+            logger.warning(f"IOBinding unavailable for model variant '{self.name}', using plain runs: {e}")
+            self.io_binding = False
+            return self.session.run(self.plan.output_names[:1], {self.plan.input_name: batch})
+        
+        bindings[batch.shape] = (binding, output)
+        return [result]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_path": self.model_path,
+            "input_size": list(self.plan.input_size),
+            "io_binding": self.io_binding,
+            "frames": self.frames_metric.value,
+            "run_seconds": self.run_time_metric.snapshot()
+        }
+
+def _parse_endpoint_variants(value: Union[str, Dict[str, str]]) -> Dict[str, str]:
+    if isinstance(value, dict):
+        return dict(value)
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {endpoint.strip(): variant.strip() for endpoint, variant in pairs}
+
+_ENDPOINT_VARIANT_MAP = _parse_endpoint_variants(ENDPOINT_VARIANTS)
+_CASCADE_THRESHOLD_MAP = {
+    endpoint: float(threshold) for endpoint, threshold in _parse_endpoint_variants(CASCADE_THRESHOLDS).items()
+}
+
+def _variant_specs() -> Dict[str, Dict[str, Any]]:
+    specs = {name: dict(spec) for name, spec in _DEFAULT_VARIANT_SPECS.items()}
+    overrides = get_setting("MODEL_VARIANTS", "")
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides) if overrides else {}
+    for name, spec in overrides.items():
+        specs[name] = dict(spec)
+    return specs
 
 # Load model once at module initialization
 try:
     MODEL = None
+    MODEL_PLAN: Optional[ModelPlan] = None
+    MODELS: Dict[str, ModelVariant] = {}
     LABELS = ['plastic', 'metal', 'paper', 'glass', 'organic', 'other']
     INPUT_SIZE = (640, 640)  # Default YOLOv8 input size
     
+    def _create_model_session(model_path: str):
+        # Ordered provider list from the cached hardware probe; ONNX Runtime
+        # assigns each node to the first provider that supports it
+        providers = get_execution_providers()
+        provider_names = [name for name, _ in providers]
+        logger.info(f"Loading model with {provider_names}: {model_path}")
+        
+        try:
+            session = create_session(model_path, providers)
+        except Exception as e:
+            if provider_names == [CPU_PROVIDER]:
+                raise
+            logger.warning(f"Accelerated session failed ({e}), falling back to CPU")
+            session = create_session(model_path, [(CPU_PROVIDER, {})])
+        logger.info(f"Session providers: {session.get_providers()}")
+        return session
+    
+    def _load_variant(name: str, spec: Dict[str, Any]) -> ModelVariant:
+        path = spec.get("path")
+        input_size = tuple(spec["input_size"]) if spec.get("input_size") else None
+        
+        if path and os.path.exists(path):
+            session = _create_model_session(path)
+            plan = build_model_plan(session, default_input_size=input_size or INPUT_SIZE)
+            if input_size and plan.input_size != input_size:
+                logger.warning(f"Model variant '{name}' has a fixed input of {plan.input_size}; ignoring {input_size}")
+            return ModelVariant(name, path, session, plan)
+        
+        default = MODELS[DEFAULT_VARIANT]
+        if input_size and default.plan.dynamic_spatial:
+            # Same weights at a lower resolution: share the session, only the plan differs
+            logger.info(f"Model variant '{name}' runs {default.model_path} at {input_size[0]}x{input_size[1]}")
+            return ModelVariant(name, default.model_path, default.session, dataclasses.replace(default.plan, input_size=input_size))
+        
+        logger.warning(f"Model variant '{name}' unavailable ({path} not found), using '{DEFAULT_VARIANT}'")
+        return ModelVariant(name, default.model_path, default.session, default.plan)
+    
     def load_model():
-        global MODEL, LABELS
+        global MODEL, MODEL_PLAN, MODELS, LABELS, INPUT_SIZE
         
         # Path to your custom trained model
         model_path = settings.MODEL_PATH
@@ -58,110 +237,249 @@ try:
             model_path = 'backend/data/models/yolov8m_recycling.onnx'
             if not os.path.exists(model_path):
                 model_path = 'backend/data/models/yolov8m.onnx'
-                
-        # Check if NPU acceleration is available and enabled
-        if settings.ENABLE_NPU and is_npu_available():
-            logger.info(f"Loading model with NPU acceleration: {model_path}")
-            
-            # Initialize ONNX session with NPU provider
-            providers = ['VitisAIExecutionProvider']
-            provider_options = [{'config_file': settings.NPU_CONFIG_PATH}]
-            
-            session_options = onnxruntime.SessionOptions()
-            MODEL = onnxruntime.InferenceSession(
-                model_path,
-                providers=providers,
-                sess_options=session_options,
-                provider_options=provider_options
+        
+        MODEL = _create_model_session(model_path)
+        
+        # Inspect the session once; the per-frame path only follows this plan
+        MODEL_PLAN = build_model_plan(MODEL, default_input_size=INPUT_SIZE)
+        INPUT_SIZE = MODEL_PLAN.input_size
+        
+        # The accurate model is the default; other variants fall back to it
+        MODELS = {DEFAULT_VARIANT: ModelVariant(DEFAULT_VARIANT, model_path, MODEL, MODEL_PLAN)}
+        for name, spec in _variant_specs().items():
+            if name == DEFAULT_VARIANT:
+                continue
+            try:
+                MODELS[name] = _load_variant(name, spec)
+            except Exception as e:
+                logger.error(f"Error loading model variant '{name}': {e}")
+        logger.info(
+            "Model variants: " + ", ".join(
+                f"{name}={variant.plan.input_size[0]}x{variant.plan.input_size[1]}" for name, variant in MODELS.items()
             )
-        else:
-            logger.info(f"Loading model with CPU: {model_path}")
-            # Use ONNX Runtime with CPU provider
-            providers = ['CPUExecutionProvider']
-            MODEL = onnxruntime.InferenceSession(model_path, providers=providers)
+        )
+        
+        gate = MODELS.get(CASCADE_GATE_VARIANT) or MODELS[DEFAULT_VARIANT]
+        main = MODELS.get(CASCADE_MAIN_VARIANT) or MODELS[DEFAULT_VARIANT]
+        if gate.session is main.session:
+            for endpoint in _CASCADE_THRESHOLD_MAP:
+                logger.warning(
+                    f"Cascade for '{endpoint}' is disabled: gate '{CASCADE_GATE_VARIANT}' and main "
+                    f"'{CASCADE_MAIN_VARIANT}' resolve to the same model ({main.model_path})"
+                )
         
         # Use predefined recyclable categories
         LABELS = [c.value for c in RecyclableCategory]
         logger.info(f"Using category labels: {LABELS}")
     
-    # Load model at module initialization
-    load_model()
+    # Load model at module initialization. API workers in remote mode only
+    # need the labels - the inference server processes own the model.
+    if INFERENCE_MODE == "remote":
+        LABELS = [c.value for c in RecyclableCategory]
+        logger.info("Remote inference mode: model is served by the inference server")
+    else:
+        load_model()
     
 except Exception as e:
     logger.error(f"Error loading model: {e}")
     MODEL = None
+    MODEL_PLAN = None
+    MODELS = {}
     LABELS = []
 
-def process_image(image_data: bytes, resize_for_streaming: bool = False) -> np.ndarray:
+def get_variant(name: Optional[str] = None, optimized_for_streaming: bool = False) -> ModelVariant:
+    """
+    Look up a loaded model variant.
+    
+    Args:
+        name: Variant name; None picks the streaming or snapshot default
+        optimized_for_streaming: Used when no name is given
+    
+    Returns:
+        The requested variant, or the default variant if it isn't loaded
+    """
+    if name is None:
+        name = STREAMING_VARIANT if optimized_for_streaming else SNAPSHOT_VARIANT
+    variant = MODELS.get(name) or MODELS.get(DEFAULT_VARIANT)
+    if variant is None:
+        raise ValueError("Model not loaded. Please initialize the model first.")
+    return variant
+
+def select_variant(endpoint: str, optimized_for_streaming: bool = False) -> str:
+    """
+    Choose the model variant for an endpoint.
+    
+    Args:
+        endpoint: Endpoint key, e.g. "detect", "continuous-detection" or "websocket"
+        optimized_for_streaming: Whether the endpoint serves a live stream
+    
+    Returns:
+        Variant name from ENDPOINT_MODEL_VARIANTS, else the streaming or snapshot default
+    """
+    return _ENDPOINT_VARIANT_MAP.get(endpoint) or (STREAMING_VARIANT if optimized_for_streaming else SNAPSHOT_VARIANT)
+
+def get_variant_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-variant configuration and latency metrics"""
+    return {name: variant.stats() for name, variant in MODELS.items()}
+
+def get_model_plan(variant: Optional[str] = None) -> Optional[ModelPlan]:
+    """Return the I/O plan resolved for the loaded model (None if no model is loaded)"""
+    if variant is not None:
+        return MODELS[variant].plan if variant in MODELS else None
+    return MODEL_PLAN
+
+def cascade_threshold(endpoint: Optional[str]) -> Optional[float]:
+    """
+    Gate threshold for an endpoint's frames.
+    
+    Args:
+        endpoint: Endpoint key, as for select_variant
+    
+    Returns:
+        The threshold, or None if the endpoint isn't cascaded or the gate would be
+        the same model as CASCADE_MAIN_VARIANT (load_model warns about this)
+    """
+    threshold = _CASCADE_THRESHOLD_MAP.get(endpoint)
+    if threshold is None or not MODELS:
+        return None
+    if get_variant(CASCADE_GATE_VARIANT).session is get_variant(CASCADE_MAIN_VARIANT).session:
+        return None
+    return threshold
+
+def _cascade_metrics(endpoint: str) -> Dict[str, Any]:
+    labels = {"endpoint": endpoint}
+    return {
+        "frames": registry.counter("cascade_frames_total", "Frames screened by the cascade gate", labels=labels),
+        "rejected": registry.counter(
+            "cascade_gate_rejected_total", "Frames the gate answered as empty without the main model", labels=labels
+        ),
+        "confirmed": registry.counter(
+            "cascade_main_confirmed_total", "Escalated frames where the main model found an object", labels=labels
+        )
+    }
+
+def cascade_escalates(endpoint: str, gate_detections: List[Detection], threshold: float) -> bool:
+    """
+    Decide from the gate model's output whether a frame needs the main model.
+    
+    Args:
+        endpoint: Endpoint key the frame came from
+        gate_detections: Gate model detections for the frame
+        threshold: The endpoint's gate threshold
+    
+    Returns:
+        True if the frame may hold an object and should be escalated
+    """
+    metrics = _cascade_metrics(endpoint)
+    metrics["frames"].inc()
+    if max((d.confidence for d in gate_detections), default=0.0) >= threshold:
+        return True
+    metrics["rejected"].inc()
+    return False
+
+def record_cascade_result(endpoint: str, detections: List[Detection]) -> None:
+    """Count whether the main model confirmed an escalated frame"""
+    if any(d.confidence >= settings.DETECTION_CONFIDENCE_THRESHOLD for d in detections):
+        _cascade_metrics(endpoint)["confirmed"].inc()
+
+def get_cascade_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-endpoint cascade hit rates: how often the gate settles a frame on its own,
+    and how often the main model confirms the frames it escalates.
+    """
+    stats = {}
+    for endpoint, threshold in _CASCADE_THRESHOLD_MAP.items():
+        metrics = _cascade_metrics(endpoint)
+        frames, rejected, confirmed = (metrics[key].value for key in ("frames", "rejected", "confirmed"))
+        escalated = frames - rejected
+        stats[endpoint] = {
+            "gate_variant": CASCADE_GATE_VARIANT,
+            "main_variant": CASCADE_MAIN_VARIANT,
+            "threshold": threshold,
+            "frames": frames,
+            "gate_rejected": rejected,
+            "escalated": escalated,
+            "gate_hit_rate": rejected / frames if frames else 0.0,
+            "main_hit_rate": confirmed / escalated if escalated else 0.0
+        }
+    return stats
+
+def process_image(
+    image_data: bytes,
+    resize_for_streaming: bool = False,
+    variant: Optional[str] = None
+) -> PreprocessedImage:
     """
     Process raw image data into the format needed by the model.
     
+    The image is decoded straight to uint8, letterboxed to the model input size
+    and written as normalized float32 into a pooled input buffer, keeping the
+    scale and padding so boxes can be mapped back to the original pixels.
+    
     Args:
         image_data: Raw image bytes
-        resize_for_streaming: If True, resize image to a smaller size for faster processing
+        resize_for_streaming: If True, prepare the frame for the streaming model variant
+        variant: Model variant the frame is for; overrides resize_for_streaming
     
     Returns:
-        Processed image as numpy array
+        PreprocessedImage with the input tensor (batch dimension included) and letterbox geometry
     """
     try:
-        # Convert bytes to image
-        image = Image.open(BytesIO(image_data))
-        
-        # Convert to RGB if needed
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        
-        # Resize image
-        if resize_for_streaming:
-            # Use smaller size for streaming for faster processing
-            target_size = (320, 320)
-        else:
-            # Use model's expected input size
-            target_size = INPUT_SIZE
-        
-        image = image.resize(target_size)
-        
-        # Convert to numpy array
-        img_array = np.array(image)
+        # Each variant's session dictates its own input size
+        target_size, channels_first = _input_spec(variant, resize_for_streaming)
         
-        # Normalize pixel values to 0-1
-        img_array = img_array / 255.0
-        
-        # Rearrange dimensions for ONNX input (NHWC -> NCHW for some models)
-        # Check the model's expected input format
-        if MODEL and hasattr(MODEL, 'get_inputs') and len(MODEL.get_inputs()) > 0:
-            input_shape = MODEL.get_inputs()[0].shape
-            # If input is NCHW (channels first)
-            if len(input_shape) == 4 and input_shape[1] == 3:
-                img_array = np.transpose(img_array, (2, 0, 1))  # HWC -> CHW
-        
-        # Add batch dimension if needed
-        if len(img_array.shape) == 3:
-            img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
+        return preprocess(image_data, target_size, channels_first=channels_first)
     
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         raise ValueError(f"Failed to process image: {e}")
 
-def post_process(outputs):
+def _input_spec(
+    variant: Optional[str] = None,
+    optimized_for_streaming: bool = False
+) -> Tuple[Tuple[int, int], bool]:
+    """Model input size and layout, from the variant's plan or the remote inference server"""
+    if MODELS:
+        plan = get_variant(variant, optimized_for_streaming).plan
+        return plan.input_size, plan.channels_first
+    if INFERENCE_MODE == "remote":
+        from app.services.inference_server import get_client
+        return get_client().input_spec
+    return INPUT_SIZE, True
+
+def post_process(
+    outputs,
+    conf_threshold: float = CONF_THRESHOLD,
+    iou_threshold: float = IOU_THRESHOLD,
+    max_detections: int = MAX_DETECTIONS,
+    letterbox: Optional[LetterboxInfo] = None,
+    plan: Optional[ModelPlan] = None
+) -> List[Detection]:
     """
     Post-process the model outputs to get detections in a standard format.
     This handles direct outputs from our custom trained YOLOv8 model.
     
+    Decoding is vectorized over all anchors: confidence mask, argmax, xywh->xyxy,
+    class-aware NMS and top-k. Pydantic objects are only built for the boxes
+    that survive NMS.
+    
     Args:
         outputs: Raw model outputs
+        conf_threshold: Minimum class confidence to keep a box
+        iou_threshold: IoU above which overlapping boxes of the same class are suppressed
+        max_detections: Maximum number of detections to return
+        letterbox: If given, boxes are mapped back to original image pixel coordinates
+        plan: Plan of the model that produced the outputs (defaults to the main model)
         
     Returns:
-        List of processed detections
+        List of processed detections, highest confidence first
     """
+    started = time.perf_counter()
     try:
-        # The number of classes in the model
-        num_classes = len(LABELS)  # 6 recycling categories
-        
         # Handle different output formats
-        if isinstance(outputs, list) and len(outputs) > 0:
+        if isinstance(outputs, (list, tuple)) and len(outputs) > 0:
             # Multiple output tensors - typical for YOLOv8 ONNX models
             # First tensor contains the detection results
             detection_output = outputs[0]
@@ -169,108 +487,340 @@ def post_process(outputs):
             # Single output tensor
             detection_output = outputs
         
-        # Process the detection output
-        # YOLOv8 ONNX output format: [batch, num_detections, 4+num_classes]
-        # Where 4 is for bounding box coordinates (x, y, w, h) and num_classes is the number of class probabilities
+        plan = plan or MODEL_PLAN
         
-        # Threshold for confidence
-        conf_threshold = 0.25
+        # Drop the batch dimension: post_process handles one image at a time
+        prediction = np.asarray(detection_output)
+        if prediction.ndim == 3:
+            prediction = prediction[0]
         
-        # List to store final detections
-        detections = []
+        boxes, scores, class_ids = decode_predictions(
+            prediction,
+            conf_threshold=conf_threshold,
+            iou_threshold=iou_threshold,
+            max_detections=max_detections,
+            channel_major=plan.output_channel_major if plan else None
+        )
         
-        # Process each detection
-        for i in range(detection_output.shape[1]):
-            # Get confidence (objectness * class_prob)
-            confidence = float(np.max(detection_output[0, i, 4:]))
-            
-            # Skip low confidence detections
-            if confidence < conf_threshold:
-                continue
-            
-            # Get class with highest probability
-            class_id = int(np.argmax(detection_output[0, i, 4:]))
-            
-            # Get bounding box coordinates - normalized
-            x, y, w, h = detection_output[0, i, :4]
-            
-            # Convert to RecyclableCategory
-            if class_id < len(LABELS):
-                try:
-                    category = RecyclableCategory(LABELS[class_id])
-                except ValueError:
-                    category = RecyclableCategory.UNKNOWN
-            else:
-                category = RecyclableCategory.UNKNOWN
-            
-            # Create bounding box
-            bbox = BoundingBox(
-                x_min=float(x - w/2),
-                y_min=float(y - h/2),
-                x_max=float(x + w/2),
-                y_max=float(y + h/2)
-            )
-            
-            # Add detection
-            detections.append(Detection(
-                category=category,
-                confidence=confidence,
-                bounding_box=bbox
-            ))
+        if letterbox is not None:
+            boxes = letterbox.restore_boxes(boxes)
         
-        # Sort by confidence (highest first)
-        detections.sort(key=lambda x: x.confidence, reverse=True)
-        
-        return detections
+        return _build_detections(boxes, scores, class_ids)
         
     except Exception as e:
         logger.error(f"Error in post-processing: {e}")
         return []
+    finally:
+        postprocess_stage_metric.observe(time.perf_counter() - started)
+
+def decode_predictions(
+    prediction: np.ndarray,
+    conf_threshold: float = CONF_THRESHOLD,
+    iou_threshold: float = IOU_THRESHOLD,
+    max_detections: int = MAX_DETECTIONS,
+    channel_major: Optional[bool] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode a single image's raw YOLOv8 prediction into final boxes.
+    
+    Accepts both the `[N, 4+C]` (anchor-major) and `[4+C, N]` (channel-major,
+    the default YOLOv8 ONNX export) layouts. Unless the model plan already
+    fixed the layout, it is told apart by the anchor count always being far
+    larger than the channel count.
+    
+    Args:
+        prediction: 2-D prediction array for one image
+        conf_threshold: Minimum class confidence to keep a box
+        iou_threshold: IoU threshold for class-aware NMS
+        max_detections: Maximum number of boxes to keep
+        channel_major: Output layout resolved by the model plan (None to infer from the shape)
+    
+    Returns:
+        Tuple of (boxes [K, 4] as x_min/y_min/x_max/y_max, scores [K], class_ids [K]),
+        sorted by descending score
+    """
+    if channel_major is None:
+        channel_major = prediction.shape[0] < prediction.shape[1]
+    
+    # Best class score per anchor, without transposing the whole array
+    if channel_major:
+        class_scores = prediction[4:, :]
+        scores = class_scores.max(axis=0)
+    else:
+        class_scores = prediction[:, 4:]
+        scores = class_scores.max(axis=1)
+    
+    candidates = np.flatnonzero(scores >= conf_threshold)
+    if candidates.size == 0:
+        return _empty_predictions()
+    
+    # Bound the NMS input: keep only the highest scoring candidates
+    if candidates.size > MAX_NMS_CANDIDATES:
+        top = np.argpartition(scores[candidates], -MAX_NMS_CANDIDATES)[-MAX_NMS_CANDIDATES:]
+        candidates = candidates[top]
+    
+    # Gather only the surviving anchors (small copies from here on)
+    if channel_major:
+        xywh = prediction[:4, candidates].T
+        class_ids = class_scores[:, candidates].argmax(axis=0)
+    else:
+        xywh = prediction[candidates, :4]
+        class_ids = class_scores[candidates].argmax(axis=1)
+    scores = scores[candidates]
+    
+    boxes = xywh2xyxy(xywh)
+    keep = non_max_suppression(boxes, scores, class_ids, iou_threshold, max_detections)
+    
+    return boxes[keep], scores[keep], class_ids[keep]
+
+def xywh2xyxy(xywh: np.ndarray) -> np.ndarray:
+    """Convert [x_center, y_center, width, height] boxes to [x_min, y_min, x_max, y_max]"""
+    boxes = np.empty_like(xywh, dtype=np.float32)
+    half_wh = xywh[:, 2:4] / 2
+    boxes[:, :2] = xywh[:, :2] - half_wh
+    boxes[:, 2:] = xywh[:, :2] + half_wh
+    return boxes
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float = IOU_THRESHOLD,
+    max_detections: int = MAX_DETECTIONS
+) -> np.ndarray:
+    """
+    Class-aware greedy non-maximum suppression.
+    
+    Boxes of different classes are shifted apart by a fixed per-class offset
+    so a single pass never suppresses across classes.
+    
+    Args:
+        boxes: [K, 4] boxes as x_min/y_min/x_max/y_max
+        scores: [K] confidence scores
+        class_ids: [K] class indices
+        iou_threshold: IoU above which the lower scoring box is dropped
+        max_detections: Maximum number of boxes to keep
+    
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if boxes.shape[0] == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    offsets = class_ids.astype(np.float32)[:, None] * NMS_CLASS_OFFSET
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted[:, 0], shifted[:, 1], shifted[:, 2], shifted[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size > 0 and len(keep) < max_detections:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        
+        # IoU of the best box against all remaining boxes at once
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        
+        order = rest[iou <= iou_threshold]
+    
+    return np.asarray(keep, dtype=np.intp)
+
+def _empty_predictions() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.empty((0, 4), dtype=np.float32),
+        np.empty(0, dtype=np.float32),
+        np.empty(0, dtype=np.intp)
+    )
+
+def _category_for(class_id: int) -> RecyclableCategory:
+    """Map a model class index onto a RecyclableCategory"""
+    if class_id < len(LABELS):
+        try:
+            return RecyclableCategory(LABELS[class_id])
+        except ValueError:
+            return RecyclableCategory.UNKNOWN
+    return RecyclableCategory.UNKNOWN
 
-def detect_objects(image: np.ndarray, optimized_for_streaming: bool = False) -> List[Detection]:
+def _build_detections(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray) -> List[Detection]:
+    """Create Detection objects for the (already filtered) boxes"""
+    detections = []
+    for (x_min, y_min, x_max, y_max), score, class_id in zip(boxes.tolist(), scores.tolist(), class_ids.tolist()):
+        detections.append(Detection(
+            category=_category_for(class_id),
+            confidence=score,
+            bounding_box=BoundingBox(x_min=x_min, y_min=y_min, x_max=x_max, y_max=y_max)
+        ))
+    return detections
+
+def detect_objects(
+    image: Union[PreprocessedImage, np.ndarray],
+    optimized_for_streaming: bool = False,
+    variant: Optional[str] = None
+) -> List[Detection]:
     """
     Run object detection on a processed image.
     
     Args:
-        image: Processed image as numpy array
-        optimized_for_streaming: If True, use faster but potentially less accurate detection
+        image: Processed image from process_image (or a raw batched numpy array)
+        optimized_for_streaming: If True, run the fast streaming model variant
+        variant: Model variant to run; overrides optimized_for_streaming
     
     Returns:
         List of Detection objects with category, confidence, and bounding box
     """
-    if MODEL is None:
-        raise ValueError("Model not loaded. Please initialize the model first.")
+    model = get_variant(variant, optimized_for_streaming)
     
     try:
-        # Get the input tensor name from the model
-        input_name = MODEL.get_inputs()[0].name
-        
-        # Prepare input in the correct format for the model
-        # For ONNX models, check the expected input shape
-        input_shape = MODEL.get_inputs()[0].shape
-        
-        # Reshape input if needed
-        if len(input_shape) == 4:
-            # Check if model expects batch dimension
-            if input_shape[0] == 1 or input_shape[0] == -1:
-                # Check channel order (NCHW vs NHWC)
-                if input_shape[1] == 3:  # NCHW
-                    if image.shape[1] != 3 and image.shape[3] == 3:
-                        # Convert from NHWC to NCHW if needed
-                        image = np.transpose(image, (0, 3, 1, 2))
-                else:  # NHWC
-                    if image.shape[1] == 3 and image.shape[3] != 3:
-                        # Convert from NCHW to NHWC if needed
-                        image = np.transpose(image, (0, 2, 3, 1))
-        
-        # Run inference
-        outputs = MODEL.run(None, {input_name: image.astype(np.float32)})
+        # Run inference (only the detection head output is fetched)
+        try:
+            outputs = model.run(_prepare_input(image, model.plan))
+        finally:
+            # The input buffer can be reused as soon as the model has consumed it
+            _release(image)
         
         # Post-process outputs to get detections
-        detections = post_process(outputs)
+        detections = post_process(outputs, letterbox=_letterbox_of(image), plan=model.plan)
         
         return detections
     
     except Exception as e:
         logger.error(f"Detection error: {e}")
-        raise ValueError(f"Failed to run detection: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed to run detection: {e}")
+
+def supports_batching(variant: Optional[str] = None) -> bool:
+    """
+    Check whether a loaded model accepts more than one image per run.
+    
+    Args:
+        variant: Model variant to check (defaults to the snapshot variant)
+    
+    Returns:
+        True if the model's batch dimension is dynamic (or larger than 1)
+    """
+    if not MODELS:
+        return False
+    
+    plan = get_variant(variant).plan
+    return plan.dynamic_batch or plan.max_batch_size > 1
+
+def detect_batch(
+    images: List[Union[PreprocessedImage, np.ndarray]],
+    optimized_for_streaming: bool = False,
+    variant: Optional[str] = None
+) -> List[List[Detection]]:
+    """
+    Run object detection on several processed images with a single model call.
+    
+    Args:
+        images: Processed images as returned by process_image (each with a batch dimension of 1)
+        optimized_for_streaming: If True, run the fast streaming model variant
+        variant: Model variant to run; overrides optimized_for_streaming
+    
+    Returns:
+        One list of Detection objects per input image, in the same order
+    """
+    model = get_variant(variant, optimized_for_streaming)
+    
+    if len(images) == 1:
+        return [detect_objects(images[0], variant=model.name)]
+    
+    try:
+        # Stack the frames along the batch axis into a pooled batch buffer
+        frames = [_prepare_input(image, model.plan) for image in images]
+        batch_pool = get_buffer_pool((len(frames),) + frames[0].shape[1:], dtype=frames[0].dtype)
+        batch = batch_pool.acquire()
+        try:
+            np.concatenate(frames, axis=0, out=batch)
+            for image in images:
+                _release(image)
+            
+            # Run the model once for the whole batch
+            outputs = model.run(batch)
+        finally:
+            batch_pool.release(batch)
+        
+        # Fan the per-image slices back out to the post-processor
+        return [
+            post_process([output[i:i + 1] for output in outputs], letterbox=_letterbox_of(image), plan=model.plan)
+            for i, image in enumerate(images)
+        ]
+    
+    except Exception as e:
+        logger.error(f"Batch detection error: {e}")
+        raise ValueError(f"Failed to run batch detection: {e}")
+
+def detect_raw(batch: np.ndarray) -> List[np.ndarray]:
+    """
+    Run the model on an already prepared batch tensor and return compact results.
+    
+    Used by the out-of-process inference server, which only ships small arrays
+    back to the API workers instead of pydantic objects.
+    
+    Args:
+        batch: Input tensor with a leading batch dimension, in the model's layout
+    
+    Returns:
+        One float32 array per image, shaped [K, 6] as
+        x_min, y_min, x_max, y_max, confidence, class_id in model-input pixels
+    """
+    if MODEL is None:
+        raise ValueError("Model not loaded. Please initialize the model first.")
+    
+    outputs = get_variant(DEFAULT_VARIANT).run(MODEL_PLAN.prepare_input(batch))
+    
+    results = []
+    for prediction in outputs[0]:
+        boxes, scores, class_ids = decode_predictions(
+            prediction,
+            channel_major=MODEL_PLAN.output_channel_major
+        )
+        rows = np.empty((boxes.shape[0], 6), dtype=np.float32)
+        rows[:, :4] = boxes
+        rows[:, 4] = scores
+        rows[:, 5] = class_ids
+        results.append(rows)
+    return results
+
+def detections_from_rows(rows: np.ndarray, letterbox: Optional[LetterboxInfo] = None) -> List[Detection]:
+    """
+    Build Detection objects from the compact [K, 6] arrays returned by detect_raw.
+    
+    Args:
+        rows: x_min, y_min, x_max, y_max, confidence, class_id per detection
+        letterbox: If given, boxes are mapped back to original image pixel coordinates
+    
+    Returns:
+        List of Detection objects, highest confidence first
+    """
+    boxes = rows[:, :4]
+    if letterbox is not None:
+        boxes = letterbox.restore_boxes(boxes)
+    return _build_detections(boxes, rows[:, 4], rows[:, 5].astype(np.intp))
+
+def _prepare_input(image: Union[PreprocessedImage, np.ndarray], plan: Optional[ModelPlan] = None) -> np.ndarray:
+    """
+    Match a processed image to the channel order and dtype the model expects.
+    
+    Args:
+        image: Processed image with a batch dimension
+        plan: Plan of the model the image is fed to (defaults to the main model)
+    
+    Returns:
+        Array ready to be fed to the model
+    """
+    if isinstance(image, PreprocessedImage):
+        # Already letterboxed in the model's layout; the adapter is a no-op for float32 models
+        image = image.tensor
+    
+    return (plan or MODEL_PLAN).prepare_input(image)
+
+def _letterbox_of(image: Union[PreprocessedImage, np.ndarray]) -> Optional[LetterboxInfo]:
+    return image.letterbox if isinstance(image, PreprocessedImage) else None
+
+def _release(image: Union[PreprocessedImage, np.ndarray]) -> None:
+    if isinstance(image, PreprocessedImage):
+        image.release()
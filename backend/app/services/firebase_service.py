@@ -1,5 +1,3 @@
-import firebase_admin
-from firebase_admin import credentials, auth, firestore, storage
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import logging
@@ -8,29 +6,68 @@ from uuid import uuid4
 
 from app.config import settings
 from app.models import ScanRecord, Detection, RecyclingInfo
+from app.utils.enviroment import get_setting
 from app.utils.logger import get_logger
+from app.utils.metrics import registry, timed
 
 logger = get_logger(__name__)
 
-# Initialize Firebase - done once at module level
-try:
-    cred = credentials.Certificate(settings.FIREBASE_SERVICE_ACCOUNT_PATH)
-    firebase_app = firebase_admin.initialize_app(cred, {
-        'databaseURL': settings.FIREBASE_DATABASE_URL,
-        'storageBucket': settings.FIREBASE_DATABASE_URL.replace('https://', '')
-    })
-    db = firestore.client()
-    bucket = storage.bucket()
-    logger.info("Firebase initialized successfully")
-except Exception as e:
-    logger.error(f"Firebase initialization error: {e}")
-    db = None
-    bucket = None
+# Serve Firestore, Auth and Storage from memory instead of Firebase, so the API
+# can be load-tested (or run locally) without credentials
+LOCAL_FIREBASE = get_setting("LOCAL_FIREBASE", False)
+
+if LOCAL_FIREBASE:
+    from app.services.local_firebase import auth, firestore, db, bucket, require_local_environment
+    from app.services.local_firebase import get_recycling_info as _recycling_info_provider
+    require_local_environment()
+    logger.warning("LOCAL_FIREBASE is set: using the in-memory Firebase stand-in, nothing is persisted")
+else:
+    import firebase_admin
+    from firebase_admin import credentials, auth, firestore, storage
+    from app.services.external_api import get_recycling_info as _recycling_info_provider
+
+    # Initialize Firebase - done once at module level
+    try:
+        cred = credentials.Certificate(settings.FIREBASE_SERVICE_ACCOUNT_PATH)
+        firebase_app = firebase_admin.initialize_app(cred, {
+            'databaseURL': settings.FIREBASE_DATABASE_URL,
+            'storageBucket': settings.FIREBASE_DATABASE_URL.replace('https://', '')
+        })
+        db = firestore.client()
+        bucket = storage.bucket()
+        logger.info("Firebase initialized successfully")
+    except Exception as e:
+        logger.error(f"Firebase initialization error: {e}")
+        db = None
+        bucket = None
+
+def _firestore_call(operation: str):
+    """Latency and error metrics for one Firestore-backed operation"""
+    labels = {"operation": operation}
+    return timed(
+        registry.histogram("firestore_call_seconds", "Latency of Firestore operations", labels=labels),
+        registry.counter("firestore_call_errors_total", "Firestore operations that failed", labels=labels)
+    )
+
+# Recycling info comes from the stand-in alongside the rest of Firebase; every
+# call is timed, whichever backend serves it
+get_recycling_info = timed(
+    registry.histogram("recycling_info_call_seconds", "Latency of recycling-info lookups"),
+    registry.counter("recycling_info_call_errors_total", "Recycling-info lookups that failed")
+)(_recycling_info_provider)
+
+token_cache_hits_metric = registry.counter(
+    "firebase_token_cache_hits_total", "Token verifications answered from the token cache"
+)
 
 # Token cache to reduce verification overhead on continuous requests
 # Format: {token: {'user': user_data, 'expires': timestamp}}
 token_cache = {}
 
+@timed(
+    registry.histogram("firebase_token_verify_seconds", "Latency of ID token verification, including cache hits"),
+    registry.counter("firebase_token_verify_errors_total", "ID tokens that failed verification")
+)
 async def verify_firebase_token(token: str, lightweight: bool = False) -> Dict:
     """
     Verify a Firebase ID token and return the user information.
@@ -52,6 +89,7 @@ async def verify_firebase_token(token: str, lightweight: bool = False) -> Dict:
     if lightweight and token in token_cache:
         cache_entry = token_cache[token]
         if cache_entry['expires'] > datetime.now():
+            token_cache_hits_metric.inc()
             return cache_entry['user']
     
     try:
@@ -82,6 +120,7 @@ async def verify_firebase_token(token: str, lightweight: bool = False) -> Dict:
         logger.error(f"Token verification error: {e}")
         raise ValueError(f"Invalid or expired token: {e}")
 
+@_firestore_call("add_scan_record")
 async def add_scan_record(
     user_id: str,
     scan_id: str,
@@ -163,6 +202,7 @@ async def add_scan_record(
         logger.error(f"Error adding scan record: {e}")
         raise ValueError(f"Failed to add scan record: {e}")
 
+@_firestore_call("update_user_points")
 async def update_user_points(user_id: str, points: int) -> int:
     """
     Update a user's environmental impact points.
@@ -228,6 +268,7 @@ async def update_user_points(user_id: str, points: int) -> int:
         logger.error(f"Error updating user points: {e}")
         raise ValueError(f"Failed to update user points: {e}")
 
+@_firestore_call("get_user_scans")
 async def get_user_scans(
     user_id: str,
     limit: int = 20,
@@ -310,6 +351,7 @@ async def get_user_scans(
         logger.error(f"Error retrieving user scans: {e}")
         raise ValueError(f"Failed to retrieve scan history: {e}")
 
+@_firestore_call("get_scan_details")
 async def get_scan_details(scan_id: str) -> ScanRecord:
     """
     Get detailed information about a specific scan.
@@ -350,6 +392,7 @@ async def get_scan_details(scan_id: str) -> ScanRecord:
         logger.error(f"Error retrieving scan details: {e}")
         raise ValueError(f"Failed to retrieve scan details: {e}")
 
+@_firestore_call("get_leaderboard")
 async def get_leaderboard(limit: int = 10, offset: int = 0) -> Dict[str, Any]:
     """
     Get the global environmental impact leaderboard.
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.models import Detection
+from app.services.inference_executor import run_in_inference_executor
+from app.services.inference_scheduler import schedule_cascade_detection
+from app.services.preprocessing import decode_grayscale
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+
+logger = get_logger(__name__)
+
+FRAME_CACHE_ENABLED = get_setting("FRAME_CACHE_ENABLED", True)
+# Hamming distance (out of 64 bits) at which two frames count as the same scene
+FRAME_CACHE_MAX_DISTANCE = get_setting("FRAME_CACHE_MAX_DISTANCE", 4)
+FRAME_CACHE_TTL_SECONDS = get_setting("FRAME_CACHE_TTL_SECONDS", 2.0)
+FRAME_CACHE_MAX_STREAMS = get_setting("FRAME_CACHE_MAX_STREAMS", 1024)
+FRAME_CACHE_ENTRIES_PER_STREAM = get_setting("FRAME_CACHE_ENTRIES_PER_STREAM", 4)
+
+# dHash compares horizontally adjacent pixels of a 9x8 thumbnail -> 64 bits
+_HASH_SIZE = 8
+
+
+def perceptual_hash(image_data: bytes) -> Optional[int]:
+    """
+    64-bit difference hash (dHash) of an encoded image.
+
+    JPEGs are decoded by libjpeg at 1/8 scale straight to grayscale, so hashing
+    costs a small fraction of a full decode. The upload size limits are checked
+    before decoding.
+
+    Args:
+        image_data: Raw image bytes
+
+    Returns:
+        The hash as an int, or None if the image can't be decoded
+    """
+    gray = decode_grayscale(image_data, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+
+    thumbnail = cv2.resize(gray, (_HASH_SIZE + 1, _HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+@dataclass
+class _CachedResult:
+    phash: int
+    detections: List[Detection]
+    cost_seconds: float
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+class FrameResultCache:
+    """
+    Bounded LRU/TTL cache of detections for near-duplicate frames.
+
+    Entries are grouped by stream (one WebSocket connection or one user's
+    polling loop). A new frame whose perceptual hash is within `max_distance`
+    bits of a recent frame from the same stream reuses that frame's detections
+    instead of being decoded and run through the model again.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = FRAME_CACHE_MAX_DISTANCE,
+        ttl_seconds: float = FRAME_CACHE_TTL_SECONDS,
+        max_streams: int = FRAME_CACHE_MAX_STREAMS,
+        entries_per_stream: int = FRAME_CACHE_ENTRIES_PER_STREAM,
+        name: str = "frames"
+    ):
+        self.max_distance = int(max_distance)
+        self.ttl = float(ttl_seconds)
+        self.max_streams = max(1, int(max_streams))
+        self.entries_per_stream = max(1, int(entries_per_stream))
+        self._streams: "OrderedDict[str, List[_CachedResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        labels = {"cache": name}
+        self.hits_metric = registry.counter(
+            "frame_cache_hits_total", "Frames answered from the near-duplicate cache", labels=labels
+        )
+        self.misses_metric = registry.counter(
+            "frame_cache_misses_total", "Frames that needed a full decode and inference", labels=labels
+        )
+        self.saved_metric = registry.counter(
+            "frame_cache_seconds_saved_total", "Estimated preprocessing + inference time avoided by hits", labels=labels
+        )
+        self.streams_metric = registry.gauge(
+            "frame_cache_streams", "Streams with cached results", labels=labels
+        )
+
+    def lookup(self, stream_key: str, phash: Optional[int]) -> Optional[List[Detection]]:
+        """
+        Find cached detections for a near-duplicate of this frame.
+
+        Args:
+            stream_key: Stream the frame belongs to
+            phash: Perceptual hash of the frame
+
+        Returns:
+            Cached detections, or None on a miss
+        """
+        if phash is None:
+            self.misses_metric.inc()
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entries = self._streams.get(stream_key)
+            if entries:
+                entries[:] = [entry for entry in entries if now - entry.stored_at <= self.ttl]
+                best = min(entries, key=lambda entry: hamming_distance(entry.phash, phash), default=None)
+                if best is not None and hamming_distance(best.phash, phash) <= self.max_distance:
+                    self._streams.move_to_end(stream_key)
+                    self.hits_metric.inc()
+                    self.saved_metric.inc(best.cost_seconds)
+                    return best.detections
+
+        self.misses_metric.inc()
+        return None
+
+    def store(self, stream_key: str, phash: Optional[int], detections: List[Detection], cost_seconds: float) -> None:
+        """
+        Remember the detections for a frame.
+
+        Args:
+            stream_key: Stream the frame belongs to
+            phash: Perceptual hash of the frame
+            detections: Detections produced for it
+            cost_seconds: Time spent producing them (credited on later hits)
+        """
+        if phash is None:
+            return
+
+        with self._lock:
+            entries = self._streams.setdefault(stream_key, [])
+            self._streams.move_to_end(stream_key)
+            entries.append(_CachedResult(phash=phash, detections=detections, cost_seconds=cost_seconds))
+            del entries[:-self.entries_per_stream]
+
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+            self.streams_metric.set(len(self._streams))
+
+    def drop(self, stream_key: str) -> None:
+        """Forget a stream (e.g. when its WebSocket closes)"""
+        with self._lock:
+            self._streams.pop(stream_key, None)
+            self.streams_metric.set(len(self._streams))
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self.hits_metric.value, self.misses_metric.value
+        return {
+            "enabled": FRAME_CACHE_ENABLED,
+            "max_distance": self.max_distance,
+            "ttl_seconds": self.ttl,
+            "streams": len(self._streams),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "seconds_saved": self.saved_metric.value
+        }
+
+
+# Shared per-worker cache
+frame_cache = FrameResultCache()
+
+
+async def detect_frame(
+    stream_key: str,
+    image_data: bytes,
+    variant: Optional[str] = None,
+    endpoint: Optional[str] = None
+) -> List[Detection]:
+    """
+    Detect objects in a streamed frame, reusing results for near-duplicate frames.
+
+    Args:
+        stream_key: Identifies the stream (connection or user) the frame belongs to;
+            frames for different variants must use different keys
+        image_data: Raw image bytes
+        variant: Model variant to run on a cache miss
+        endpoint: Endpoint key, for the cascade gate threshold (None skips the gate)
+
+    Returns:
+        List of Detection objects
+    """
+    phash = None
+    if FRAME_CACHE_ENABLED:
+        phash = await run_in_inference_executor(perceptual_hash, image_data)
+        detections = frame_cache.lookup(stream_key, phash)
+        if detections is not None:
+            return detections
+
+    started = time.perf_counter()
+    detections = await schedule_cascade_detection(image_data, endpoint, variant=variant)
+
+    if FRAME_CACHE_ENABLED:
+        frame_cache.store(stream_key, phash, detections, time.perf_counter() - started)
+    return detections
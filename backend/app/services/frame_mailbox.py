@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+from app.utils.metrics import registry
+
+dropped_frames_metric = registry.counter(
+    "stream_dropped_frames_total", "Streamed frames replaced by a newer frame before inference"
+)
+frame_age_metric = registry.histogram(
+    "stream_frame_age_seconds", "Time a streamed frame waits between arrival and processing"
+)
+
+
+class LatestFrameMailbox:
+    """
+    Single-slot mailbox between a connection's receive loop and its inference loop.
+
+    The receiver always overwrites the slot, so a frame that hasn't been picked
+    up by the time the next one arrives is dropped. The inference loop therefore
+    always works on the newest frame and latency stays bounded by one inference,
+    however fast the client sends.
+    """
+
+    def __init__(self):
+        self.dropped_frames = 0
+        self._frame: Any = None
+        self._received_at = 0.0
+        self._has_frame = asyncio.Event()
+        self._closed_with: Optional[BaseException] = None
+
+    def put(self, frame: Any) -> None:
+        """Store a frame, replacing (and counting) any frame still waiting"""
+        if self._frame is not None:
+            self.dropped_frames += 1
+            dropped_frames_metric.inc()
+        self._frame = frame
+        self._received_at = time.perf_counter()
+        self._has_frame.set()
+
+    def close(self, reason: BaseException) -> None:
+        """
+        Stop the mailbox; get() raises `reason` once no frame is left.
+
+        Args:
+            reason: Exception that ended the receive loop (e.g. WebSocketDisconnect)
+        """
+        self._closed_with = reason
+        self._has_frame.set()
+
+    async def get(self) -> Any:
+        """
+        Wait for the newest frame.
+
+        Returns:
+            The frame
+
+        Raises:
+            The exception passed to close(), once the mailbox is closed and empty
+        """
+        while self._frame is None:
+            if self._closed_with is not None:
+                raise self._closed_with
+            self._has_frame.clear()
+            await self._has_frame.wait()
+
+        frame, self._frame = self._frame, None
+        frame_age_metric.observe(time.perf_counter() - self._received_at)
+        return frame
@@ -0,0 +1,108 @@
+import math
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "binary"
+BINARY_PROTOCOL_VERSION = 1
+SUPPORTED_BINARY_VERSIONS = (1,)
+
+# Binary frames are a fixed little-endian header followed by the encoded image:
+#   uint8   protocol version (1)
+#   uint8   image format (FORMAT_JPEG / FORMAT_WEBP)
+#   uint16  reserved, must be 0
+#   uint32  sequence number, echoed back in responses
+#   float32 client confidence, NaN if the client has none
+FRAME_HEADER = struct.Struct("<BBHIf")
+
+FORMAT_JPEG = 0
+FORMAT_WEBP = 1
+IMAGE_FORMATS = {FORMAT_JPEG: "jpeg", FORMAT_WEBP: "webp"}
+
+
+class FrameProtocolError(ValueError):
+    """A binary frame doesn't follow the negotiated protocol"""
+    pass
+
+
+@dataclass
+class BinaryFrame:
+    """One decoded binary frame"""
+    sequence: int
+    image_format: str
+    image: bytes
+    client_confidence: Optional[float] = None
+
+
+def negotiate_protocol(auth_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pick the frame protocol for a connection from its auth message.
+
+    Clients opt in with {"protocol": "binary", "protocol_version": 1}; anything
+    else (including older clients that send neither field) gets JSON frames.
+
+    Args:
+        auth_data: Parsed auth message
+
+    Returns:
+        {"protocol": ..., "protocol_version": ...} to merge into the "connected" reply
+    """
+    if auth_data.get("protocol") == PROTOCOL_BINARY:
+        version = auth_data.get("protocol_version", BINARY_PROTOCOL_VERSION)
+        if version in SUPPORTED_BINARY_VERSIONS:
+            return {"protocol": PROTOCOL_BINARY, "protocol_version": version}
+    return {"protocol": PROTOCOL_JSON, "protocol_version": None}
+
+
+def decode_frame(message: bytes) -> BinaryFrame:
+    """
+    Split a binary WebSocket message into header fields and image bytes.
+
+    Args:
+        message: The raw message
+
+    Returns:
+        The decoded frame
+
+    Raises:
+        FrameProtocolError: If the header is truncated or uses an unknown version or format
+    """
+    if len(message) <= FRAME_HEADER.size:
+        raise FrameProtocolError(f"Frame too short ({len(message)} bytes)")
+
+    version, image_format, _, sequence, confidence = FRAME_HEADER.unpack_from(message)
+    if version not in SUPPORTED_BINARY_VERSIONS:
+        raise FrameProtocolError(f"Unsupported frame protocol version {version}")
+    if image_format not in IMAGE_FORMATS:
+        raise FrameProtocolError(f"Unsupported image format {image_format}")
+
+    return BinaryFrame(
+        sequence=sequence,
+        image_format=IMAGE_FORMATS[image_format],
+        image=message[FRAME_HEADER.size:],
+        client_confidence=None if math.isnan(confidence) else confidence
+    )
+
+
+def encode_frame(
+    image: bytes,
+    sequence: int,
+    image_format: int = FORMAT_JPEG,
+    client_confidence: Optional[float] = None
+) -> bytes:
+    """
+    Build a binary frame (the client side of decode_frame).
+
+    Args:
+        image: Encoded image bytes
+        sequence: Frame sequence number
+        image_format: FORMAT_JPEG or FORMAT_WEBP
+        client_confidence: Confidence of the client-side detection, if any
+
+    Returns:
+        The message to send
+    """
+    confidence = float("nan") if client_confidence is None else client_confidence
+    header = FRAME_HEADER.pack(BINARY_PROTOCOL_VERSION, image_format, 0, sequence & 0xFFFFFFFF, confidence)
+    return header + image
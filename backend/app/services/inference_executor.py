@@ -0,0 +1,117 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+
+logger = get_logger(__name__)
+
+# Threads that run decode/preprocessing and ONNX Runtime calls. ONNX Runtime
+# releases the GIL during MODEL.run, so a handful of threads keeps the cores busy
+# while the event loop stays free to serve I/O.
+INFERENCE_THREADS = get_setting("INFERENCE_THREADS", 2)
+# Jobs allowed to wait for a free thread before new work is rejected
+INFERENCE_QUEUE_SIZE = get_setting("INFERENCE_QUEUE_SIZE", 32)
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the inference executor's bounded queue is full"""
+    pass
+
+
+class InferenceExecutor:
+    """
+    Dedicated, bounded thread pool for CPU-bound inference work.
+
+    Endpoints await `run()` instead of calling blocking functions directly, so
+    one slow inference no longer freezes every WebSocket and HTTP request on the
+    worker. At most `max_workers` jobs run at once and at most `max_queue` more
+    may wait; anything beyond that fails fast with InferenceQueueFullError.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_THREADS, max_queue: int = INFERENCE_QUEUE_SIZE):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+
+        self.rejected_metric = registry.counter(
+            "inference_executor_rejected_total", "Jobs rejected because the queue was full"
+        )
+        self.depth_metric = registry.gauge(
+            "inference_executor_pending", "Jobs running or waiting in the inference executor"
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking function on the inference threads and await its result.
+
+        Args:
+            fn: Blocking callable (e.g. process_image or detect_batch)
+            *args, **kwargs: Arguments passed to `fn`
+
+        Returns:
+            Whatever `fn` returns
+
+        Raises:
+            InferenceQueueFullError: If the bounded queue is already full
+        """
+        if self._pending >= self.capacity:
+            self.rejected_metric.inc()
+            raise InferenceQueueFullError(
+                f"Inference queue full ({self._pending} jobs pending, capacity {self.capacity})"
+            )
+
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        self._pending += 1
+        self.depth_metric.set(self._pending)
+        # Count the job until the thread is done with it, not until the caller stops
+        # waiting: a cancelled await (e.g. a WebSocket disconnect) leaves it running
+        job.add_done_callback(lambda _: self._call_in_loop(loop, self._job_done))
+        return await asyncio.wrap_future(job, loop=loop)
+
+    @staticmethod
+    def _call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # Loop already closed at shutdown
+
+    def _job_done(self) -> None:
+        self._pending -= 1
+        self.depth_metric.set(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threads": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.max_workers),
+            "queued": max(0, self._pending - self.max_workers),
+            "rejected": self.rejected_metric.value
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# Shared per-worker executor
+executor = InferenceExecutor()
+logger.info(f"Inference executor ready: threads={executor.max_workers}, queue={executor.max_queue}")
+
+
+async def run_in_inference_executor(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Await a blocking inference call on the shared bounded executor"""
+    return await executor.run(fn, *args, **kwargs)
@@ -0,0 +1,278 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from app.models import Detection
+from app.services import detection_service
+from app.services.inference_executor import InferenceQueueFullError, executor, run_in_inference_executor
+from app.services.preprocessing import PreprocessedImage
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+
+logger = get_logger(__name__)
+
+# Tunables - trade throughput (bigger batches) against tail latency (shorter waits)
+MAX_BATCH_SIZE = get_setting("INFERENCE_MAX_BATCH_SIZE", 8)
+MAX_WAIT_MS = get_setting("INFERENCE_MAX_WAIT_MS", 5.0)
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+
+@dataclass
+class _PendingFrame:
+    """A frame waiting in the scheduler queue"""
+    image: Any
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class InferenceScheduler:
+    """
+    Dynamic micro-batching scheduler in front of the detection model.
+
+    Concurrent callers submit single frames; a background task gathers them into
+    batches of up to `max_batch_size` frames, waiting at most `max_wait_ms` after
+    the first frame arrives, runs the model once per batch on the inference
+    executor and resolves each caller's future with its own detections.
+
+    Up to one batch per executor thread is in flight; while they are all busy,
+    new frames keep accumulating, so batches grow with load.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        name: str = "default"
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        labels = {"scheduler": name}
+        self.batch_size_metric = registry.histogram(
+            "inference_batch_size", "Frames per model run", buckets=BATCH_SIZE_BUCKETS, labels=labels
+        )
+        self.queue_wait_metric = registry.histogram(
+            "inference_queue_wait_seconds", "Time a frame waits before its batch starts", labels=labels
+        )
+        self.run_time_metric = registry.histogram(
+            "inference_batch_run_seconds", "Wall time of one batched model run", labels=labels
+        )
+        self.frames_metric = registry.counter(
+            "inference_frames_total", "Frames processed by the scheduler", labels=labels
+        )
+        self.errors_metric = registry.counter(
+            "inference_batch_errors_total", "Batches that raised an error", labels=labels
+        )
+        self.queue_depth_metric = registry.gauge(
+            "inference_queue_depth", "Frames waiting to be batched", labels=labels
+        )
+
+    def _ensure_worker(self) -> None:
+        """Start the batching task on the running event loop (lazily, on first use)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(executor.max_workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, image: Any) -> Any:
+        """
+        Queue a processed frame and wait for its result.
+
+        Args:
+            image: Processed image with a batch dimension of 1
+
+        Returns:
+            The per-image result produced by `run_batch`
+
+        Raises:
+            InferenceQueueFullError: If too many frames are already waiting
+        """
+        self._ensure_worker()
+        if self._queue.qsize() >= executor.capacity * self.max_batch_size:
+            executor.rejected_metric.inc()
+            raise InferenceQueueFullError(f"Inference queue full ({self._queue.qsize()} frames waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingFrame(image=image, future=future))
+        self.queue_depth_metric.set(self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingFrame]:
+        """Wait for one frame, then gather more until the batch is full or the wait expires"""
+        batch = [await self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Still take whatever is already queued without waiting
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Wait for a free inference thread before forming the next batch
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            # Callers that went away (e.g. closed WebSocket) don't need a result
+            batch = [frame for frame in batch if not frame.future.cancelled()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            asyncio.get_running_loop().create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[_PendingFrame]) -> None:
+        self.queue_depth_metric.set(self._queue.qsize())
+        try:
+            started = time.perf_counter()
+            for frame in batch:
+                self.queue_wait_metric.observe(started - frame.enqueued_at)
+            self.batch_size_metric.observe(len(batch))
+
+            try:
+                results = await executor.run(self.run_batch, [frame.image for frame in batch])
+            except Exception as e:
+                logger.error(f"Batched inference failed ({self.name}, batch of {len(batch)}): {e}")
+                self.errors_metric.inc()
+                for frame in batch:
+                    if not frame.future.done():
+                        frame.future.set_exception(e)
+                return
+
+            self.run_time_metric.observe(time.perf_counter() - started)
+            self.frames_metric.inc(len(batch))
+
+            for frame, result in zip(batch, results):
+                if not frame.future.done():
+                    frame.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current configuration plus batch-size and queue-wait metrics"""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "frames": self.frames_metric.value,
+            "errors": self.errors_metric.value,
+            "batch_size": self.batch_size_metric.snapshot(),
+            "queue_wait_seconds": self.queue_wait_metric.snapshot(),
+            "batch_run_seconds": self.run_time_metric.snapshot()
+        }
+
+
+def _create_scheduler(variant: str) -> InferenceScheduler:
+    # Models exported with a static batch of 1 can't take stacked frames
+    max_batch_size = MAX_BATCH_SIZE if detection_service.supports_batching(variant) else 1
+    return InferenceScheduler(
+        run_batch=lambda images: detection_service.detect_batch(images, variant=variant),
+        max_batch_size=max_batch_size,
+        name=variant
+    )
+
+
+# One scheduler per model variant: frames only batch with frames for the same session
+schedulers: Dict[str, InferenceScheduler] = {}
+
+
+def get_scheduler(variant: str) -> InferenceScheduler:
+    scheduler = schedulers.get(variant)
+    if scheduler is None:
+        scheduler = _create_scheduler(variant)
+        schedulers[variant] = scheduler
+        logger.info(
+            f"Inference scheduler '{variant}' ready: max_batch_size={scheduler.max_batch_size}, "
+            f"max_wait_ms={scheduler.max_wait * 1000.0:.1f}"
+        )
+    return scheduler
+
+
+async def schedule_detection(
+    image: PreprocessedImage,
+    optimized_for_streaming: bool = False,
+    variant: Optional[str] = None
+) -> List[Detection]:
+    """
+    Run detection on a processed image through the micro-batching scheduler.
+
+    Args:
+        image: Processed image as returned by process_image
+        optimized_for_streaming: If True, run the fast streaming model variant
+        variant: Model variant the image was processed for; overrides optimized_for_streaming
+
+    Returns:
+        List of Detection objects with category, confidence, and bounding box
+    """
+    if detection_service.INFERENCE_MODE == "remote":
+        # The inference server batches frames from every API worker itself
+        from app.services.inference_server import get_client
+        return await get_client().detect(image)
+
+    # Unknown or unloaded variant names fall back to the default model
+    variant = detection_service.get_variant(variant, optimized_for_streaming).name
+    return await get_scheduler(variant).submit(image)
+
+
+async def schedule_cascade_detection(
+    image_data: bytes,
+    endpoint: Optional[str] = None,
+    variant: Optional[str] = None
+) -> List[Detection]:
+    """
+    Preprocess and detect a frame, screening it with the cascade gate model first
+    when the endpoint has a gate threshold (see CASCADE_THRESHOLDS). Escalated
+    frames run on CASCADE_MAIN_VARIANT rather than the endpoint's own variant.
+    
+    Args:
+        image_data: Raw image bytes
+        endpoint: Endpoint key the frame came from (None skips the gate)
+        variant: Model variant the endpoint runs when it isn't cascaded
+    
+    Returns:
+        List of Detection objects; empty if the gate ruled the frame out
+    """
+    threshold = detection_service.cascade_threshold(endpoint)
+    if threshold is not None:
+        gate = detection_service.CASCADE_GATE_VARIANT
+        gate_image = await run_in_inference_executor(detection_service.process_image, image_data, variant=gate)
+        gate_detections = await schedule_detection(gate_image, variant=gate)
+        if not detection_service.cascade_escalates(endpoint, gate_detections, threshold):
+            return []
+        variant = detection_service.CASCADE_MAIN_VARIANT
+
+    processed_image = await run_in_inference_executor(detection_service.process_image, image_data, variant=variant)
+    detections = await schedule_detection(processed_image, variant=variant)
+    if threshold is not None:
+        detection_service.record_cascade_result(endpoint, detections)
+    return detections
+
+
+def get_scheduler_stats() -> List[Dict[str, Any]]:
+    """Stats for every scheduler created in this worker"""
+    return [scheduler.stats() for scheduler in schedulers.values()]
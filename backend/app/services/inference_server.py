@@ -0,0 +1,499 @@
+# Run the server from backend/ with INFERENCE_SERVER_AUTHKEY set: python -m app.services.inference_server --processes 2
+import argparse
+import asyncio
+import itertools
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from multiprocessing import get_context, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.models import Detection
+from app.services.inference_executor import InferenceQueueFullError
+from app.services.preprocessing import PreprocessedImage
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Unix socket path (created 0600) or host:port
+SERVER_ADDRESS = get_setting("INFERENCE_SERVER_ADDRESS", os.path.join(tempfile.gettempdir(), "ecovision-inference.sock"))
+# Shared secret for the connection handshake. Control messages are pickled, so
+# there is no default: server and clients refuse to start without one.
+SERVER_AUTHKEY = get_setting("INFERENCE_SERVER_AUTHKEY", "")
+# Seconds an API worker waits for a frame's result before giving up on the server
+SERVER_TIMEOUT = get_setting("INFERENCE_SERVER_TIMEOUT", 10.0)
+SERVER_PROCESSES = get_setting("INFERENCE_SERVER_PROCESSES", 1)
+SERVER_MAX_BATCH_SIZE = get_setting("INFERENCE_MAX_BATCH_SIZE", 8)
+# Slots in each API worker's shared-memory ring = frames it can have in flight
+RING_SLOTS = get_setting("INFERENCE_RING_SLOTS", 16)
+MAX_RESULT_ROWS = get_setting("MAX_DETECTIONS", 100)
+
+# Compact result rows: x_min, y_min, x_max, y_max, confidence, class_id
+RESULT_COLUMNS = 6
+_ALIGNMENT = 64
+# Shared-memory blocks a worker keeps attached (one per connected API worker)
+_MAX_ATTACHED_RINGS = 64
+
+
+def _parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' for TCP, anything else is treated as a Unix socket path"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def _authkey_bytes(authkey: str) -> bytes:
+    if not authkey:
+        raise RuntimeError(
+            "INFERENCE_SERVER_AUTHKEY is not set; the inference server unpickles control "
+            "messages, so it will not run without a shared secret"
+        )
+    return authkey.encode()
+
+
+class InferenceServerTimeoutError(InferenceQueueFullError):
+    """Raised when the inference server doesn't answer in time; endpoints answer it like a full queue (503)"""
+    pass
+
+
+class SharedFrameRing:
+    """
+    Fixed-size slots in a single shared-memory block.
+
+    Each slot holds one input tensor followed by room for `result_rows` compact
+    detection rows, so frames travel to the inference processes and results
+    come back without being pickled.
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        input_bytes: int,
+        result_rows: int,
+        name: Optional[str] = None
+    ):
+        self.slots = slots
+        self.input_bytes = input_bytes
+        self.result_rows = result_rows
+        result_bytes = result_rows * RESULT_COLUMNS * 4
+        self.slot_size = -(-(input_bytes + result_bytes) // _ALIGNMENT) * _ALIGNMENT
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creating API worker may unlink the block; keep this
+            # process's resource tracker from removing it on exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.owner = False
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def input_view(self, slot: int, shape: Tuple[int, ...], dtype: Union[str, np.dtype]) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape)) * dtype.itemsize > self.input_bytes:
+            raise ValueError(f"Frame of shape {shape} does not fit in a {self.input_bytes} byte slot")
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_size)
+
+    def result_view(self, slot: int) -> np.ndarray:
+        return np.ndarray(
+            (self.result_rows, RESULT_COLUMNS),
+            dtype=np.float32,
+            buffer=self.shm.buf,
+            offset=slot * self.slot_size + self.input_bytes
+        )
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ---------------------------------------------------------------------------
+# Server side
+# ---------------------------------------------------------------------------
+
+def _worker_main(work_queue, result_queue, ready_queue, max_batch_size: int) -> None:
+    """
+    Inference process: owns one model session and serves frames from any API worker.
+
+    Frames already queued are drained into one batch (same shape only) so
+    concurrent API workers share a single model run.
+    """
+    from app.services import detection_service
+
+    if detection_service.MODEL is None:
+        detection_service.load_model()
+    plan = detection_service.get_model_plan()
+    if plan is None:
+        ready_queue.put({"error": "Model failed to load"})
+        return
+
+    ready_queue.put({
+        "input_size": list(plan.input_size),
+        "channels_first": plan.channels_first,
+        "dynamic_batch": plan.dynamic_batch
+    })
+    if not plan.dynamic_batch:
+        max_batch_size = 1
+
+    rings: "OrderedDict[str, SharedFrameRing]" = OrderedDict()
+
+    def attach(name: str, input_bytes: int, result_rows: int, slots: int) -> SharedFrameRing:
+        ring = rings.get(name)
+        if ring is None:
+            ring = SharedFrameRing(slots, input_bytes, result_rows, name=name)
+            rings[name] = ring
+            if len(rings) > _MAX_ATTACHED_RINGS:
+                rings.popitem(last=False)[1].close()
+        rings.move_to_end(name)
+        return ring
+
+    while True:
+        item = work_queue.get()
+        if item is None:
+            break
+
+        batch = [item]
+        while len(batch) < max_batch_size:
+            try:
+                next_item = work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if next_item is None:
+                work_queue.put(None)
+                break
+            batch.append(next_item)
+
+        # Frames of different sizes (e.g. streaming vs snapshot) run separately
+        groups: Dict[Tuple, List[Dict]] = {}
+        for request in batch:
+            groups.setdefault((tuple(request["shape"]), request["dtype"]), []).append(request)
+
+        for (shape, dtype), requests in groups.items():
+            try:
+                views = []
+                for request in requests:
+                    ring = attach(request["shm"], request["input_bytes"], request["result_rows"], request["slots"])
+                    views.append((ring, ring.input_view(request["slot"], shape, dtype)))
+                tensor = np.concatenate([view for _, view in views], axis=0)
+                results = detection_service.detect_raw(tensor)
+
+                for request, (ring, _), rows in zip(requests, views, results):
+                    count = min(len(rows), ring.result_rows)
+                    ring.result_view(request["slot"])[:count] = rows[:count]
+                    result_queue.put((request["client_id"], ("result", request["request_id"], count)))
+            except Exception as e:
+                for request in requests:
+                    result_queue.put((request["client_id"], ("error", request["request_id"], str(e))))
+
+    for ring in rings.values():
+        ring.close()
+
+
+class InferenceServer:
+    """
+    Dedicated inference processes shared by all API workers on the host.
+
+    API workers connect over a local socket, register a shared-memory ring and
+    then only exchange small control messages (slot index, shape, result count);
+    pixels and detection arrays stay in shared memory.
+    """
+
+    def __init__(
+        self,
+        address: str = SERVER_ADDRESS,
+        authkey: str = SERVER_AUTHKEY,
+        processes: int = SERVER_PROCESSES,
+        max_batch_size: int = SERVER_MAX_BATCH_SIZE
+    ):
+        self.authkey = _authkey_bytes(authkey)
+        self.address = _parse_address(address)
+        self.processes = max(1, int(processes))
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._context = get_context("spawn")
+        self._clients: Dict[int, Tuple[Any, threading.Lock]] = {}
+        self._client_ids = itertools.count()
+        self._workers = []
+        self._plan: Dict[str, Any] = {}
+
+    def start_workers(self) -> None:
+        self.work_queue = self._context.Queue()
+        self.result_queue = self._context.Queue()
+        ready_queue = self._context.Queue()
+
+        for _ in range(self.processes):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(self.work_queue, self.result_queue, ready_queue, self.max_batch_size),
+                daemon=True
+            )
+            process.start()
+            self._workers.append(process)
+
+        for _ in range(self.processes):
+            ready = ready_queue.get()
+            if "error" in ready:
+                raise RuntimeError(f"Inference process failed to start: {ready['error']}")
+            self._plan = ready
+
+        threading.Thread(target=self._route_results, name="inference-results", daemon=True).start()
+        logger.info(f"Started {self.processes} inference process(es); plan {self._plan}")
+
+    def _route_results(self) -> None:
+        while True:
+            client_id, message = self.result_queue.get()
+            client = self._clients.get(client_id)
+            if client is None:
+                continue
+            conn, lock = client
+            try:
+                with lock:
+                    conn.send(message)
+            except (OSError, EOFError):
+                self._clients.pop(client_id, None)
+
+    def _serve_client(self, conn) -> None:
+        client_id = next(self._client_ids)
+        try:
+            conn.send({"type": "plan", **self._plan})
+            attach = conn.recv()
+            self._clients[client_id] = (conn, threading.Lock())
+            logger.info(f"API worker {client_id} attached ring {attach['shm']} ({attach['slots']} slots)")
+
+            while True:
+                _, request_id, slot, shape, dtype = conn.recv()
+                self.work_queue.put({
+                    "client_id": client_id,
+                    "request_id": request_id,
+                    "slot": slot,
+                    "shape": shape,
+                    "dtype": dtype,
+                    "shm": attach["shm"],
+                    "slots": attach["slots"],
+                    "input_bytes": attach["input_bytes"],
+                    "result_rows": attach["result_rows"]
+                })
+        except (EOFError, OSError):
+            logger.info(f"API worker {client_id} disconnected")
+        finally:
+            self._clients.pop(client_id, None)
+            conn.close()
+
+    def _listen(self) -> Listener:
+        if not isinstance(self.address, str):
+            return Listener(self.address, authkey=self.authkey)
+
+        # A socket left behind by a server that didn't shut down cleanly blocks the bind
+        try:
+            if stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+        # Create the socket owner-only (0600) from the start rather than chmod-ing it afterwards
+        previous_umask = os.umask(0o177)
+        try:
+            return Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+
+    def serve_forever(self) -> None:
+        self.start_workers()
+        with self._listen() as listener:
+            logger.info(f"Inference server listening on {self.address}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# API worker side
+# ---------------------------------------------------------------------------
+
+class RemoteInferenceClient:
+    """
+    Connection from an API worker to the inference server.
+
+    Preprocessed frames are copied into a free slot of this worker's shared
+    ring; the server answers with the number of result rows it wrote back into
+    the same slot.
+    """
+
+    def __init__(
+        self,
+        address: str = SERVER_ADDRESS,
+        authkey: str = SERVER_AUTHKEY,
+        slots: int = RING_SLOTS,
+        timeout: float = SERVER_TIMEOUT
+    ):
+        self._conn = Client(_parse_address(address), authkey=_authkey_bytes(authkey))
+        self.timeout = float(timeout)
+        plan = self._conn.recv()
+        self.input_spec = (tuple(plan["input_size"]), plan["channels_first"])
+
+        width, height = self.input_spec[0]
+        self.ring = SharedFrameRing(slots, input_bytes=3 * width * height * 4, result_rows=MAX_RESULT_ROWS)
+        self._conn.send({
+            "type": "attach",
+            "shm": self.ring.name,
+            "slots": slots,
+            "input_bytes": self.ring.input_bytes,
+            "result_rows": self.ring.result_rows
+        })
+
+        # Slots and pending requests are only touched from the event loop thread
+        self._free_slots = list(range(slots))
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future, int]] = {}
+        self._request_ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+        threading.Thread(target=self._read_replies, name="inference-client", daemon=True).start()
+        logger.info(f"Connected to inference server at {address}; input spec {self.input_spec}")
+
+    def _read_replies(self) -> None:
+        try:
+            while True:
+                kind, request_id, payload = self._conn.recv()
+                entry = self._pending.get(request_id)
+                if entry is not None:
+                    entry[0].call_soon_threadsafe(self._complete, request_id, kind, payload)
+        except (EOFError, OSError):
+            logger.error("Lost connection to inference server")
+            self.closed = True
+            for request_id, (loop, _, _) in list(self._pending.items()):
+                loop.call_soon_threadsafe(self._complete, request_id, "error", "Inference server disconnected")
+
+    def _complete(self, request_id: int, kind: str, payload: Any) -> None:
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        _, future, slot = entry
+        if not future.done():
+            if kind == "result":
+                # Copy out before the slot is handed to the next frame
+                future.set_result(self.ring.result_view(slot)[:payload].copy())
+            elif kind == "timeout":
+                future.set_exception(InferenceServerTimeoutError(payload))
+            else:
+                future.set_exception(ValueError(f"Remote inference failed: {payload}"))
+        self._free_slots.append(slot)
+
+    async def detect(self, image: PreprocessedImage) -> List[Detection]:
+        """
+        Run detection for one preprocessed frame on the inference server.
+
+        Args:
+            image: Frame from process_image
+
+        Returns:
+            List of Detection objects in original image coordinates
+        """
+        from app.services.detection_service import detections_from_rows
+
+        if self.closed:
+            raise ConnectionError("Inference server connection is closed")
+        if not self._free_slots:
+            raise InferenceQueueFullError("All shared-memory inference slots are in use")
+
+        slot = self._free_slots.pop()
+        tensor = image.tensor
+        try:
+            self.ring.input_view(slot, tensor.shape, tensor.dtype)[...] = tensor
+        except Exception:
+            self._free_slots.append(slot)
+            raise
+        finally:
+            image.release()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._request_ids)
+        self._pending[request_id] = (loop, future, slot)
+        with self._send_lock:
+            self._conn.send(("detect", request_id, slot, tensor.shape, tensor.dtype.str))
+
+        try:
+            rows = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._abandon(f"Inference server did not answer within {self.timeout:g}s")
+            raise InferenceServerTimeoutError(f"Inference server did not answer within {self.timeout:g}s")
+        return detections_from_rows(rows, image.letterbox)
+
+    def _abandon(self, reason: str) -> None:
+        """
+        Give up on a server that stopped answering: fail every pending frame and
+        drop the connection, so the next get_client() call reconnects.
+        """
+        if self.closed:
+            return
+        logger.error(f"{reason}; dropping the connection")
+        self.closed = True
+        for request_id in list(self._pending):
+            self._complete(request_id, "timeout", reason)
+        try:
+            # Wake the reply reader, which may be blocked in recv on this socket
+            with socket.socket(fileno=os.dup(self._conn.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.ring.slots,
+            "free_slots": len(self._free_slots),
+            "in_flight": len(self._pending),
+            "connected": not self.closed
+        }
+
+    def close(self) -> None:
+        self.closed = True
+        self._conn.close()
+        self.ring.close()
+
+
+_client: Optional[RemoteInferenceClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> RemoteInferenceClient:
+    """Shared connection for this API worker, (re)connecting on first use"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.closed:
+            if _client is not None:
+                _client.ring.close()
+            _client = RemoteInferenceClient()
+        return _client
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EcoVision out-of-process inference server')
+    parser.add_argument('--address', type=str, default=SERVER_ADDRESS, help='host:port or Unix socket path')
+    parser.add_argument('--processes', type=int, default=SERVER_PROCESSES, help='Inference processes to start')
+    parser.add_argument('--max-batch-size', type=int, default=SERVER_MAX_BATCH_SIZE, help='Frames per model run')
+    args = parser.parse_args()
+
+    InferenceServer(
+        address=args.address,
+        processes=args.processes,
+        max_batch_size=args.max_batch_size
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import asyncio
+import copy
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.enviroment import get_setting
+
+# Simulated round-trip per Firestore/Auth call. The real client is synchronous, so
+# this blocks the caller the same way a network round-trip would.
+LOCAL_FIREBASE_LATENCY_MS = get_setting("LOCAL_FIREBASE_LATENCY_MS", 0.0)
+
+# Tokens the stand-in accepts: TOKEN_PREFIX + uid
+TOKEN_PREFIX = "local-token:"
+
+# Deployment environment. The stand-in accepts a token for any uid, so it only
+# runs when this is explicitly set to one of LOCAL_ENVIRONMENTS.
+ENVIRONMENT = get_setting("ENVIRONMENT", "production")
+LOCAL_ENVIRONMENTS = {"development", "local", "test"}
+
+
+def require_local_environment() -> None:
+    """Refuse to serve the stand-in unless a non-production environment is configured"""
+    if str(ENVIRONMENT).lower() not in LOCAL_ENVIRONMENTS:
+        raise RuntimeError(
+            f"LOCAL_FIREBASE is set but ENVIRONMENT is {ENVIRONMENT!r}; the in-memory Firebase "
+            f"stand-in accepts forged tokens and only runs with ENVIRONMENT set to one of "
+            f"{', '.join(sorted(LOCAL_ENVIRONMENTS))}"
+        )
+
+
+def make_token(uid: str) -> str:
+    """ID token the in-memory Auth accepts for `uid` (used by the load-test driver)"""
+    return f"{TOKEN_PREFIX}{uid}"
+
+
+def _round_trip() -> None:
+    if LOCAL_FIREBASE_LATENCY_MS > 0:
+        time.sleep(LOCAL_FIREBASE_LATENCY_MS / 1000.0)
+
+
+@dataclass
+class UserRecord:
+    uid: str
+    email: Optional[str] = None
+    display_name: Optional[str] = None
+    photo_url: Optional[str] = None
+
+
+class LocalAuth:
+    """The subset of firebase_admin.auth used by firebase_service"""
+
+    def verify_id_token(self, token: str) -> Dict[str, Any]:
+        _round_trip()
+        if not token.startswith(TOKEN_PREFIX) or len(token) == len(TOKEN_PREFIX):
+            raise ValueError("Token was not issued by the local Firebase stand-in")
+        return {"uid": token[len(TOKEN_PREFIX):], "claims": {}}
+
+    def get_user(self, uid: str) -> UserRecord:
+        _round_trip()
+        return UserRecord(uid=uid, email=f"{uid}@example.com", display_name=f"Local {uid}")
+
+
+class Increment:
+    """Stand-in for firestore.Increment"""
+
+    def __init__(self, value: float):
+        self.value = value
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+
+class _FirestoreNamespace:
+    """Mirrors the `firestore` module attributes firebase_service uses"""
+    Increment = Increment
+    Query = Query
+    SERVER_TIMESTAMP = object()
+
+
+firestore = _FirestoreNamespace()
+
+
+class DocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+@dataclass
+class AggregationResult:
+    value: int
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class LocalFirestore:
+    """
+    In-memory Firestore client for load tests and local runs without credentials.
+
+    Collections are keyed by their full path, so subcollections such as
+    users/{uid}/scans behave like the real ones. Reads and writes copy
+    documents, as the real client's serialization does.
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple[str, ...], Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self, (name,))
+
+    def _documents(self, path: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+        return self._collections.setdefault(path, {})
+
+
+class DocumentReference:
+    def __init__(self, db: LocalFirestore, collection_path: Tuple[str, ...], doc_id: str):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self._db, self._collection_path + (self.id, name))
+
+    def get(self) -> DocumentSnapshot:
+        _round_trip()
+        with self._db._lock:
+            data = self._db._documents(self._collection_path).get(self.id)
+            return DocumentSnapshot(self.id, copy.deepcopy(data))
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        _round_trip()
+        with self._db._lock:
+            documents = self._db._documents(self._collection_path)
+            if merge and self.id in documents:
+                documents[self.id].update(copy.deepcopy(data))
+            else:
+                documents[self.id] = copy.deepcopy(data)
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        _round_trip()
+        with self._db._lock:
+            documents = self._db._documents(self._collection_path)
+            if self.id not in documents:
+                raise ValueError(f"No document to update: {'/'.join(self._collection_path)}/{self.id}")
+            document = documents[self.id]
+            for key, value in fields.items():
+                # Dotted keys update nested map fields
+                *parents, leaf = key.split(".")
+                target = document
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                if isinstance(value, Increment):
+                    target[leaf] = target.get(leaf, 0) + value.value
+                else:
+                    target[leaf] = copy.deepcopy(value)
+
+    def delete(self) -> None:
+        _round_trip()
+        with self._db._lock:
+            self._db._documents(self._collection_path).pop(self.id, None)
+
+
+class CollectionReference:
+    """A collection, and the queries built on it (where / order_by / limit / offset)"""
+
+    def __init__(
+        self,
+        db: LocalFirestore,
+        path: Tuple[str, ...],
+        filters: Tuple = (),
+        order: Optional[Tuple[str, str]] = None,
+        limit_count: Optional[int] = None,
+        offset_count: int = 0
+    ):
+        self._db = db
+        self._path = path
+        self._filters = filters
+        self._order = order
+        self._limit = limit_count
+        self._offset = offset_count
+
+    def _derive(self, **changes) -> "CollectionReference":
+        params = {
+            "filters": self._filters,
+            "order": self._order,
+            "limit_count": self._limit,
+            "offset_count": self._offset
+        }
+        params.update(changes)
+        return CollectionReference(self._db, self._path, **params)
+
+    def document(self, doc_id: str) -> DocumentReference:
+        return DocumentReference(self._db, self._path, doc_id)
+
+    def where(self, field: str, op: str, value: Any) -> "CollectionReference":
+        return self._derive(filters=self._filters + ((field, _OPERATORS[op], value),))
+
+    def order_by(self, field: str, direction: str = Query.ASCENDING) -> "CollectionReference":
+        return self._derive(order=(field, direction))
+
+    def limit(self, count: int) -> "CollectionReference":
+        return self._derive(limit_count=count)
+
+    def offset(self, count: int) -> "CollectionReference":
+        return self._derive(offset_count=count)
+
+    def stream(self) -> List[DocumentSnapshot]:
+        _round_trip()
+        with self._db._lock:
+            items = list(self._db._documents(self._path).items())
+
+        matches = [
+            (doc_id, data) for doc_id, data in items
+            if all(field in data and compare(data[field], value) for field, compare, value in self._filters)
+        ]
+        if self._order is not None:
+            field, direction = self._order
+            matches = [item for item in matches if field in item[1]]
+            matches.sort(key=lambda item: item[1][field], reverse=direction == Query.DESCENDING)
+
+        matches = matches[self._offset:]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+        return [DocumentSnapshot(doc_id, copy.deepcopy(data)) for doc_id, data in matches]
+
+    def count(self) -> "_CountQuery":
+        return _CountQuery(self)
+
+
+class _CountQuery:
+    def __init__(self, query: CollectionReference):
+        self._query = query
+
+    def get(self) -> List[List[AggregationResult]]:
+        # Same nesting as the real aggregation result: [[AggregationResult]]
+        query = self._query._derive(limit_count=None, offset_count=0, order=None)
+        return [[AggregationResult(value=len(query.stream()))]]
+
+
+class LocalBlob:
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self._bucket = bucket
+        self.name = name
+
+    def upload_from_filename(self, filename: str) -> None:
+        with open(filename, "rb") as f:
+            self._bucket.blobs[self.name] = f.read()
+
+    def delete(self) -> None:
+        self._bucket.blobs.pop(self.name, None)
+
+
+class LocalBucket:
+    def __init__(self):
+        self.blobs: Dict[str, bytes] = {}
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+
+auth = LocalAuth()
+db = LocalFirestore()
+bucket = LocalBucket()
+
+
+# Canned recycling info, in place of the external recycling-info API
+_NOT_RECYCLABLE = {"unknown", "other", "trash", "organic"}
+
+
+async def get_recycling_info(category: Any, confidence: Optional[float] = None):
+    """
+    Same interface as external_api.get_recycling_info, without the network call.
+
+    Args:
+        category: Detected RecyclableCategory
+        confidence: Detection confidence (unused)
+
+    Returns:
+        RecyclingInfo for the category
+    """
+    from app.models import RecyclingInfo
+
+    # The real client is async, so its latency doesn't block the event loop
+    if LOCAL_FIREBASE_LATENCY_MS > 0:
+        await asyncio.sleep(LOCAL_FIREBASE_LATENCY_MS / 1000.0)
+    name = getattr(category, "value", category)
+    recyclable = name not in _NOT_RECYCLABLE
+    return RecyclingInfo(
+        category=category,
+        recyclable=recyclable,
+        description=f"Local stand-in description for {name}",
+        disposal_instructions="Place in the recycling bin" if recyclable else "Place in general waste",
+        environmental_impact=f"Local stand-in impact for {name}"
+    )
@@ -0,0 +1,193 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ONNX Runtime type strings -> numpy dtypes we can feed from the float32 preprocessing buffers
+_FLOAT_INPUT_TYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+}
+
+
+def _is_static(dim: Any) -> bool:
+    """ONNX Runtime reports dynamic dimensions as strings (e.g. 'batch') or None"""
+    return isinstance(dim, int) and dim > 0
+
+
+def _dim_repr(dim: Any) -> Any:
+    """Static dims as ints, symbolic dims by name, unnamed dynamic dims as None"""
+    return dim if _is_static(dim) or isinstance(dim, str) else None
+
+
+@dataclass(frozen=True)
+class ModelPlan:
+    """
+    Everything the per-frame path needs to know about a loaded ONNX session,
+    resolved once when the model is loaded.
+
+    `prepare_input` is a fixed adapter chosen for this model (identity for
+    float32 NCHW models), so no session introspection happens per frame.
+    """
+    input_name: str
+    input_shape: Tuple[Any, ...]
+    input_type: str
+    input_dtype: np.dtype
+    channels_first: bool
+    dynamic_batch: bool
+    dynamic_spatial: bool
+    input_size: Tuple[int, int]  # (width, height) used by preprocessing
+    output_names: Tuple[str, ...]
+    output_shapes: Tuple[Tuple[Any, ...], ...]
+    output_channel_major: Optional[bool]  # None when it has to be read from the runtime shape
+    num_classes: Optional[int]
+    prepare_input: Callable[[np.ndarray], np.ndarray] = field(repr=False, compare=False)
+
+    @property
+    def input_layout(self) -> str:
+        return "NCHW" if self.channels_first else "NHWC"
+
+    @property
+    def max_batch_size(self) -> Optional[int]:
+        """None for a dynamic batch dimension"""
+        return None if self.dynamic_batch else int(self.input_shape[0])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable view of the plan for the debug endpoint"""
+        return {
+            "input": {
+                "name": self.input_name,
+                "shape": [_dim_repr(dim) for dim in self.input_shape],
+                "type": self.input_type,
+                "dtype": self.input_dtype.name,
+                "layout": self.input_layout,
+                "dynamic_batch": self.dynamic_batch,
+                "dynamic_spatial": self.dynamic_spatial,
+                "preprocess_size": list(self.input_size),
+                "adapter": getattr(self.prepare_input, "__name__", "adapter"),
+            },
+            "outputs": [
+                {
+                    "name": name,
+                    "shape": [_dim_repr(dim) for dim in shape],
+                }
+                for name, shape in zip(self.output_names, self.output_shapes)
+            ],
+            "postprocess": {
+                "detection_output": self.output_names[0] if self.output_names else None,
+                "layout": (
+                    "runtime" if self.output_channel_major is None
+                    else "[batch, 4+classes, anchors]" if self.output_channel_major
+                    else "[batch, anchors, 4+classes]"
+                ),
+                "num_classes": self.num_classes,
+            },
+        }
+
+
+def _build_input_adapter(
+    dtype: np.dtype,
+    channels_first: bool
+) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Build the per-frame input adapter for a model.
+
+    Frames from the preprocessing engine are already float32 in the model's
+    layout; raw arrays passed by callers may still be in the other layout.
+    """
+    dtype = np.dtype(dtype)
+
+    def _fix_layout(image: np.ndarray) -> np.ndarray:
+        if image.ndim != 4:
+            return image
+        if channels_first and image.shape[1] != 3 and image.shape[3] == 3:
+            return np.transpose(image, (0, 3, 1, 2))
+        if not channels_first and image.shape[1] == 3 and image.shape[3] != 3:
+            return np.transpose(image, (0, 2, 3, 1))
+        return image
+
+    if dtype == np.float32:
+        def float32_input(image: np.ndarray) -> np.ndarray:
+            return _fix_layout(image).astype(np.float32, copy=False)
+        return float32_input
+
+    def cast_input(image: np.ndarray) -> np.ndarray:
+        return _fix_layout(image).astype(dtype, copy=False)
+    cast_input.__name__ = f"cast_to_{dtype.name}"
+    return cast_input
+
+
+def build_model_plan(session, default_input_size: Tuple[int, int] = (640, 640)) -> ModelPlan:
+    """
+    Inspect an ONNX Runtime session once and resolve its I/O plan.
+
+    Args:
+        session: onnxruntime.InferenceSession
+        default_input_size: (width, height) to preprocess to when the model's
+            spatial dimensions are dynamic
+
+    Returns:
+        ModelPlan for the session
+    """
+    model_input = session.get_inputs()[0]
+    input_shape = tuple(model_input.shape)
+    input_type = model_input.type
+
+    if input_type not in _FLOAT_INPUT_TYPES:
+        raise ValueError(f"Unsupported model input type {input_type}; expected a float tensor")
+    input_dtype = np.dtype(_FLOAT_INPUT_TYPES[input_type])
+
+    if len(input_shape) != 4:
+        raise ValueError(f"Expected a 4-D image input, got shape {input_shape}")
+
+    # NCHW unless the model clearly says NHWC
+    channels_first = not (input_shape[3] == 3 and input_shape[1] != 3)
+    height_dim, width_dim = (input_shape[2], input_shape[3]) if channels_first else (input_shape[1], input_shape[2])
+
+    dynamic_spatial = not (_is_static(height_dim) and _is_static(width_dim))
+    input_size = default_input_size if dynamic_spatial else (int(width_dim), int(height_dim))
+
+    outputs = session.get_outputs()
+    output_names = tuple(output.name for output in outputs)
+    output_shapes = tuple(tuple(output.shape) for output in outputs)
+
+    # Detection head is the first output: [batch, 4+C, N] or [batch, N, 4+C]
+    output_channel_major = None
+    num_classes = None
+    if output_shapes and len(output_shapes[0]) == 3:
+        _, dim_a, dim_b = output_shapes[0]
+        if _is_static(dim_a) and _is_static(dim_b):
+            output_channel_major = dim_a < dim_b
+        elif _is_static(dim_a) or _is_static(dim_b):
+            # With dynamic spatial inputs only the anchor count is dynamic
+            output_channel_major = _is_static(dim_a)
+        if output_channel_major is not None:
+            num_classes = (dim_a if output_channel_major else dim_b) - 4
+
+    plan = ModelPlan(
+        input_name=model_input.name,
+        input_shape=input_shape,
+        input_type=input_type,
+        input_dtype=input_dtype,
+        channels_first=channels_first,
+        dynamic_batch=not _is_static(input_shape[0]),
+        dynamic_spatial=dynamic_spatial,
+        input_size=input_size,
+        output_names=output_names,
+        output_shapes=output_shapes,
+        output_channel_major=output_channel_major,
+        num_classes=num_classes,
+        prepare_input=_build_input_adapter(input_dtype, channels_first),
+    )
+
+    logger.info(
+        f"Resolved model plan: input {plan.input_name} {plan.input_layout} {input_dtype.name} "
+        f"{list(input_shape)}, preprocess to {input_size[0]}x{input_size[1]}, "
+        f"outputs {list(output_names)}"
+    )
+    return plan
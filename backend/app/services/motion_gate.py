@@ -0,0 +1,107 @@
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.services.preprocessing import decode_grayscale
+from app.utils.enviroment import get_setting
+from app.utils.metrics import registry
+
+MOTION_GATE_ENABLED = get_setting("MOTION_GATE_ENABLED", True)
+# Mean absolute difference (0-255 gray levels) below which a frame counts as unchanged
+MOTION_GATE_THRESHOLD = get_setting("MOTION_GATE_THRESHOLD", 4.0)
+# Run the model at least this often even if the scene looks static
+MOTION_GATE_REFRESH_FRAMES = get_setting("MOTION_GATE_REFRESH_FRAMES", 15)
+MOTION_GATE_REFRESH_SECONDS = get_setting("MOTION_GATE_REFRESH_SECONDS", 2.0)
+
+THUMBNAIL_SIZE = (64, 48)
+
+skipped_metric = registry.counter(
+    "motion_gate_skipped_frames_total", "Streamed frames answered with the previous result"
+)
+inferred_metric = registry.counter(
+    "motion_gate_inferred_frames_total", "Streamed frames passed through to the model"
+)
+
+
+def frame_thumbnail(image_data: bytes) -> Optional[np.ndarray]:
+    """
+    Small blurred grayscale copy of an encoded frame for change detection.
+
+    Args:
+        image_data: Raw image bytes
+
+    Returns:
+        A float32 array of THUMBNAIL_SIZE, or None if the image can't be decoded
+    """
+    gray = decode_grayscale(image_data, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+
+    thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    # Blur away sensor noise and JPEG artifacts so they don't read as motion
+    return cv2.GaussianBlur(thumbnail, (5, 5), 0).astype(np.float32)
+
+
+class MotionGate:
+    """
+    Per-connection gate that skips inference while the camera view is static.
+
+    Each frame is compared with the last frame that actually went through the
+    model. Frames that differ by less than `threshold` reuse the previous result,
+    except that a refresh is forced every `refresh_frames` frames or
+    `refresh_seconds` seconds, so slow changes are still picked up.
+    """
+
+    def __init__(
+        self,
+        threshold: float = MOTION_GATE_THRESHOLD,
+        refresh_frames: int = MOTION_GATE_REFRESH_FRAMES,
+        refresh_seconds: float = MOTION_GATE_REFRESH_SECONDS,
+        enabled: bool = MOTION_GATE_ENABLED
+    ):
+        self.threshold = float(threshold)
+        self.refresh_frames = max(1, int(refresh_frames))
+        self.refresh_seconds = float(refresh_seconds)
+        self.enabled = enabled
+
+        self._reference: Optional[np.ndarray] = None
+        self._reference_at = 0.0
+        self._frames_since_reference = 0
+
+    def should_infer(self, thumbnail: Optional[np.ndarray]) -> bool:
+        """
+        Decide whether a frame needs to go through the model.
+
+        Args:
+            thumbnail: Output of frame_thumbnail for the new frame
+
+        Returns:
+            False if the previous result can be re-sent for this frame
+        """
+        if not self.enabled or thumbnail is None or self._reference is None:
+            return True
+
+        self._frames_since_reference += 1
+        if (self._frames_since_reference >= self.refresh_frames
+                or time.monotonic() - self._reference_at >= self.refresh_seconds):
+            return True
+
+        if float(cv2.absdiff(thumbnail, self._reference).mean()) >= self.threshold:
+            return True
+
+        skipped_metric.inc()
+        return False
+
+    def update(self, thumbnail: Optional[np.ndarray]) -> None:
+        """
+        Record the frame that was just run through the model as the new reference.
+
+        Args:
+            thumbnail: Output of frame_thumbnail for that frame
+        """
+        inferred_metric.inc()
+        self._reference = thumbnail
+        self._reference_at = time.monotonic()
+        self._frames_since_reference = 0
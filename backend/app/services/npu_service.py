@@ -1,119 +1,229 @@
-import tensorflow as tf
-import platform
+import glob
+import hashlib
+import json
 import os
-import logging
-from typing import Optional
+import platform
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import onnxruntime
 
+from app.config import settings
+from app.utils.enviroment import get_setting
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def is_npu_available() -> bool:
+# Preferred order; anything a host lacks is skipped and CPU is always the last resort
+VITIS_AI_PROVIDER = "VitisAIExecutionProvider"
+OPENVINO_PROVIDER = "OpenVINOExecutionProvider"
+CPU_PROVIDER = "CPUExecutionProvider"
+PROVIDER_PRIORITY = (VITIS_AI_PROVIDER, OPENVINO_PROVIDER, CPU_PROVIDER)
+
+# OpenVINO devices worth preferring over ONNX Runtime's own CPU kernels
+_OPENVINO_ACCELERATORS = ("NPU", "GPU", "MYRIAD")
+
+# Coral USB Accelerator (vendor, product) before and after firmware load
+_CORAL_USB_IDS = {("1a6e", "089a"), ("18d1", "9302")}
+
+PROVIDER_CACHE_PATH = get_setting(
+    "PROVIDER_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "ecovision", "providers.json")
+)
+
+ProviderList = List[Tuple[str, Dict[str, Any]]]
+
+_providers: Optional[ProviderList] = None
+_providers_lock = threading.Lock()
+
+
+def host_fingerprint() -> str:
     """
-    Check if NPU (Neural Processing Unit) is available on the device.
-    This function detects different types of NPUs or accelerators.
-    
+    Identify this host's hardware/runtime combination.
+
+    The cached probe result is only reused while the fingerprint matches, so a
+    new accelerator, driver device node or onnxruntime build triggers a re-probe.
+    The hostname is left out so recreated containers on the same hardware match.
+
     Returns:
-        bool: True if an NPU is available, False otherwise
+        str: Hex digest of the host description
     """
+    cpu_model = ""
     try:
-        # Check for Google Edge TPU
-        if "EdgeTPU" in tf.config.list_physical_devices():
-            logger.info("Google Edge TPU detected")
-            return True
-            
-        # Check for Apple Neural Engine
-        if platform.system() == "Darwin" and hasattr(tf, "config") and hasattr(tf.config, "list_physical_devices"):
-            devices = tf.config.list_physical_devices()
-            for device in devices:
-                if "ANE" in device.name:
-                    logger.info("Apple Neural Engine detected")
-                    return True
-        
-        # Check for NNAPI delegate (Android devices)
-        if platform.system() == "Linux" and "android" in platform.version().lower():
-            logger.info("Android device detected, NNAPI should be available")
-            return True
-            
-        # Check for Coral USB Accelerator
-        if os.path.exists("/dev/apex_0") or any(os.path.exists(f"/sys/bus/usb/devices/*/idProduct") and 
-                                               open(f"/sys/bus/usb/devices/*/idProduct").read().strip() == "8300"):
-            logger.info("Coral USB Accelerator detected")
-            return True
-        
-        # Check for Intel NCS or similar devices
-        # This is a simplified check and may need to be expanded for production
+        with open("/proc/cpuinfo") as f:
+            cpu_model = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), "")
+    except OSError:
+        pass
+
+    description = {
+        "system": platform.system(),
+        "release": platform.release(),
+        "machine": platform.machine(),
+        "cpu": cpu_model,
+        "onnxruntime": onnxruntime.__version__,
+        "available_providers": onnxruntime.get_available_providers(),
+        "devices": sorted(glob.glob("/dev/accel/accel*") + glob.glob("/dev/apex_*")),
+        "npu_config": settings.NPU_CONFIG_PATH if settings.ENABLE_NPU else None,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def _coral_usb_present() -> bool:
+    """Match Coral USB vendor/product IDs in sysfs"""
+    for device in glob.glob("/sys/bus/usb/devices/*"):
         try:
-            from openvino.inference_engine import IECore
-            ie = IECore()
-            devices = ie.available_devices
-            if any(dev.startswith("MYRIAD") for dev in devices):
-                logger.info("Intel Neural Compute Stick detected")
-                return True
-        except ImportError:
-            pass
-            
-        # No known NPU found
-        logger.info("No NPU detected, using CPU for inference")
-        return False
-        
+            with open(os.path.join(device, "idVendor")) as f:
+                vendor = f.read().strip()
+            with open(os.path.join(device, "idProduct")) as f:
+                product = f.read().strip()
+        except OSError:
+            continue
+        if (vendor, product) in _CORAL_USB_IDS:
+            return True
+    return False
+
+
+def _openvino_devices() -> List[str]:
+    """List OpenVINO devices, supporting both the current and the legacy API"""
+    try:
+        from openvino import Core
+        return list(Core().available_devices)
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.warning(f"OpenVINO device query failed: {e}")
+        return []
+    try:
+        from openvino.inference_engine import IECore
+        return list(IECore().available_devices)
+    except ImportError:
+        return []
     except Exception as e:
-        logger.warning(f"Error checking for NPU: {e}")
-        return False
+        logger.warning(f"OpenVINO device query failed: {e}")
+        return []
+
+
+def probe_hardware() -> Dict[str, Any]:
+    """
+    Detect accelerators this host can use through ONNX Runtime.
+
+    This is the slow part (OpenVINO initialisation, sysfs scans) and normally
+    runs once per host; see `get_execution_providers`.
+
+    Returns:
+        dict: Probe results
+    """
+    available = onnxruntime.get_available_providers()
+    probe = {
+        "available_providers": available,
+        "vitis_ai": (
+            VITIS_AI_PROVIDER in available
+            and bool(settings.NPU_CONFIG_PATH)
+            and os.path.exists(settings.NPU_CONFIG_PATH)
+        ),
+        "openvino_devices": _openvino_devices() if OPENVINO_PROVIDER in available else [],
+        "edge_tpu": os.path.exists("/dev/apex_0") or _coral_usb_present(),
+    }
+
+    if probe["edge_tpu"]:
+        # Edge TPUs only run TFLite models, so they cannot serve the ONNX model
+        logger.info("Coral Edge TPU detected; not usable by the ONNX serving path")
+    return probe
+
 
-def get_npu_delegate() -> Optional[tf.lite.experimental.Delegate]:
+def resolve_providers(probe: Dict[str, Any], enable_npu: bool = True) -> ProviderList:
     """
-    Get the appropriate TFLite delegate for the available NPU.
-    
+    Map probe results onto an ordered ONNX Runtime provider list.
+
+    Args:
+        probe: Output of `probe_hardware`
+        enable_npu: If False only the CPU provider is returned
+
     Returns:
-        A TFLite delegate object if available, None otherwise
+        List of (provider name, provider options) in priority order, always ending with CPU
     """
+    providers: ProviderList = []
+
+    if enable_npu:
+        if probe.get("vitis_ai"):
+            providers.append((VITIS_AI_PROVIDER, {"config_file": settings.NPU_CONFIG_PATH}))
+
+        devices = probe.get("openvino_devices") or []
+        device_type = next(
+            (device for accelerator in _OPENVINO_ACCELERATORS for device in devices if device.startswith(accelerator)),
+            None
+        )
+        if device_type:
+            providers.append((OPENVINO_PROVIDER, {"device_type": device_type}))
+
+    providers.append((CPU_PROVIDER, {}))
+    return providers
+
+
+def _read_cache(path: str) -> Dict[str, Any]:
     try:
-        # Check for Google Edge TPU
-        try:
-            from tflite_runtime.interpreter import load_delegate
-            return load_delegate('libedgetpu.so.1')
-        except (ImportError, ValueError):
-            pass
-            
-        # Check for NNAPI delegate (Android)
-        if platform.system() == "Linux" and "android" in platform.version().lower():
-            return tf.lite.experimental.load_delegate('libnnapi.so')
-            
-        # Check for Coral delegate
-        try:
-            return tf.lite.experimental.load_delegate('libedgetpu.so.1.0')
-        except ValueError:
-            pass
-            
-        # Apple Core ML delegate (iOS and macOS)
-        if platform.system() == "Darwin":
-            try:
-                return tf.lite.experimental.load_delegate('libcoreml_delegate.dylib')
-            except ValueError:
-                pass
-        
-        # Intel NCS / OpenVINO
-        try:
-            from openvino.inference_engine import IECore
-            ie = IECore()
-            devices = ie.available_devices
-            if any(dev.startswith("MYRIAD") for dev in devices):
-                # This is a simplification - in practice you'd need to use 
-                # OpenVINO's dedicated API rather than a simple delegate
-                pass
-        except ImportError:
-            pass
-            
-        # GPU Delegate as fallback if no dedicated NPU
-        try:
-            return tf.lite.experimental.load_delegate('libgpu_delegate.so')
-        except ValueError:
-            pass
-            
-        logger.warning("No NPU delegate could be loaded, falling back to CPU")
-        return None
-        
-    except Exception as e:
-        logger.error(f"Error getting NPU delegate: {e}")
-        return None
\ No newline at end of file
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(path: str, cache: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write provider cache {path}: {e}")
+
+
+def get_execution_providers(refresh: bool = False) -> ProviderList:
+    """
+    Get the ordered ONNX Runtime provider list for this host.
+
+    Hardware probing runs at most once per host fingerprint: the result is kept
+    in memory and in a JSON cache on disk, so restarts skip the probe.
+
+    Args:
+        refresh: Ignore cached results and probe again
+
+    Returns:
+        List of (provider name, provider options) in priority order
+    """
+    global _providers
+
+    with _providers_lock:
+        if _providers is not None and not refresh:
+            return _providers
+
+        fingerprint = host_fingerprint()
+        cache = _read_cache(PROVIDER_CACHE_PATH)
+        entry = cache.get(fingerprint)
+
+        if entry is None or refresh:
+            started = time.perf_counter()
+            probe = probe_hardware()
+            logger.info(f"Probed hardware in {(time.perf_counter() - started) * 1000:.0f} ms: {probe}")
+            entry = {"probe": probe, "probed_at": time.time()}
+            cache[fingerprint] = entry
+            _write_cache(PROVIDER_CACHE_PATH, cache)
+        else:
+            logger.info(f"Using cached hardware probe for host {fingerprint[:12]}")
+
+        # Provider options depend on current settings, so only the probe is cached
+        _providers = resolve_providers(entry["probe"], enable_npu=settings.ENABLE_NPU)
+        logger.info(f"Execution providers: {[name for name, _ in _providers]}")
+        return _providers
+
+
+def is_npu_available() -> bool:
+    """
+    Check if an accelerator provider will be used for inference.
+
+    Returns:
+        bool: True if a provider other than CPU is selected, False otherwise
+    """
+    return any(name != CPU_PROVIDER for name, _ in get_execution_providers())
@@ -0,0 +1,294 @@
+import dataclasses
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.model_plan import build_model_plan
+from app.services.npu_service import CPU_PROVIDER, get_execution_providers
+from app.services.preprocessing import preprocess
+from app.services.session_factory import ProviderList, _new_session, build_session_options
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger, logs_dir
+
+logger = get_logger(__name__)
+
+# Inferences recorded per profile (after one untraced warm-up run)
+ORT_PROFILE_RUNS = get_setting("ORT_PROFILE_RUNS", 50)
+# Raw traces, JSON breakdowns and text summaries are written here
+ORT_PROFILE_DIR = get_setting("ORT_PROFILE_DIR", str(logs_dir / "ort_profiles"))
+
+_KERNEL_SUFFIX = "_kernel_time"
+# Nodes listed individually in the report, slowest first
+_TOP_NODES = 25
+
+
+def _share(part: float, whole: float) -> float:
+    return part / whole * 100.0 if whole > 0 else 0.0
+
+
+def parse_trace(events: List[Dict[str, Any]], session_providers: List[str], skip_runs: int = 0) -> Dict[str, Any]:
+    """
+    Break an ONNX Runtime profiling trace down by operator, provider and node.
+
+    Args:
+        events: Parsed trace (the Chrome-trace JSON list written by end_profiling)
+        session_providers: Providers the session was created with, in priority order
+        skip_runs: Leading model runs to leave out (warm-up)
+
+    Returns:
+        Dict with per-run timings and by_operator / by_provider / top_nodes /
+        cpu_fallback breakdowns; times are in milliseconds per run
+    """
+    runs = sorted((e for e in events if e.get("cat") == "Session" and e.get("name") == "model_run"),
+                  key=lambda e: e["ts"])
+    counted = runs[skip_runs:]
+    if not counted:
+        raise ValueError("Trace contains no model runs to report on")
+    # Kernels that started before the first counted run belong to the warm-up
+    start_ts = counted[0]["ts"]
+
+    operators: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"calls": 0, "total_us": 0.0, "providers": set()})
+    providers: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"calls": 0, "total_us": 0.0, "nodes": set()})
+    nodes: Dict[str, Dict[str, Any]] = {}
+
+    for event in events:
+        if event.get("cat") != "Node" or not event["name"].endswith(_KERNEL_SUFFIX) or event["ts"] < start_ts:
+            continue
+        args = event.get("args", {})
+        node = event["name"][:-len(_KERNEL_SUFFIX)]
+        op = args.get("op_name", "unknown")
+        provider = args.get("provider", "unknown")
+        duration = float(event.get("dur", 0))
+
+        operators[op]["calls"] += 1
+        operators[op]["total_us"] += duration
+        operators[op]["providers"].add(provider)
+        providers[provider]["calls"] += 1
+        providers[provider]["total_us"] += duration
+        providers[provider]["nodes"].add(node)
+
+        entry = nodes.setdefault(node, {"op": op, "provider": provider, "calls": 0, "total_us": 0.0})
+        entry["calls"] += 1
+        entry["total_us"] += duration
+
+    num_runs = len(counted)
+    run_ms = np.array([e["dur"] for e in counted], dtype=np.float64) / 1000.0
+    kernel_us = sum(op["total_us"] for op in operators.values())
+
+    by_operator = {
+        op: {
+            "ms_per_run": stats["total_us"] / num_runs / 1000.0,
+            "share_pct": _share(stats["total_us"], kernel_us),
+            "calls_per_run": stats["calls"] / num_runs,
+            "providers": sorted(stats["providers"])
+        }
+        for op, stats in sorted(operators.items(), key=lambda item: -item[1]["total_us"])
+    }
+    by_provider = {
+        provider: {
+            "ms_per_run": stats["total_us"] / num_runs / 1000.0,
+            "share_pct": _share(stats["total_us"], kernel_us),
+            "nodes": len(stats["nodes"])
+        }
+        for provider, stats in sorted(providers.items(), key=lambda item: -item[1]["total_us"])
+    }
+    top_nodes = [
+        {
+            "node": node,
+            "op": stats["op"],
+            "provider": stats["provider"],
+            "ms_per_run": stats["total_us"] / num_runs / 1000.0,
+            "share_pct": _share(stats["total_us"], kernel_us)
+        }
+        for node, stats in sorted(nodes.items(), key=lambda item: -item[1]["total_us"])[:_TOP_NODES]
+    ]
+
+    # With an accelerator first in line, every node left on the CPU provider is a fallback
+    accelerated = [name for name in session_providers if name != CPU_PROVIDER]
+    fallback = None
+    if accelerated:
+        fallback_nodes = {node: stats for node, stats in nodes.items() if stats["provider"] == CPU_PROVIDER}
+        fallback_us = sum(stats["total_us"] for stats in fallback_nodes.values())
+        fallback_ops: Dict[str, int] = defaultdict(int)
+        for stats in fallback_nodes.values():
+            fallback_ops[stats["op"]] += 1
+        fallback = {
+            "nodes": len(fallback_nodes),
+            "total_nodes": len(nodes),
+            "ms_per_run": fallback_us / num_runs / 1000.0,
+            "share_pct": _share(fallback_us, kernel_us),
+            "ops": dict(sorted(fallback_ops.items(), key=lambda item: -item[1]))
+        }
+
+    return {
+        "runs": num_runs,
+        "run_ms": {
+            "mean": float(run_ms.mean()),
+            "p50": float(np.percentile(run_ms, 50)),
+            "p95": float(np.percentile(run_ms, 95))
+        },
+        "kernel_ms_per_run": kernel_us / num_runs / 1000.0,
+        # Run time not spent inside kernels: executor, allocation, copies between providers
+        "overhead_ms_per_run": max(0.0, float(run_ms.mean()) - kernel_us / num_runs / 1000.0),
+        "by_operator": by_operator,
+        "by_provider": by_provider,
+        "top_nodes": top_nodes,
+        "cpu_fallback": fallback
+    }
+
+
+def format_summary(report: Dict[str, Any]) -> str:
+    """Readable text version of a profile report"""
+    breakdown = report["breakdown"]
+    lines = [
+        f"Model:     {report['model']}",
+        f"Providers: {', '.join(report['providers'])}",
+        f"Input:     {report['input_shape']}",
+        f"Runs:      {breakdown['runs']} (model_run mean {breakdown['run_ms']['mean']:.2f} ms, "
+        f"p95 {breakdown['run_ms']['p95']:.2f} ms; kernels {breakdown['kernel_ms_per_run']:.2f} ms, "
+        f"overhead {breakdown['overhead_ms_per_run']:.2f} ms)",
+        "",
+        f"{'provider':<32}{'ms/run':>10}{'share':>9}{'nodes':>8}"
+    ]
+    for provider, stats in breakdown["by_provider"].items():
+        lines.append(f"{provider:<32}{stats['ms_per_run']:>10.3f}{stats['share_pct']:>8.1f}%{stats['nodes']:>8}")
+
+    fallback = breakdown["cpu_fallback"]
+    if fallback is not None:
+        lines.append("")
+        lines.append(
+            f"CPU fallback: {fallback['nodes']}/{fallback['total_nodes']} nodes, "
+            f"{fallback['ms_per_run']:.3f} ms/run ({fallback['share_pct']:.1f}%)"
+        )
+        if fallback["ops"]:
+            lines.append("  " + ", ".join(f"{op} x{count}" for op, count in fallback["ops"].items()))
+
+    lines += ["", f"{'operator':<28}{'ms/run':>10}{'share':>9}{'calls':>8}  providers"]
+    for op, stats in breakdown["by_operator"].items():
+        lines.append(
+            f"{op:<28}{stats['ms_per_run']:>10.3f}{stats['share_pct']:>8.1f}%{stats['calls_per_run']:>8.0f}"
+            f"  {', '.join(stats['providers'])}"
+        )
+
+    lines += ["", f"{'slowest nodes':<44}{'op':<18}{'ms/run':>10}{'share':>9}  provider"]
+    for node in breakdown["top_nodes"]:
+        lines.append(
+            f"{node['node'][:43]:<44}{node['op']:<18}{node['ms_per_run']:>10.3f}{node['share_pct']:>8.1f}%"
+            f"  {node['provider']}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def profile_model(
+    model_path: str,
+    runs: int = ORT_PROFILE_RUNS,
+    image_data: Optional[bytes] = None,
+    batch_size: int = 1,
+    input_size: Optional[Tuple[int, int]] = None,
+    providers: Optional[ProviderList] = None,
+    output_dir: str = ORT_PROFILE_DIR
+) -> Dict[str, Any]:
+    """
+    Run a model under ONNX Runtime session profiling and report where the time goes.
+
+    ORT can only trace sessions created with profiling enabled, so this builds a
+    separate session with the service's providers and session options; the
+    serving sessions are left alone.
+
+    Args:
+        model_path: ONNX model to profile
+        runs: Inferences to trace (after one untraced warm-up)
+        image_data: Encoded image to run on; defaults to a mid-grey frame
+        batch_size: Images per inference
+        input_size: (width, height) to run a model with dynamic spatial dimensions at
+        providers: Execution providers; defaults to the service's provider list
+        output_dir: Where the trace, JSON report and summary are written
+
+    Returns:
+        Report with the per-operator / per-provider breakdown and the paths of the written files
+    """
+    providers = providers or get_execution_providers()
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(model_path))[0]}_{stamp}")
+
+    options = build_session_options()
+    options.enable_profiling = True
+    options.profile_file_prefix = base
+    try:
+        session = _new_session(model_path, options, providers)
+    except Exception as e:
+        if [name for name, _ in providers] == [CPU_PROVIDER]:
+            raise
+        # Same fallback as the serving session
+        logger.warning(f"Accelerated profiling session failed ({e}), falling back to CPU")
+        session = _new_session(model_path, options, [(CPU_PROVIDER, {})])
+    plan = build_model_plan(session)
+    if input_size and plan.dynamic_spatial:
+        plan = dataclasses.replace(plan, input_size=tuple(input_size))
+
+    if image_data is not None:
+        processed = preprocess(image_data, plan.input_size, channels_first=plan.channels_first)
+        frame = np.array(processed.tensor)
+        processed.release()
+    else:
+        width, height = plan.input_size
+        shape = (1, 3, height, width) if plan.channels_first else (1, height, width, 3)
+        frame = np.full(shape, 114 / 255.0, dtype=np.float32)
+    batch = plan.prepare_input(np.ascontiguousarray(np.repeat(frame, batch_size, axis=0)))
+
+    started = time.perf_counter()
+    session.run(plan.output_names[:1], {plan.input_name: batch})  # warm-up, excluded below
+    for _ in range(runs):
+        session.run(plan.output_names[:1], {plan.input_name: batch})
+    elapsed = time.perf_counter() - started
+    trace_path = session.end_profiling()
+
+    with open(trace_path) as f:
+        events = json.load(f)
+
+    report = {
+        "model": model_path,
+        "providers": session.get_providers(),
+        "input_shape": list(batch.shape),
+        "timestamp": datetime.utcnow().isoformat(),
+        "wall_seconds": elapsed,
+        "trace": trace_path,
+        "breakdown": parse_trace(events, session.get_providers(), skip_runs=1)
+    }
+    report["report"] = f"{base}.json"
+    report["summary"] = f"{base}.txt"
+
+    with open(report["report"], "w") as f:
+        json.dump(report, f, indent=2)
+    with open(report["summary"], "w") as f:
+        f.write(format_summary(report))
+
+    logger.info(
+        f"ORT profile of {model_path}: {report['breakdown']['run_ms']['mean']:.2f} ms/run over {runs} runs "
+        f"-> {report['summary']}"
+    )
+    return report
+
+
+def profile_variant(variant: Optional[str] = None, runs: int = ORT_PROFILE_RUNS, image_data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Profile the model behind a loaded detection variant.
+
+    Args:
+        variant: Model variant (defaults to the snapshot variant)
+        runs: Inferences to trace
+        image_data: Encoded image to run on; defaults to a mid-grey frame
+
+    Returns:
+        The profile report (see profile_model)
+    """
+    from app.services import detection_service
+
+    model = detection_service.get_variant(variant)
+    return profile_model(model.model_path, runs=runs, image_data=image_data, input_size=model.plan.input_size)
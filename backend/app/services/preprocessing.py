@@ -0,0 +1,403 @@
+import threading
+import time
+import warnings
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+from app.utils.metrics import registry
+
+logger = get_logger(__name__)
+
+decode_stage_metric = registry.stage("decode")
+preprocess_stage_metric = registry.stage("preprocess")
+
+# Grey value YOLOv8 was trained with for letterbox padding
+PAD_VALUE = 114
+_INV_255 = np.float32(1.0 / 255.0)
+
+# Maximum number of idle buffers kept per tensor shape
+BUFFER_POOL_SIZE = get_setting("INPUT_BUFFER_POOL_SIZE", 16)
+
+# Upload limits - anything larger is rejected before it is decoded
+MAX_IMAGE_BYTES = get_setting("MAX_IMAGE_BYTES", 20 * 1024 * 1024)
+MAX_IMAGE_PIXELS = get_setting("MAX_IMAGE_PIXELS", 40_000_000)
+
+# libjpeg can decode directly at 1/2, 1/4 or 1/8 scale (DCT scaling)
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured byte-size or pixel-count limits"""
+    pass
+
+
+class InputBufferPool:
+    """
+    Pool of preallocated float32 model-input buffers of one shape.
+
+    Each in-flight frame borrows its own buffer (so frames queued for batching
+    never overwrite each other) and returns it once the model has consumed it.
+    In steady state the streaming path allocates no new input tensors.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype=np.float32, max_size: int = BUFFER_POOL_SIZE):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.max_size = max_size
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> np.ndarray:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return np.empty(self.shape, dtype=self.dtype)
+
+    def release(self, buffer: np.ndarray) -> None:
+        with self._lock:
+            if len(self._free) < self.max_size:
+                self._free.append(buffer)
+
+
+_pools: Dict[Tuple[Tuple[int, ...], str], InputBufferPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_buffer_pool(shape: Tuple[int, ...], dtype=np.float32) -> InputBufferPool:
+    """Get (or create) the shared buffer pool for a tensor shape"""
+    key = (tuple(shape), np.dtype(dtype).str)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, InputBufferPool(shape, dtype))
+    return pool
+
+
+@dataclass(frozen=True)
+class LetterboxInfo:
+    """Geometry needed to map model-space boxes back to original image pixels"""
+    scale: float
+    pad_x: int
+    pad_y: int
+    original_width: int
+    original_height: int
+
+    def restore_boxes(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        Map [K, 4] x_min/y_min/x_max/y_max boxes from the letterboxed model input
+        back to original image coordinates, clipped to the image bounds.
+        """
+        restored = np.empty_like(boxes)
+        # Strided views: columns 0/2 are x coordinates, 1/3 are y coordinates
+        xs, ys = restored[:, 0::2], restored[:, 1::2]
+        np.subtract(boxes[:, 0::2], self.pad_x, out=xs)
+        np.subtract(boxes[:, 1::2], self.pad_y, out=ys)
+        restored /= self.scale
+        np.clip(xs, 0, self.original_width, out=xs)
+        np.clip(ys, 0, self.original_height, out=ys)
+        return restored
+
+
+@dataclass
+class PreprocessedImage:
+    """
+    A frame ready for inference.
+
+    `tensor` is a view into a pooled buffer with a leading batch dimension of 1;
+    call `release()` once the model has run so the buffer can be reused.
+    """
+    tensor: np.ndarray
+    letterbox: LetterboxInfo
+    _pool: Optional[InputBufferPool] = field(default=None, repr=False)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.tensor.shape
+
+    def release(self) -> None:
+        if self._pool is not None:
+            self._pool.release(self.tensor)
+            self._pool = None
+
+
+def check_image_size(num_bytes: int) -> None:
+    """
+    Reject uploads above the byte-size limit before reading or decoding them.
+    
+    Args:
+        num_bytes: Size of the encoded image in bytes
+    """
+    if num_bytes > MAX_IMAGE_BYTES:
+        raise ImageTooLargeError(
+            f"Image is {num_bytes} bytes, larger than the {MAX_IMAGE_BYTES} byte limit"
+        )
+
+
+def read_image_header(image_data: bytes) -> Tuple[str, int, int]:
+    """
+    Read an image's format and dimensions from its header without decoding pixels.
+
+    Args:
+        image_data: Raw image bytes
+
+    Returns:
+        Tuple of (format, width, height), e.g. ("JPEG", 4032, 3024)
+    """
+    try:
+        with warnings.catch_warnings():
+            # Pixel limits are enforced by decode_image itself
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(BytesIO(image_data)) as header:
+                return header.format or "", header.width, header.height
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    except UnidentifiedImageError:
+        raise ValueError("Unsupported or corrupt image data")
+
+
+def check_image_limits(image_data: bytes) -> Tuple[str, int, int]:
+    """
+    Enforce the byte-size and pixel-count limits using only the image header.
+
+    Every decode of client-supplied bytes goes through this first, so a small
+    PNG or WebP that expands to a huge bitmap is rejected before it is decoded.
+
+    Args:
+        image_data: Raw image bytes
+
+    Returns:
+        Tuple of (format, width, height), as read_image_header
+    """
+    check_image_size(len(image_data))
+
+    image_format, width, height = read_image_header(image_data)
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} pixels, more than the {MAX_IMAGE_PIXELS} pixel limit"
+        )
+    return image_format, width, height
+
+
+def decode_grayscale(image_data: bytes, flags: int = cv2.IMREAD_GRAYSCALE) -> Optional[np.ndarray]:
+    """
+    Decode encoded image bytes to uint8 grayscale once the size limits pass.
+
+    The IMREAD_REDUCED_GRAYSCALE_* flags only shrink JPEGs while decoding; other
+    formats are fully decoded first, which is why the limits are checked here.
+
+    Args:
+        image_data: Raw image bytes
+        flags: OpenCV grayscale read flag, e.g. cv2.IMREAD_REDUCED_GRAYSCALE_4
+
+    Returns:
+        A uint8 grayscale array, or None if the image can't be decoded
+    """
+    try:
+        check_image_limits(image_data)
+    except ImageTooLargeError:
+        raise
+    except ValueError:
+        return None
+    return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flags)
+
+
+def reduced_decode_factor(width: int, height: int, target_size: Tuple[int, int]) -> int:
+    """
+    Pick the largest JPEG DCT scaling factor that still leaves at least as many
+    pixels as the letterboxed model input needs.
+
+    Args:
+        width: Encoded image width
+        height: Encoded image height
+        target_size: Model input size as (width, height)
+
+    Returns:
+        1, 2, 4 or 8
+    """
+    target_w, target_h = target_size
+    # Consider both orientations so EXIF rotation applied by the decoder can't
+    # leave the decoded image smaller than the model input
+    scale = max(
+        min(target_w / width, target_h / height),
+        min(target_w / height, target_h / width)
+    )
+    for factor, _ in _REDUCED_DECODE_FLAGS:
+        if factor * scale <= 1.0:
+            return factor
+    return 1
+
+
+def decode_image(
+    image_data: bytes,
+    target_size: Optional[Tuple[int, int]] = None
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode encoded image bytes (JPEG, PNG, WebP, ...) straight to uint8.
+
+    The byte-size and pixel-count limits are checked from the header before
+    any pixels are decoded. When a target size is given, JPEGs are decoded at
+    reduced scale by libjpeg, so a 12 MP phone photo headed for a 640x640 model
+    is never fully materialized.
+
+    Args:
+        image_data: Raw image bytes
+        target_size: Model input size as (width, height); None decodes at full resolution
+
+    Returns:
+        Tuple of (HxWx3 uint8 BGR array, original (width, height) as encoded)
+    """
+    image_format, width, height = check_image_limits(image_data)
+
+    flags = cv2.IMREAD_COLOR
+    if target_size is not None and image_format == "JPEG":
+        factor = reduced_decode_factor(width, height, target_size)
+        flags = dict(_REDUCED_DECODE_FLAGS).get(factor, cv2.IMREAD_COLOR)
+
+    encoded = np.frombuffer(image_data, dtype=np.uint8)
+    image = cv2.imdecode(encoded, flags)
+    if image is None:
+        raise ValueError("Unsupported or corrupt image data")
+    return image, (width, height)
+
+
+def letterbox_into(
+    image: np.ndarray,
+    out: np.ndarray,
+    channels_first: bool = True
+) -> LetterboxInfo:
+    """
+    Resize an image keeping its aspect ratio and write it, normalized to 0-1
+    float32 RGB, into a preallocated model-input buffer.
+
+    The only intermediate allocation is the uint8 resize output; normalization,
+    BGR->RGB and HWC->CHW happen in a single pass while writing into `out`.
+
+    Args:
+        image: HxWx3 uint8 BGR image
+        out: Destination buffer shaped [1, 3, H, W] (channels_first) or [1, H, W, 3]
+        channels_first: Layout of `out`
+
+    Returns:
+        LetterboxInfo describing the applied scale and padding
+    """
+    if channels_first:
+        target_h, target_w = out.shape[2], out.shape[3]
+    else:
+        target_h, target_w = out.shape[1], out.shape[2]
+
+    height, width = image.shape[:2]
+    scale = min(target_h / height, target_w / width)
+    new_w = max(1, int(round(width * scale)))
+    new_h = max(1, int(round(height * scale)))
+    pad_x = (target_w - new_w) // 2
+    pad_y = (target_h - new_h) // 2
+
+    if (new_w, new_h) != (width, height):
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        image = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+    pad = np.float32(PAD_VALUE / 255.0)
+    frame = out[0]
+    if channels_first:
+        # Only the border is padded; the image area is written exactly once
+        frame[:, :pad_y, :] = pad
+        frame[:, pad_y + new_h:, :] = pad
+        frame[:, pad_y:pad_y + new_h, :pad_x] = pad
+        frame[:, pad_y:pad_y + new_h, pad_x + new_w:] = pad
+        for channel in range(3):
+            np.multiply(
+                image[:, :, 2 - channel],  # BGR -> RGB
+                _INV_255,
+                out=frame[channel, pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+                dtype=np.float32
+            )
+    else:
+        frame[:pad_y] = pad
+        frame[pad_y + new_h:] = pad
+        frame[pad_y:pad_y + new_h, :pad_x] = pad
+        frame[pad_y:pad_y + new_h, pad_x + new_w:] = pad
+        np.multiply(
+            image[:, :, ::-1],
+            _INV_255,
+            out=frame[pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+            dtype=np.float32
+        )
+
+    return LetterboxInfo(
+        scale=scale,
+        pad_x=pad_x,
+        pad_y=pad_y,
+        original_width=width,
+        original_height=height
+    )
+
+
+def preprocess(
+    image_data: bytes,
+    target_size: Tuple[int, int],
+    channels_first: bool = True
+) -> PreprocessedImage:
+    """
+    Decode and letterbox an encoded image into a pooled input buffer.
+
+    Args:
+        image_data: Raw image bytes
+        target_size: Model input size as (width, height)
+        channels_first: True for NCHW models, False for NHWC
+
+    Returns:
+        PreprocessedImage holding the input tensor and letterbox geometry
+    """
+    width, height = target_size
+    shape = (1, 3, height, width) if channels_first else (1, height, width, 3)
+
+    started = time.perf_counter()
+    image, original_size = decode_image(image_data, target_size=target_size)
+    decoded = time.perf_counter()
+    decode_stage_metric.observe(decoded - started)
+
+    pool = get_buffer_pool(shape)
+    buffer = pool.acquire()
+    try:
+        letterbox = letterbox_into(image, buffer, channels_first=channels_first)
+    except Exception:
+        pool.release(buffer)
+        raise
+
+    letterbox = _relative_to_original(letterbox, original_size)
+    preprocess_stage_metric.observe(time.perf_counter() - decoded)
+
+    return PreprocessedImage(tensor=buffer, letterbox=letterbox, _pool=pool)
+
+
+def _relative_to_original(letterbox: LetterboxInfo, original_size: Tuple[int, int]) -> LetterboxInfo:
+    """
+    Re-express letterbox geometry against the encoded image size when the
+    decoder returned a reduced-resolution image.
+    """
+    original_width, original_height = original_size
+    # The decoder may have applied EXIF rotation, swapping width and height
+    if (letterbox.original_width > letterbox.original_height) != (original_width > original_height):
+        original_width, original_height = original_height, original_width
+
+    if original_width == letterbox.original_width:
+        return letterbox
+
+    return LetterboxInfo(
+        scale=letterbox.scale * letterbox.original_width / original_width,
+        pad_x=letterbox.pad_x,
+        pad_y=letterbox.pad_y,
+        original_width=original_width,
+        original_height=original_height
+    )
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import onnxruntime
+
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Session tunables (0 threads = let ONNX Runtime decide)
+GRAPH_OPTIMIZATION_LEVEL = get_setting("ORT_GRAPH_OPTIMIZATION_LEVEL", "all")
+INTRA_OP_THREADS = get_setting("ORT_INTRA_OP_THREADS", 0)
+INTER_OP_THREADS = get_setting("ORT_INTER_OP_THREADS", 0)
+EXECUTION_MODE = get_setting("ORT_EXECUTION_MODE", "sequential")
+
+ENABLE_OPTIMIZED_MODEL_CACHE = get_setting("ENABLE_OPTIMIZED_MODEL_CACHE", True)
+OPTIMIZED_MODEL_CACHE_DIR = get_setting(
+    "OPTIMIZED_MODEL_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ecovision", "optimized_models")
+)
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+# Providers that compile subgraphs into opaque nodes (VitisAI, OpenVINO) cannot
+# be serialized back to ONNX; they keep their own compilation caches instead
+_CACHEABLE_PROVIDERS = {"CPUExecutionProvider"}
+
+ProviderList = List[Tuple[str, Dict[str, Any]]]
+
+
+def build_session_options(graph_optimization_level: Optional[str] = None) -> onnxruntime.SessionOptions:
+    """
+    Build SessionOptions from the ORT_* settings.
+
+    Args:
+        graph_optimization_level: Override for ORT_GRAPH_OPTIMIZATION_LEVEL
+            ("disable", "basic", "extended" or "all")
+
+    Returns:
+        Configured onnxruntime.SessionOptions
+    """
+    level = (graph_optimization_level or GRAPH_OPTIMIZATION_LEVEL).lower()
+    if level not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level {level!r}; expected one of {list(_GRAPH_OPTIMIZATION_LEVELS)}")
+
+    mode = EXECUTION_MODE.lower()
+    if mode not in _EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode {mode!r}; expected one of {list(_EXECUTION_MODES)}")
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[level]
+    options.execution_mode = _EXECUTION_MODES[mode]
+    options.intra_op_num_threads = int(INTRA_OP_THREADS)
+    options.inter_op_num_threads = int(INTER_OP_THREADS)
+    return options
+
+
+def model_digest(model_path: str) -> str:
+    """SHA-256 of the model file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimized_model_path(model_path: str, provider_names: List[str]) -> str:
+    """
+    Location of the pre-optimized artifact for a model.
+
+    The name encodes the model hash, onnxruntime version, providers,
+    optimization level and host hardware (fully optimized CPU graphs contain
+    instruction-set specific layouts), so any change produces a fresh artifact
+    instead of loading a stale one.
+    """
+    from app.services.npu_service import host_fingerprint
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    providers = "+".join(name.replace("ExecutionProvider", "").lower() for name in provider_names)
+    filename = (
+        f"{stem}-{model_digest(model_path)[:16]}-ort{onnxruntime.__version__}"
+        f"-{providers}-{GRAPH_OPTIMIZATION_LEVEL.lower()}-{host_fingerprint()[:8]}.onnx"
+    )
+    return os.path.join(OPTIMIZED_MODEL_CACHE_DIR, filename)
+
+
+def _new_session(model_path: str, options: onnxruntime.SessionOptions, providers: ProviderList):
+    return onnxruntime.InferenceSession(
+        model_path,
+        sess_options=options,
+        providers=[name for name, _ in providers],
+        provider_options=[provider_options for _, provider_options in providers]
+    )
+
+
+def create_session(model_path: str, providers: ProviderList):
+    """
+    Create an InferenceSession, reusing a serialized optimized graph when possible.
+
+    The first start on a host runs graph optimization and saves the result;
+    later starts load that artifact with optimization disabled.
+
+    Args:
+        model_path: Path to the ONNX model
+        providers: Ordered (provider name, options) list
+
+    Returns:
+        onnxruntime.InferenceSession
+    """
+    provider_names = [name for name, _ in providers]
+    started = time.perf_counter()
+
+    if not ENABLE_OPTIMIZED_MODEL_CACHE or not set(provider_names) <= _CACHEABLE_PROVIDERS:
+        session = _new_session(model_path, build_session_options(), providers)
+        logger.info(f"Session created in {(time.perf_counter() - started) * 1000:.0f} ms (optimized model cache not used)")
+        return session
+
+    cached_path = optimized_model_path(model_path, provider_names)
+
+    if os.path.exists(cached_path):
+        try:
+            # Already optimized offline; running the optimizers again would only cost time
+            session = _new_session(cached_path, build_session_options("disable"), providers)
+            logger.info(
+                f"Session created in {(time.perf_counter() - started) * 1000:.0f} ms "
+                f"from optimized model {cached_path}"
+            )
+            return session
+        except Exception as e:
+            logger.warning(f"Discarding unusable optimized model {cached_path}: {e}")
+            try:
+                os.remove(cached_path)
+            except OSError:
+                pass
+
+    options = build_session_options()
+    # Workers may start together; each writes its own file and the rename is atomic
+    tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(OPTIMIZED_MODEL_CACHE_DIR, exist_ok=True)
+        options.optimized_model_filepath = tmp_path
+    except OSError as e:
+        logger.warning(f"Optimized model cache unavailable: {e}")
+
+    try:
+        session = _new_session(model_path, options, providers)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, cached_path)
+            logger.info(f"Session created in {elapsed_ms:.0f} ms; saved optimized model to {cached_path}")
+        else:
+            logger.info(f"Session created in {elapsed_ms:.0f} ms")
+        return session
+    finally:
+        # Only left behind if session creation or the rename failed
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
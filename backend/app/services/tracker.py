@@ -0,0 +1,268 @@
+import itertools
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.models import BoundingBox, Detection
+from app.services.preprocessing import decode_grayscale
+from app.utils.enviroment import get_setting
+from app.utils.metrics import registry
+
+STREAM_TRACKING_ENABLED = get_setting("STREAM_TRACKING_ENABLED", False)
+# Run the full detector at least every N frames while tracking
+TRACKER_DETECT_EVERY = get_setting("TRACKER_DETECT_EVERY", 5)
+# Re-detect as soon as any track's tracking confidence drops below this
+TRACKER_MIN_CONFIDENCE = get_setting("TRACKER_MIN_CONFIDENCE", 0.4)
+TRACKER_IOU_THRESHOLD = get_setting("TRACKER_IOU_THRESHOLD", 0.3)
+# Detector passes a track may go unmatched before it is dropped
+TRACKER_MAX_MISSES = get_setting("TRACKER_MAX_MISSES", 2)
+
+# Frames are tracked at half resolution (libjpeg scales while decoding)
+TRACKING_SCALE = 2
+_MIN_FLOW_POINTS = 4
+
+detector_frames_metric = registry.counter(
+    "tracker_detector_frames_total", "Tracked-stream frames that ran the full detector"
+)
+tracked_frames_metric = registry.counter(
+    "tracker_propagated_frames_total", "Tracked-stream frames answered by box propagation"
+)
+
+_track_ids = itertools.count(1)
+
+
+def tracking_frame(image_data: bytes) -> Optional[np.ndarray]:
+    """
+    Decode a frame to half-resolution grayscale for optical flow.
+
+    Args:
+        image_data: Raw image bytes
+
+    Returns:
+        A uint8 grayscale array, or None if the image can't be decoded
+    """
+    return decode_grayscale(image_data, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+
+
+def box_iou(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _box_of(detection: Detection) -> Tuple[float, float, float, float]:
+    box = detection.bounding_box
+    return (box.x_min, box.y_min, box.x_max, box.y_max)
+
+
+class Track:
+    """
+    One tracked object: a constant-velocity Kalman filter over the box centre
+    and size, plus the detector's last label and score for it.
+    """
+
+    def __init__(self, detection: Detection):
+        self.track_id = next(_track_ids)
+        self.detection = detection
+        self.confidence = 1.0  # tracking confidence, reset on every detector match
+        self.misses = 0
+
+        # State: cx, cy, w, h and their per-frame velocities; measurement: cx, cy, w, h
+        self.kalman = cv2.KalmanFilter(8, 4)
+        self.kalman.transitionMatrix = np.eye(8, dtype=np.float32)
+        for i in range(4):
+            self.kalman.transitionMatrix[i, i + 4] = 1.0
+        self.kalman.measurementMatrix = np.eye(4, 8, dtype=np.float32)
+        self.kalman.processNoiseCov = np.diag([1, 1, 1, 1, 0.1, 0.1, 0.01, 0.01]).astype(np.float32)
+        self.kalman.measurementNoiseCov = np.diag([4, 4, 16, 16]).astype(np.float32)
+        self.kalman.errorCovPost = np.diag([10, 10, 10, 10, 100, 100, 100, 100]).astype(np.float32)
+        self.kalman.statePost = np.zeros((8, 1), dtype=np.float32)
+        self.kalman.statePost[:4, 0] = self._measurement(_box_of(detection))[:, 0]
+
+    @staticmethod
+    def _measurement(box: Tuple[float, float, float, float]) -> np.ndarray:
+        x_min, y_min, x_max, y_max = box
+        return np.array(
+            [[(x_min + x_max) / 2], [(y_min + y_max) / 2], [x_max - x_min], [y_max - y_min]],
+            dtype=np.float32
+        )
+
+    @property
+    def box(self) -> Tuple[float, float, float, float]:
+        cx, cy, w, h = self.kalman.statePost[:4, 0].tolist()
+        return (cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2)
+
+    def predict(self) -> None:
+        self.kalman.predict()
+        # With no correction, the prediction becomes the current estimate
+        self.kalman.statePost = self.kalman.statePre.copy()
+        self.kalman.errorCovPost = self.kalman.errorCovPre.copy()
+
+    def correct(self, box: Tuple[float, float, float, float]) -> None:
+        self.kalman.correct(self._measurement(box))
+
+    def to_detection(self) -> Detection:
+        x_min, y_min, x_max, y_max = self.box
+        return Detection(
+            category=self.detection.category,
+            confidence=self.detection.confidence,
+            bounding_box=BoundingBox(x_min=x_min, y_min=y_min, x_max=x_max, y_max=y_max)
+        )
+
+
+class StreamTracker:
+    """
+    Detect-then-track state for one stream.
+
+    The full detector runs every `detect_every` frames, whenever nothing is being
+    tracked, and whenever a track's confidence falls below `min_confidence`.
+    In between, each box is moved by the median Lucas-Kanade optical flow of the
+    feature points inside it, smoothed by its Kalman filter. Detections are
+    matched to existing tracks by IoU, so objects keep their track IDs.
+    """
+
+    def __init__(
+        self,
+        detect_every: int = TRACKER_DETECT_EVERY,
+        min_confidence: float = TRACKER_MIN_CONFIDENCE,
+        iou_threshold: float = TRACKER_IOU_THRESHOLD,
+        max_misses: int = TRACKER_MAX_MISSES
+    ):
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = float(min_confidence)
+        self.iou_threshold = float(iou_threshold)
+        self.max_misses = int(max_misses)
+
+        self.tracks: List[Track] = []
+        self._previous_frame: Optional[np.ndarray] = None
+        self._frames_since_detection = 0
+
+    def needs_detection(self) -> bool:
+        """Whether the next frame should go through the full detector"""
+        visible = self.visible_tracks()
+        return (
+            not visible
+            or self._previous_frame is None
+            or self._frames_since_detection + 1 >= self.detect_every
+            or min(track.confidence for track in visible) < self.min_confidence
+        )
+
+    def update(self, frame: Optional[np.ndarray], detections: List[Detection]) -> List[Track]:
+        """
+        Match a detector pass to the existing tracks.
+
+        Args:
+            frame: Output of tracking_frame for the detected frame
+            detections: Detector output for the same frame
+
+        Returns:
+            The current tracks
+        """
+        detector_frames_metric.inc()
+        for track in self.tracks:
+            track.predict()
+
+        # Greedy IoU association, best pairs first
+        candidates = []
+        for t, track in enumerate(self.tracks):
+            for d, detection in enumerate(detections):
+                if detection.bounding_box is None or detection.category != track.detection.category:
+                    continue
+                iou = box_iou(track.box, _box_of(detection))
+                if iou >= self.iou_threshold:
+                    candidates.append((iou, t, d))
+
+        matched_tracks, matched_detections = set(), set()
+        for _, t, d in sorted(candidates, reverse=True):
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.tracks[t]
+            track.correct(_box_of(detections[d]))
+            track.detection = detections[d]
+            track.confidence = 1.0
+            track.misses = 0
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                # Kept for re-association on the next detector passes, but not reported
+                track.misses += 1
+            if track.misses <= self.max_misses:
+                survivors.append(track)
+
+        for d, detection in enumerate(detections):
+            if d not in matched_detections and detection.bounding_box is not None:
+                survivors.append(Track(detection))
+
+        self.tracks = survivors
+        self._previous_frame = frame
+        self._frames_since_detection = 0
+        return self.visible_tracks()
+
+    def propagate(self, frame: Optional[np.ndarray]) -> List[Track]:
+        """
+        Move the tracks to a new frame without running the detector.
+
+        Args:
+            frame: Output of tracking_frame for the new frame
+
+        Returns:
+            The current tracks
+        """
+        tracked_frames_metric.inc()
+        self._frames_since_detection += 1
+        previous, self._previous_frame = self._previous_frame, frame
+
+        for track in self.tracks:
+            # Flow is measured from where the box was on the previous frame
+            x_min, y_min, x_max, y_max = track.box
+            shift = None
+            if previous is not None and frame is not None and previous.shape == frame.shape:
+                shift, quality = self._flow(previous, frame, track.box)
+                track.confidence *= quality
+            else:
+                track.confidence = 0.0
+
+            track.predict()
+            if shift is not None:
+                dx, dy = shift
+                track.correct((x_min + dx, y_min + dy, x_max + dx, y_max + dy))
+
+        return self.visible_tracks()
+
+    def visible_tracks(self) -> List[Track]:
+        """Tracks confirmed by the most recent detector pass or still being followed"""
+        return [track for track in self.tracks if track.misses == 0]
+
+    @staticmethod
+    def _flow(
+        previous: np.ndarray,
+        frame: np.ndarray,
+        box: Tuple[float, float, float, float]
+    ) -> Tuple[Optional[Tuple[float, float]], float]:
+        """Median optical-flow displacement of the points in a box, in full-resolution pixels"""
+        height, width = previous.shape[:2]
+        x_min, y_min, x_max, y_max = (int(round(v / TRACKING_SCALE)) for v in box)
+        x_min, x_max = max(0, x_min), min(width, x_max)
+        y_min, y_max = max(0, y_min), min(height, y_max)
+        if x_max - x_min < 4 or y_max - y_min < 4:
+            return None, 0.0
+
+        mask = np.zeros_like(previous)
+        mask[y_min:y_max, x_min:x_max] = 255
+        points = cv2.goodFeaturesToTrack(previous, maxCorners=24, qualityLevel=0.01, minDistance=4, mask=mask)
+        if points is None or len(points) < _MIN_FLOW_POINTS:
+            return None, 0.5
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, frame, points, None, winSize=(15, 15), maxLevel=2)
+        good = status.reshape(-1) == 1
+        if good.sum() < _MIN_FLOW_POINTS:
+            return None, 0.5
+
+        displacement = np.median((moved - points).reshape(-1, 2)[good], axis=0) * TRACKING_SCALE
+        return (float(displacement[0]), float(displacement[1])), float(good.mean())
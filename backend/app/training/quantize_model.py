@@ -0,0 +1,325 @@
+# Static INT8 quantization of the exported YOLOv8 ONNX model
+import os
+import re
+import sys
+import json
+import glob
+import time
+import random
+import hashlib
+import argparse
+from datetime import datetime
+
+import cv2
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+DEFAULT_MODEL = 'backend/data/models/yolov8m_recycling.onnx'
+DEFAULT_CALIBRATION_DIR = 'backend/data/custom_dataset/images/val'
+DEFAULT_DATASET_CONFIG = 'backend/data/custom_dataset/dataset.yaml'
+DEFAULT_OUTPUT_DIR = 'backend/data/models'
+DEFAULT_REPORT = 'backend/training/quantization_report.json'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+PAD_VALUE = 114  # Same letterbox grey as training and the serving preprocessor
+
+CALIBRATION_METHODS = {
+    'minmax': CalibrationMethod.MinMax,
+    'entropy': CalibrationMethod.Entropy,
+    'percentile': CalibrationMethod.Percentile,
+}
+
+def file_sha256(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def model_input_spec(model_path, default_size=640):
+    """Return (input name, (width, height)) for an ONNX model"""
+    session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    _, _, height, width = model_input.shape
+    height = height if isinstance(height, int) else default_size
+    width = width if isinstance(width, int) else default_size
+    return model_input.name, (width, height)
+
+def letterbox(image, size):
+    """Resize keeping aspect ratio, pad to size and return a 1x3xHxW float32 RGB tensor"""
+    width, height = size
+    h, w = image.shape[:2]
+    scale = min(width / w, height / h)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+    canvas = np.full((height, width, 3), PAD_VALUE, dtype=np.uint8)
+    top, left = (height - new_h) // 2, (width - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor[np.newaxis]
+
+def collect_images(image_dir, limit=None, seed=0):
+    """List images in a directory, optionally a reproducible random subset"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, '*'))
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if limit and len(paths) > limit:
+        paths = sorted(random.Random(seed).sample(paths, limit))
+    return paths
+
+class ValidationCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed validation images to the ONNX Runtime calibrator"""
+
+    def __init__(self, image_paths, input_name, input_size):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.input_size = input_size
+        self._iterator = iter(self.image_paths)
+
+    def get_next(self):
+        for path in self._iterator:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"Skipping unreadable calibration image: {path}")
+                continue
+            return {self.input_name: letterbox(image, self.input_size)}
+        return None
+
+    def rewind(self):
+        self._iterator = iter(self.image_paths)
+
+def quantize_model(
+    model_path=DEFAULT_MODEL,
+    calibration_dir=DEFAULT_CALIBRATION_DIR,
+    output_dir=DEFAULT_OUTPUT_DIR,
+    num_calibration_images=200,
+    calibration_method='minmax',
+    per_channel=True,
+    exclude_pattern=None,
+    seed=0
+):
+    """
+    Run static QDQ INT8 quantization and write a versioned artifact.
+
+    Args:
+        model_path: Exported FP32 ONNX model
+        calibration_dir: Directory of calibration images (the validation split)
+        output_dir: Where the INT8 model and its manifest are written
+        num_calibration_images: Size of the calibration subset
+        calibration_method: 'minmax', 'entropy' or 'percentile'
+        per_channel: Quantize weights per output channel
+        exclude_pattern: Regex of node names to keep in FP32 (e.g. the box-decode tail)
+        seed: Seed for choosing the calibration subset
+
+    Returns:
+        Path to the INT8 model, or None on failure
+    """
+    if not os.path.exists(model_path):
+        print(f"Error: FP32 model not found at {model_path}")
+        return None
+
+    image_paths = collect_images(calibration_dir, num_calibration_images, seed)
+    if not image_paths:
+        print(f"Error: No calibration images found in {calibration_dir}")
+        return None
+
+    input_name, input_size = model_input_spec(model_path)
+    print(f"Calibrating with {len(image_paths)} images from {calibration_dir} at {input_size[0]}x{input_size[1]}")
+
+    source_hash = file_sha256(model_path)
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{source_hash[:8]}"
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    output_base = os.path.join(output_dir, f"{stem}.int8.{version}")
+    output_path = f"{output_base}.onnx"
+
+    # Shape inference and graph cleanup before quantization, as recommended by ONNX Runtime
+    prepared_path = f"{output_base}.prep.onnx"
+    try:
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=False)
+    except ImportError as e:
+        # Symbolic shape inference needs sympy; plain ONNX shape inference is enough for static shapes
+        print(f"Symbolic shape inference unavailable ({e}), using ONNX shape inference only")
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+
+    nodes_to_exclude = []
+    if exclude_pattern:
+        import onnx
+        pattern = re.compile(exclude_pattern)
+        nodes_to_exclude = [node.name for node in onnx.load(prepared_path).graph.node if pattern.search(node.name)]
+        print(f"Keeping {len(nodes_to_exclude)} nodes matching {exclude_pattern!r} in FP32")
+
+    started = time.time()
+    try:
+        quantize_static(
+            prepared_path,
+            output_path,
+            ValidationCalibrationReader(image_paths, input_name, input_size),
+            quant_format=QuantFormat.QDQ,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CALIBRATION_METHODS[calibration_method],
+            nodes_to_exclude=nodes_to_exclude
+        )
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+
+    manifest = {
+        "version": version,
+        "source_model": model_path,
+        "source_sha256": source_hash,
+        "int8_model": output_path,
+        "int8_sha256": file_sha256(output_path),
+        "format": "QDQ",
+        "activations": "uint8",
+        "weights": "int8",
+        "per_channel": per_channel,
+        "calibration_method": calibration_method,
+        "calibration_dir": calibration_dir,
+        "calibration_images": len(image_paths),
+        "calibration_seed": seed,
+        "nodes_excluded": len(nodes_to_exclude),
+        "onnxruntime": onnxruntime.__version__,
+        "created": datetime.now().isoformat(),
+        "quantization_seconds": round(time.time() - started, 1)
+    }
+    with open(f"{output_base}.json", 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"INT8 model saved to: {output_path}")
+    return output_path
+
+def measure_latency(model_path, image_paths, runs=50, batch_size=8):
+    """CPU latency (batch 1) and throughput (batched if the model allows it)"""
+    session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    input_name, input_size = model_input_spec(model_path)
+
+    frames = []
+    for path in image_paths:
+        if len(frames) >= max(batch_size, 1):
+            break
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping unreadable benchmark image: {path}")
+            continue
+        frames.append(letterbox(image, input_size))
+    if not frames:
+        frames = [np.random.default_rng(0).random((1, 3, input_size[1], input_size[0]), dtype=np.float32)]
+
+    for frame in frames[:3]:  # warm up
+        session.run(None, {input_name: frame})
+
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        session.run(None, {input_name: frames[i % len(frames)]})
+        latencies.append(time.perf_counter() - started)
+
+    # Throughput with stacked frames when the batch dimension is dynamic
+    dynamic_batch = not isinstance(model_input.shape[0], int)
+    batch = np.concatenate((frames * batch_size)[:batch_size], axis=0) if dynamic_batch else frames[0]
+    iterations = max(1, runs // batch.shape[0])
+    started = time.perf_counter()
+    for _ in range(iterations):
+        session.run(None, {input_name: batch})
+    throughput = iterations * batch.shape[0] / (time.perf_counter() - started)
+
+    return {
+        "latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "latency_ms_p95": float(np.percentile(latencies, 95) * 1000),
+        "throughput_fps": float(throughput),
+        "throughput_batch_size": int(batch.shape[0]),
+        "model_size_mb": os.path.getsize(model_path) / (1024 * 1024)
+    }
+
+def measure_map(model_path, dataset_config):
+    """mAP on the validation split via Ultralytics (None if unavailable)"""
+    if not os.path.exists(dataset_config):
+        print(f"Dataset configuration not found at {dataset_config}, skipping mAP")
+        return None
+    try:
+        from ultralytics import YOLO
+        metrics = YOLO(model_path, task='detect').val(data=dataset_config, device='cpu', verbose=False).box
+        return {"map50": float(metrics.map50), "map50_95": float(metrics.map)}
+    except Exception as e:
+        print(f"mAP evaluation failed for {model_path}: {e}")
+        return None
+
+def compare_models(fp32_path, int8_path, image_dir=DEFAULT_CALIBRATION_DIR,
+                   dataset_config=DEFAULT_DATASET_CONFIG, report_path=DEFAULT_REPORT, runs=50):
+    """Side-by-side FP32 vs INT8 report of CPU latency, throughput and mAP"""
+    image_paths = collect_images(image_dir, limit=16)
+
+    report = {"fp32": {"model": fp32_path}, "int8": {"model": int8_path}}
+    for key, path in (("fp32", fp32_path), ("int8", int8_path)):
+        print(f"Benchmarking {key.upper()} model: {path}")
+        report[key].update(measure_latency(path, image_paths, runs=runs))
+        report[key]["map"] = measure_map(path, dataset_config)
+
+    fp32, int8 = report["fp32"], report["int8"]
+    report["speedup"] = {
+        "latency": fp32["latency_ms_p50"] / int8["latency_ms_p50"],
+        "throughput": int8["throughput_fps"] / fp32["throughput_fps"]
+    }
+
+    print("\n=== FP32 vs INT8 (CPU) ===")
+    print(f"{'':<22}{'FP32':>12}{'INT8':>12}")
+    print(f"{'Latency p50 (ms)':<22}{fp32['latency_ms_p50']:>12.2f}{int8['latency_ms_p50']:>12.2f}")
+    print(f"{'Latency p95 (ms)':<22}{fp32['latency_ms_p95']:>12.2f}{int8['latency_ms_p95']:>12.2f}")
+    print(f"{'Throughput (img/s)':<22}{fp32['throughput_fps']:>12.1f}{int8['throughput_fps']:>12.1f}")
+    print(f"{'Size (MB)':<22}{fp32['model_size_mb']:>12.1f}{int8['model_size_mb']:>12.1f}")
+    if fp32["map"] and int8["map"]:
+        print(f"{'mAP50':<22}{fp32['map']['map50']:>12.4f}{int8['map']['map50']:>12.4f}")
+        print(f"{'mAP50-95':<22}{fp32['map']['map50_95']:>12.4f}{int8['map']['map50_95']:>12.4f}")
+    print(f"Speedup: {report['speedup']['latency']:.2f}x latency, {report['speedup']['throughput']:.2f}x throughput")
+
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {report_path}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Static INT8 quantization of the YOLOv8 recycling model')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, help='FP32 ONNX model')
+    parser.add_argument('--calibration-dir', type=str, default=DEFAULT_CALIBRATION_DIR, help='Calibration images')
+    parser.add_argument('--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Output directory')
+    parser.add_argument('--num-images', type=int, default=200, help='Calibration images to use')
+    parser.add_argument('--method', choices=list(CALIBRATION_METHODS), default='minmax', help='Calibration method')
+    parser.add_argument('--per-tensor', action='store_true', help='Per-tensor instead of per-channel weights')
+    parser.add_argument('--exclude', type=str, default=None, help='Regex of node names to keep in FP32')
+    parser.add_argument('--dataset', type=str, default=DEFAULT_DATASET_CONFIG, help='Dataset YAML for mAP')
+    parser.add_argument('--report', type=str, default=DEFAULT_REPORT, help='Where to write the comparison report')
+    parser.add_argument('--skip-report', action='store_true', help='Only quantize')
+
+    args = parser.parse_args()
+
+    int8_path = quantize_model(
+        model_path=args.model,
+        calibration_dir=args.calibration_dir,
+        output_dir=args.output_dir,
+        num_calibration_images=args.num_images,
+        calibration_method=args.method,
+        per_channel=not args.per_tensor,
+        exclude_pattern=args.exclude
+    )
+    if int8_path is None:
+        sys.exit(1)
+
+    if not args.skip_report:
+        compare_models(args.model, int8_path, args.calibration_dir, args.dataset, args.report)
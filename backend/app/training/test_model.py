@@ -152,6 +152,118 @@ def save_as_baseline():
     else:
         print("No metrics file found. Run test_trained_model first.")
 
+def _max_confidence(model, image, imgsz):
+    """Run an Ultralytics model on one image; return (best confidence, latency in seconds)"""
+    start_time = time.perf_counter()
+    results = model(image, imgsz=imgsz, verbose=False)
+    latency = time.perf_counter() - start_time
+    confidences = results[0].boxes.conf
+    return (float(confidences.max()) if len(confidences) else 0.0), latency
+
+def evaluate_cascade(gate_model_path='backend/data/models/yolov8n_recycling_320.onnx',
+                     main_model_path='backend/data/models/yolov8m_recycling.onnx',
+                     image_dir='backend/data/custom_dataset/images/val',
+                     thresholds=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3),
+                     conf_threshold=0.5, gate_imgsz=320, main_imgsz=640, limit=None):
+    """
+    Evaluate the cascade gate (see CASCADE_THRESHOLDS in detection_service) on the
+    validation images.
+    
+    For each gate threshold, reports the share of frames the gate settles without the
+    main model, the main-model detections the gate would have discarded, the recall on
+    labelled images compared with the main model alone, and the expected throughput gain
+    from the measured per-image latencies of both models.
+    """
+    try:
+        gate_model = YOLO(gate_model_path, task='detect')
+        main_model = YOLO(main_model_path, task='detect')
+    except Exception as e:
+        print(f"Error loading models: {e}")
+        return
+    
+    image_paths = sorted(p for p in Path(image_dir).glob('*') if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp'))
+    if limit:
+        image_paths = image_paths[:limit]
+    if not image_paths:
+        print(f"No images found in {image_dir}")
+        return
+    
+    # Ground truth: an image is positive if its YOLO label file has any boxes
+    label_dir = Path(str(Path(image_dir)).replace('images', 'labels'))
+    
+    records = []
+    gate_time = main_time = 0.0
+    for path in image_paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"Skipping unreadable image: {path}")
+            continue
+        gate_conf, gate_latency = _max_confidence(gate_model, image, gate_imgsz)
+        main_conf, main_latency = _max_confidence(main_model, image, main_imgsz)
+        gate_time += gate_latency
+        main_time += main_latency
+        
+        label_path = label_dir / f"{path.stem}.txt"
+        has_object = label_path.exists() and label_path.read_text().strip() != ''
+        records.append((gate_conf, main_conf >= conf_threshold, has_object))
+    
+    if not records:
+        print("No readable images to evaluate")
+        return
+    
+    total = len(records)
+    gate_ms = gate_time / total * 1000
+    main_ms = main_time / total * 1000
+    main_found = sum(1 for _, found, _ in records if found)
+    labelled = [(gate_conf, found) for gate_conf, found, has_object in records if has_object]
+    main_recall = sum(1 for _, found in labelled if found) / len(labelled) if labelled else None
+    
+    print(f"\n=== Cascade Evaluation ({total} images) ===")
+    print(f"Gate: {gate_model_path} ({gate_ms:.1f} ms/img)")
+    print(f"Main: {main_model_path} ({main_ms:.1f} ms/img)")
+    if main_recall is not None:
+        print(f"Main-only image recall at conf {conf_threshold}: {main_recall:.4f}")
+    print(f"\n{'Threshold':>10}{'Gate hit':>10}{'Escalated':>11}{'Lost dets':>11}{'Recall':>9}{'Speedup':>9}")
+    
+    results = []
+    for threshold in thresholds:
+        escalated = [gate_conf >= threshold for gate_conf, _, _ in records]
+        escalation_rate = sum(escalated) / total
+        lost = sum(1 for passed, (_, found, _) in zip(escalated, records) if found and not passed)
+        recall = None
+        if labelled:
+            recall = sum(1 for gate_conf, found in labelled if found and gate_conf >= threshold) / len(labelled)
+        # Every frame pays for the gate; only escalated frames pay for the main model
+        speedup = main_ms / (gate_ms + escalation_rate * main_ms)
+        
+        results.append({
+            "threshold": threshold,
+            "gate_hit_rate": 1 - escalation_rate,
+            "escalation_rate": escalation_rate,
+            "lost_detections": lost,
+            "lost_detection_rate": lost / main_found if main_found else 0.0,
+            "recall": recall,
+            "expected_speedup": speedup
+        })
+        recall_text = f"{recall:.4f}" if recall is not None else "n/a"
+        print(f"{threshold:>10.2f}{1 - escalation_rate:>10.1%}{escalation_rate:>11.1%}{lost:>11d}{recall_text:>9}{speedup:>8.2f}x")
+    
+    report = {
+        "gate_model": gate_model_path,
+        "main_model": main_model_path,
+        "images": total,
+        "conf_threshold": conf_threshold,
+        "gate_latency_ms": gate_ms,
+        "main_latency_ms": main_ms,
+        "main_recall": main_recall,
+        "thresholds": results
+    }
+    with open('backend/training/cascade_metrics.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print("\nCascade metrics saved to backend/training/cascade_metrics.json")
+    return report
+
 if __name__ == "__main__":
     import argparse
     
@@ -160,6 +272,11 @@ if __name__ == "__main__":
     parser.add_argument('--webcam', action='store_true', help='Test with webcam')
     parser.add_argument('--compare', action='store_true', help='Compare with baseline')
     parser.add_argument('--set-baseline', action='store_true', help='Set current metrics as baseline')
+    parser.add_argument('--cascade', action='store_true', help='Evaluate the cascade gate model against the main model')
+    parser.add_argument('--gate-model', type=str, default='backend/data/models/yolov8n_recycling_320.onnx',
+                        help='Gate model for --cascade')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.05, 0.1, 0.15, 0.2, 0.25, 0.3],
+                        help='Gate thresholds to evaluate with --cascade')
     
     args = parser.parse_args()
     
@@ -171,6 +288,8 @@ if __name__ == "__main__":
         compare_with_baseline()
     elif args.set_baseline:
         save_as_baseline()
+    elif args.cascade:
+        evaluate_cascade(gate_model_path=args.gate_model, thresholds=args.thresholds)
     else:
         # If no argument provided, run validation
         test_trained_model()
\ No newline at end of file
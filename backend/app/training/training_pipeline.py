@@ -156,6 +156,12 @@ def run_model_testing():
     return run_command(f"{sys.executable} backend/training/test_model.py --validate",
                       "Testing trained model")
 
+def quantize_trained_model(num_images=200, method='minmax'):
+    """Quantize the trained model to INT8 and report FP32 vs INT8 on CPU"""
+    script = Path(__file__).parent / 'quantize_model.py'
+    return run_command(f"{sys.executable} {script} --num-images {num_images} --method {method}",
+                      "Quantizing model to INT8")
+
 def run_webcam_test():
     """Test model with webcam"""
     return run_command(f"{sys.executable} backend/training/test_model.py --webcam",
@@ -193,6 +199,10 @@ def main():
     parser.add_argument('--train', action='store_true', help='Train with best parameters')
     parser.add_argument('--train-direct', action='store_true', help='Train directly without tuning')
     parser.add_argument('--test', action='store_true', help='Test trained model')
+    parser.add_argument('--quantize', action='store_true', help='Static INT8 quantization with FP32 vs INT8 report')
+    parser.add_argument('--calibration-images', type=int, default=200, help='Calibration images for --quantize')
+    parser.add_argument('--calibration-method', choices=['minmax', 'entropy', 'percentile'], default='minmax',
+                        help='Calibration method for --quantize')
     parser.add_argument('--webcam', action='store_true', help='Test with webcam')
     parser.add_argument('--update', action='store_true', help='Update production model')
     
@@ -213,6 +223,7 @@ def main():
             ("Augmenting data", run_data_augmentation),
             ("Training with TrashNet", train_direct),
             ("Testing model", run_model_testing),
+            ("Quantizing model to INT8", lambda: quantize_trained_model(args.calibration_images, args.calibration_method)),
             ("Testing with webcam", run_webcam_test),
             ("Updating production model", update_production_model)
         ]
@@ -254,6 +265,9 @@ def main():
     if args.test:
         run_model_testing()
     
+    if args.quantize:
+        quantize_trained_model(args.calibration_images, args.calibration_method)
+    
     if args.webcam:
         run_webcam_test()
     
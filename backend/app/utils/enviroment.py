@@ -35,4 +35,26 @@ def get_env_or_default(key: str, default: T, required: bool = False) -> T:
             return cast(T, value)
     except (ValueError, TypeError):
         logging.warning(f"Could not convert environment variable {key}={value} to type {type(default).__name__}, using default")
-        return default
\ No newline at end of file
+        return default
+
+def get_setting(key: str, default: T) -> T:
+    """
+    Read a tunable from the application settings, falling back to the environment.
+    
+    Newer performance knobs are not guaranteed to be declared on every deployment's
+    settings object, so this looks them up on `settings` first and then defers to
+    `get_env_or_default` with the same key.
+    
+    Args:
+        key: The setting / environment variable name
+        default: The default value (also used to infer the type)
+        
+    Returns:
+        The configured value or the default
+    """
+    from app.config import settings
+    
+    value = getattr(settings, key, None)
+    if value is not None:
+        return cast(T, value)
+    return get_env_or_default(key, default)
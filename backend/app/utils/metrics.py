@@ -0,0 +1,323 @@
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default buckets (in seconds) for latency histograms
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    """Normalize a labels dict into a hashable, ordered key"""
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _label_str(labels: LabelKey) -> str:
+    """Labels in Prometheus text format, e.g. 'stage="decode",variant="fast"'"""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    )
+    return ",".join(f'{k}="{v}"' for k, v in escaped)
+
+
+def _sample(name: str, labels: LabelKey, value: float) -> str:
+    label_str = _label_str(labels)
+    return f"{name}{{{label_str}}} {_format_value(value)}" if label_str else f"{name} {_format_value(value)}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _ThreadShards:
+    """
+    Per-thread cells for a metric's hot path.
+
+    Each thread only ever writes to its own cell, so increments need no lock
+    (and threads never contend on a shared cache line). Readers sum the cells;
+    a scrape may see an update on one cell before another, which is fine for
+    monitoring. A cell is created the first time a thread touches the metric.
+    """
+
+    def __init__(self, factory: Callable[[], List[float]]):
+        self._factory = factory
+        self._local = threading.local()
+        self._cells: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._factory()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def cells(self) -> List[List[float]]:
+        return list(self._cells)
+
+
+class Counter:
+    """A monotonically increasing counter"""
+
+    def __init__(self, name: str, description: str = "", labels: LabelKey = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._shards = _ThreadShards(lambda: [0.0])
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return sum(cell[0] for cell in self._shards.cells())
+
+    def snapshot(self) -> Dict:
+        return {"value": self.value}
+
+    def exposition(self) -> List[str]:
+        return [_sample(self.name, self.labels, self.value)]
+
+
+class Gauge:
+    """A value that can go up and down"""
+
+    def __init__(self, name: str, description: str = "", labels: LabelKey = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict:
+        return {"value": self._value}
+
+    def exposition(self) -> List[str]:
+        return [_sample(self.name, self.labels, self._value)]
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram.
+
+    Quantiles are estimated from the bucket counts, which is accurate enough to
+    tune batch sizes and wait times against p95/p99 latency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+        labels: LabelKey = ()
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per-thread cells: one count per bucket, one for observations above the
+        # largest bucket (+Inf), then the running sum
+        size = len(self.buckets) + 2
+        self._shards = _ThreadShards(lambda: [0.0] * size)
+
+    def observe(self, value: float) -> None:
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _aggregate(self) -> Tuple[List[int], float]:
+        """Bucket counts (with +Inf last) and the sum, over all threads"""
+        totals = [0.0] * (len(self.buckets) + 2)
+        for cell in self._shards.cells():
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return [int(c) for c in totals[:-1]], totals[-1]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile (0-1) by linear interpolation inside the bucket"""
+        return self._quantile(self._aggregate()[0], q)
+
+    def _quantile(self, counts: List[int], q: float) -> Optional[float]:
+        total = sum(counts)
+        if total == 0:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                # Observations past the last bucket are reported at the last bound
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                fraction = (rank - cumulative) / count
+                return lower + (upper - lower) * fraction
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict:
+        counts, total = self._aggregate()
+        count = sum(counts)
+
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "p50": self._quantile(counts, 0.50),
+            "p95": self._quantile(counts, 0.95),
+            "p99": self._quantile(counts, 0.99),
+            "buckets": {
+                **{str(bound): c for bound, c in zip(self.buckets, counts)},
+                "+Inf": counts[-1]
+            }
+        }
+
+    def exposition(self) -> List[str]:
+        counts, total = self._aggregate()
+        labels = _label_str(self.labels)
+        prefix = f"{labels}," if labels else ""
+        suffix = f"{{{labels}}}" if labels else ""
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+        lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process registry of named metrics, one instance per label set"""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, LabelKey], object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, description: str, labels: Optional[Dict[str, str]], **kwargs):
+        key = (name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, description, labels=key[1], **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get_or_create(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labels)
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+        labels: Optional[Dict[str, str]] = None
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Dict]:
+        """
+        Return a JSON-serializable view of all metrics.
+
+        Args:
+            prefix: Only include metrics whose name starts with this prefix
+
+        Returns:
+            Dict keyed by metric name (with labels appended) mapping to metric values
+        """
+        result = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            if not name.startswith(prefix):
+                continue
+            label_str = ",".join(f"{k}={v}" for k, v in labels)
+            key = f"{name}{{{label_str}}}" if label_str else name
+            result[key] = metric.snapshot()
+        return result
+
+    def exposition(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format (0.0.4).
+
+        Returns:
+            The /metrics response body
+        """
+        types = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}
+        lines = []
+        seen = set()
+        for (name, _), metric in sorted(list(self._metrics.items()), key=lambda item: item[0]):
+            if name not in seen:
+                seen.add(name)
+                if metric.description:
+                    lines.append(f"# HELP {name} {metric.description}")
+                lines.append(f"# TYPE {name} {types[type(metric)]}")
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def stage(self, stage: str) -> Histogram:
+        """Latency histogram for one stage of the detection pipeline"""
+        return self.histogram(
+            "pipeline_stage_seconds", "Time spent in each stage of the detection pipeline", labels={"stage": stage}
+        )
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None) -> Callable:
+    """
+    Decorator that records an async function's latency, and optionally its failures.
+
+    Args:
+        histogram: Receives the duration of every call, including failed ones
+        errors: Incremented when the call raises
+
+    Returns:
+        The decorator
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
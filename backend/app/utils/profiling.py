@@ -0,0 +1,245 @@
+import asyncio
+import cProfile
+import json
+import pstats
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+from app.utils.enviroment import get_setting
+from app.utils.logger import get_logger, logs_dir
+
+logger = get_logger(__name__)
+
+# Where profiles are written, one .prof / .folded / .json triple per request
+PROFILE_DIR = get_setting("PROFILE_DIR", str(logs_dir / "profiles"))
+# Requests carrying this header are profiled while profiling is enabled
+PROFILE_HEADER = get_setting("PROFILE_HEADER", "X-Profile-Request")
+# Profiling switches itself off after this many profiles, so a forgotten toggle can't fill the disk
+PROFILE_MAX_PROFILES = get_setting("PROFILE_MAX_PROFILES", 200)
+
+# Call paths contributing less than this (microseconds) are left out of the folded stacks
+_MIN_FOLDED_US = 1
+_MAX_STACK_DEPTH = 64
+
+
+def _frame_label(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-in, e.g. <method 'run' of 'onnxruntime...' objects>
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def folded_stacks(stats: pstats.Stats) -> List[str]:
+    """
+    Convert cProfile statistics into collapsed stacks ("a;b;c <microseconds>").
+
+    cProfile records caller -> callee edges rather than whole stacks, so stacks
+    are rebuilt by walking the call graph from its roots and splitting each
+    function's time between its callers in proportion to the time each caller
+    spent in it. The result loads directly into flamegraph.pl or speedscope.
+
+    Args:
+        stats: Loaded profile statistics
+
+    Returns:
+        One "frame;frame;frame value" line per call path
+    """
+    entries = stats.stats
+    callees: Dict[tuple, Dict[tuple, tuple]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    stacks: Counter = Counter()
+
+    def walk(func: tuple, path: List[str], on_path: set, scale: float) -> None:
+        _, _, self_time, cumulative, _ = entries[func]
+        path = path + [_frame_label(func)]
+        stacks[";".join(path)] += self_time * scale * 1e6
+        if len(path) >= _MAX_STACK_DEPTH:
+            return
+        for callee, edge in callees.get(func, {}).items():
+            callee_cumulative = entries[callee][3]
+            # edge[3] is the time spent in callee when called from func
+            if callee in on_path or callee_cumulative <= 0:
+                continue
+            child_scale = scale * edge[3] / callee_cumulative
+            if edge[3] * scale * 1e6 < _MIN_FOLDED_US:
+                continue
+            walk(callee, path, on_path | {callee}, child_scale)
+
+    for root, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(root, [], {root}, 1.0)
+
+    return [f"{stack} {int(value)}" for stack, value in stacks.items() if value >= _MIN_FOLDED_US]
+
+
+class RequestProfiler:
+    """
+    On-demand cProfile sampling of HTTP requests.
+
+    Off by default; an admin switches it on at runtime with a sample rate
+    and/or header trigger. While off, routes pay a single attribute check.
+
+    cProfile follows the event-loop thread, so a profile covers everything the
+    loop ran while the request was in flight, including other requests'
+    coroutines; work handed to the inference threads shows up as time awaiting
+    it. Only one request is profiled at a time.
+    """
+
+    def __init__(self, output_dir: str = PROFILE_DIR, header: str = PROFILE_HEADER):
+        self.output_dir = Path(output_dir)
+        self.header = header
+        self.active = False
+        self.sample_rate = 0.0
+        self.header_trigger = False
+        self.max_profiles = PROFILE_MAX_PROFILES
+        self.profiles_written = 0
+        self.skipped_busy = 0
+        self._busy = False
+
+    def configure(
+        self,
+        enabled: bool,
+        sample_rate: float = 0.0,
+        header_trigger: bool = True,
+        max_profiles: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Switch profiling on or off.
+
+        Args:
+            enabled: Master switch
+            sample_rate: Fraction of requests (0-1) to profile at random
+            header_trigger: Also profile requests that carry the profiling header
+            max_profiles: Profiles to write before switching off again
+
+        Returns:
+            The new status
+        """
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        self.header_trigger = bool(header_trigger)
+        self.max_profiles = int(max_profiles) if max_profiles is not None else PROFILE_MAX_PROFILES
+        self.profiles_written = 0
+        self.active = bool(enabled) and (self.sample_rate > 0 or self.header_trigger)
+        logger.warning(
+            f"Request profiling {'enabled' if self.active else 'disabled'} "
+            f"(sample_rate={self.sample_rate}, header_trigger={self.header_trigger}, max_profiles={self.max_profiles})"
+        )
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.active,
+            "sample_rate": self.sample_rate,
+            "header_trigger": self.header_trigger,
+            "header": self.header,
+            "max_profiles": self.max_profiles,
+            "profiles_written": self.profiles_written,
+            "skipped_busy": self.skipped_busy,
+            "output_dir": str(self.output_dir)
+        }
+
+    def _trigger(self, request: Request) -> Optional[str]:
+        if self.header_trigger and self.header in request.headers:
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def handle(self, request: Request, handler: Callable, route: str) -> Response:
+        """Run a route handler, under cProfile if this request is selected"""
+        trigger = self._trigger(request)
+        if trigger is None:
+            return await handler(request)
+        if self._busy:
+            self.skipped_busy += 1
+            return await handler(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already attached to this thread
+            self.skipped_busy += 1
+            return await handler(request)
+
+        self._busy = True
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await handler(request)
+            status_code = response.status_code
+            return response
+        except HTTPException as e:
+            status_code = e.status_code
+            raise
+        finally:
+            profile.disable()
+            self._busy = False
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            self._record(profile, {
+                "route": route,
+                "method": request.method,
+                "path": request.url.path,
+                "status_code": status_code,
+                "duration_ms": duration_ms,
+                "trigger": trigger,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+
+    def _record(self, profile: cProfile.Profile, meta: Dict[str, Any]) -> None:
+        if not self.active:
+            return
+        self.profiles_written += 1
+        if self.profiles_written >= self.max_profiles:
+            self.active = False
+            logger.warning(f"Request profiling disabled after {self.profiles_written} profiles")
+        # Converting and writing the profile is slow; keep it off the event loop
+        asyncio.get_running_loop().run_in_executor(None, self._write, profile, meta)
+
+    def _write(self, profile: cProfile.Profile, meta: Dict[str, Any]) -> None:
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{meta['method']}{meta['route']}").strip("_")
+            stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+            base = self.output_dir / f"{stamp}_{slug}_{meta['duration_ms']:.0f}ms"
+
+            profile.dump_stats(f"{base}.prof")
+            stats = pstats.Stats(profile)
+            with open(f"{base}.folded", "w") as f:
+                f.write("\n".join(folded_stacks(stats)) + "\n")
+            with open(f"{base}.json", "w") as f:
+                json.dump({**meta, "profile": f"{base.name}.prof", "folded": f"{base.name}.folded"}, f, indent=2)
+
+            logger.info(f"Profiled {meta['method']} {meta['path']} ({meta['duration_ms']:.1f} ms) -> {base}.prof")
+        except Exception as e:
+            logger.error(f"Failed to write request profile: {e}")
+
+
+# Shared per-worker profiler
+request_profiler = RequestProfiler()
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose handler can be profiled on demand by `request_profiler`"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def profiled_handler(request: Request) -> Response:
+            if not request_profiler.active:
+                return await handler(request)
+            return await request_profiler.handle(request, handler, route)
+
+        return profiled_handler
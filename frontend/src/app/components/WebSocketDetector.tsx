@@ -1,6 +1,23 @@
 import React, { useEffect, useRef, useState, useCallback } from 'react';
 import { useAuth } from '../hooks/AuthHook';
 
+// Binary frame protocol: 12-byte little-endian header, then the encoded image
+const BINARY_PROTOCOL_VERSION = 1;
+const FRAME_HEADER_SIZE = 12;
+const FORMAT_JPEG = 0;
+
+const encodeFrame = (image: ArrayBuffer, sequence: number): ArrayBuffer => {
+  const frame = new Uint8Array(FRAME_HEADER_SIZE + image.byteLength);
+  const header = new DataView(frame.buffer);
+  header.setUint8(0, BINARY_PROTOCOL_VERSION);
+  header.setUint8(1, FORMAT_JPEG);
+  header.setUint16(2, 0, true);
+  header.setUint32(4, sequence >>> 0, true);
+  header.setFloat32(8, NaN, true); // no client-side confidence
+  frame.set(new Uint8Array(image), FRAME_HEADER_SIZE);
+  return frame.buffer;
+};
+
 interface WebSocketDetectorProps {
   onDetection: (detection: any) => void;
   onError: (error: string) => void;
@@ -17,6 +34,9 @@ const WebSocketDetector: React.FC<WebSocketDetectorProps> = ({
   const { user, getIdToken } = useAuth() as { user: { uid: string } | null, getIdToken: () => Promise<string> };
   const [socket, setSocket] = useState<WebSocket | null>(null);
   const socketRef = useRef<WebSocket | null>(null);
+  // Frame protocol agreed with the server; no frames are sent until it replies
+  const protocolRef = useRef<'binary' | 'json' | null>(null);
+  const sequenceRef = useRef(0);
   
   // Setup WebSocket connection
   useEffect(() => {
@@ -47,14 +67,21 @@ const WebSocketDetector: React.FC<WebSocketDetectorProps> = ({
         // Setup event handlers
         ws.onopen = () => {
           console.log('WebSocket connection established');
-          // Send authentication message
-          ws.send(JSON.stringify({ token }));
+          // Send authentication message, offering the binary frame protocol
+          protocolRef.current = null;
+          ws.send(JSON.stringify({ token, protocol: 'binary', protocol_version: BINARY_PROTOCOL_VERSION }));
         };
         
         ws.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data);
             
+            if (data.status === 'connected') {
+              // Older servers don't reply with a protocol and keep receiving JSON frames
+              protocolRef.current = data.protocol === 'binary' ? 'binary' : 'json';
+              return;
+            }
+            
             if (data.status === 'error') {
               onError(data.message || 'WebSocket error');
               return;
@@ -103,6 +130,18 @@ const WebSocketDetector: React.FC<WebSocketDetectorProps> = ({
     }
     
     try {
+      if (protocolRef.current === null) return;
+      
+      if (protocolRef.current === 'binary') {
+        const canvas: HTMLCanvasElement | null = webcamRef.current.getCanvas();
+        canvas?.toBlob(async (blob) => {
+          const ws = socketRef.current;
+          if (!blob || !ws || ws.readyState !== WebSocket.OPEN) return;
+          ws.send(encodeFrame(await blob.arrayBuffer(), sequenceRef.current++));
+        }, 'image/jpeg', 0.92);
+        return;
+      }
+      
       const imageSrc = webcamRef.current.getScreenshot();
       if (imageSrc) {
         const base64Image = imageSrc.split(',')[1]; // Remove data URL prefix